@@ -1,322 +1,579 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import requests
-from bs4 import BeautifulSoup
-import re
-import time
 from datetime import datetime
-import random
 import json
+import os
 import traceback
 
-# Streamlitの設定
-st.set_page_config(
-    page_title="eBay商品検索",
-    page_icon="🔍",
-    layout="wide"
-)
-
-class EbayScraper:
-    def __init__(self, requests_per_minute=3):  # 分あたりのリクエスト数を3に削減
-        self.requests_per_minute = requests_per_minute
-        self.delay = 60 / requests_per_minute
-        self.user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.0 Safari/605.1.15',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:90.0) Gecko/20100101 Firefox/90.0',
-            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36 Edg/121.0.2277.128',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.6 Safari/605.1.15',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0'
-        ]
-        self.categories = self._get_categories()
-        self.countries = self._get_countries()
-        self.exchange_rate = 150  # USD to JPY exchange rate (仮の為替レート)
-    
-    def _get_categories(self):
-        # eBayのカテゴリリスト（簡略化版）
-        return {
-            "すべてのカテゴリ": "",
-            "アンティーク": "20081",
-            "アート": "550",
-            "ベビー": "2984",
-            "本、コミック、雑誌": "267",
-            "ビジネスと産業": "12576",
-            "カメラ、写真": "625",
-            "携帯電話、スマートフォン": "15032",
-            "衣類、靴、アクセサリー": "11450",
-            "コイン、紙幣": "11116",
-            "コレクション": "1",
-            "コンピュータ、タブレット": "58058",
-            "家電製品": "293",
-            "クラフト": "14339",
-            "人形、ぬいぐるみ": "237",
-            "DVDと映画": "11232",
-            "eBayモーターズ": "6000",
-            "エンターテイメントメモラビリア": "45100",
-            "ギフトカード、チケット": "172008",
-            "健康、美容": "26395",
-            "家、庭、DIY": "11700",
-            "ジュエリー、時計": "281",
-            "音楽": "11233",
-            "楽器、ギア": "619",
-            "ペット用品": "1281",
-            "陶器、ガラス": "870",
-            "不動産": "10542",
-            "スポーツ用品": "888",
-            "スポーツメモラビリア": "64482",
-            "おもちゃ、ホビー": "220",
-            "旅行": "3252",
-            "ビデオゲーム、コンソール": "1249"
-        }
-    
-    def _get_countries(self):
-        # 国のリスト
-        return {
-            "すべての国": "",
-            "日本": "JP",
-            "アメリカ": "US",
-            "イギリス": "GB",
-            "ドイツ": "DE",
-            "フランス": "FR",
-            "中国": "CN",
-            "韓国": "KR",
-            "オーストラリア": "AU",
-            "カナダ": "CA",
-            "イタリア": "IT",
-            "スペイン": "ES",
-            "香港": "HK",
-            "シンガポール": "SG",
-            "タイ": "TH"
-        }
-    
-    def _get_random_user_agent(self):
-        return random.choice(self.user_agents)
-    
-    def search(self, keyword, category="", min_price=None, max_price=None, condition=None, from_country=None, to_country=None, limit=50):
-        search_url = "https://www.ebay.com/sch/i.html"
-        # 条件パラメータをローカル変数にコピーして、後で参照できるようにする
-        item_condition = condition
-        params = {
-            "_nkw": keyword,
-            "_sacat": category,
-            "_sop": "12",  # 終了日時: 近い順
-            "_ipg": "50"  # 1ページあたりの結果数を50に減らす（負荷軽減）
-        }
-        
-        if min_price and max_price:
-            params["_udlo"] = min_price
-            params["_udhi"] = max_price
-        
-        if condition:
-            if condition == "新品":
-                params["LH_ItemCondition"] = "1000"
-            elif condition == "中古":
-                params["LH_ItemCondition"] = "3000"
-        
-        # 発送元の国を指定
-        if from_country and from_country != "":
-            params["LH_PrefLoc"] = "2"  # 2 = specified location
-            params["_fsradio"] = "&LH_LocatedIn=1"
-            params["_fsradio2"] = "&LH_LocatedIn=1"
-            params["_salic"] = from_country
-        
-        # 発送先の国を指定
-        if to_country and to_country != "":
-            params["LH_FS"] = "1"  # 1 = Will ship to selected location
-            params["_fsct"] = to_country
-        
-        # モックデータの使用オプション
-        use_mock_data = st.session_state.get('use_mock_data', False)
-        if use_mock_data:
-            # モックデータを返す
-            return self._get_mock_data(keyword, limit, item_condition)
-        
+# pandas・plotly と検索結果の表示・集計用のモジュールは読み込みに時間がかかるため、
+# 使う関数の中で読み込む（検索前の最初の表示と再実行を速くする）
+import batch_search
+import ebay_scraper
+import metrics as search_metrics
+from batch_search import parse_keywords
+from http_session import EbaySession
+from rate_limiter import RequestScheduler
+from search_cache import SearchCache
+from single_flight import SingleFlight
+
+# 分あたりのリクエスト数（プロセス内の全セッションの合計）
+REQUESTS_PER_MINUTE = 3
+
+# 検索キャッシュの保存期間（分）と、セッションごとの有効期間の既定値（分。保存期間の範囲で選べる）
+CACHE_TTL_MINUTES = 1440
+DEFAULT_CACHE_MAX_AGE_MINUTES = 60
+
+# HTTPレスポンスの記録の既定の保存先
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# 換算レートを指定できるドル以外の通貨（円は為替レート設定から計算する）
+FOREIGN_CURRENCIES = ['GBP', 'EUR', 'CAD', 'AUD']
+
+# 開発者オプションで選べるモックデータの件数（None は取得件数と同じ）
+MOCK_ROW_OPTIONS = [None, 10000, 100000, 1000000]
+
+# 計測値の既定の書き出し先（トレースの JSON Lines と Prometheus のテキスト形式）
+DEFAULT_METRICS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "metrics")
+
+@st.cache_resource
+def get_search_cache():
+    """プロセス全体で共有する検索キャッシュ（有効期間は各セッションのスクレイパーが指定する）"""
+    return SearchCache(ttl=CACHE_TTL_MINUTES * 60)
+
+@st.cache_resource
+def get_http_session():
+    """プロセス全体で共有するHTTPセッション"""
+    return EbaySession()
+
+@st.cache_resource
+def get_fixture_session(mode, directory):
+    """レスポンスを記録・再生するHTTPセッション（開発者オプション用）"""
+    if mode == "記録":
+        return EbaySession(record_dir=directory)
+    return EbaySession(replay_dir=directory)
+
+@st.cache_resource
+def get_listing_store():
+    """検索結果を蓄積する商品データベース"""
+    from listing_store import ListingStore
+
+    return ListingStore()
+
+@st.cache_data(max_entries=20, show_spinner=False)
+def get_chart_data(result_hash, _df):
+    """グラフ用の集計（検索結果のハッシュ値ごとにキャッシュする）"""
+    import chart_data
+
+    return chart_data.aggregate(_df)
+
+@st.cache_data(max_entries=4, show_spinner="ファイルを作成しています...")
+def get_export_data(result_hash, fmt, _df):
+    """エクスポートするファイルの内容（検索結果のハッシュ値と形式ごとにキャッシュする）"""
+    import result_export
+
+    return result_export.export_bytes(_df, fmt)
+
+@st.cache_resource
+def get_request_scheduler():
+    """プロセス全体で共有するリクエストスケジューラ（全セッションの合計でレートを守る）"""
+    return RequestScheduler(requests_per_minute=REQUESTS_PER_MINUTE, jitter=(3, 8))
+
+@st.cache_resource
+def get_single_flight():
+    """プロセス全体で共有する実行中の検索（同時に実行された同じ条件の検索は1回の取得・解析の結果を共有する）"""
+    return SingleFlight()
+
+@st.cache_resource
+def get_watchlist():
+    """保存した検索（ウォッチリスト）と差分のデータベース"""
+    from watchlist import Watchlist
+
+    return Watchlist()
+
+@st.cache_resource
+def get_watch_poller():
+    """保存した検索を定期的に取得するバックグラウンドのスレッド（プロセスに1つ）
+
+    リクエストは共有のスケジューラを通すため、全セッションの合計のレートは変わらない。
+    キャッシュは読まずに取得し直す（取得した結果でキャッシュは更新する）。
+    商品データベースも読み込むため、保存した検索がある場合・保存した時にだけ作る。
+    """
+    from watchlist import WatchPoller
+
+    scraper = ebay_scraper.EbayScraper(
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        cache=get_search_cache(),
+        session=get_http_session(),
+        scheduler=get_request_scheduler(),
+        metrics=get_metrics(),
+        flights=get_single_flight()
+    )
+    scraper.bypass_cache = True
+    return WatchPoller(get_watchlist(), scraper, listing_store=get_listing_store()).start()
+
+@st.cache_resource(show_spinner=False)
+def get_metrics():
+    """プロセス全体で共有する処理時間・カウンタの計測値（set_page_config より前に呼ばれるため表示は出さない）"""
+    return search_metrics.Metrics()
+
+def get_scraper():
+    """ブラウザのセッションごとのスクレイパー（再実行のたびに作り直さない）
+
+    為替レート・モックデータの使用・HTTPモードは利用者ごとに違うため、プロセス全体ではなく
+    セッションごとに1つ持つ。キャッシュ・HTTPセッション・スケジューラは全セッションで共有する。
+    """
+    if 'scraper' not in st.session_state:
+        st.session_state['scraper'] = ebay_scraper.EbayScraper(
+            requests_per_minute=REQUESTS_PER_MINUTE,
+            cache=get_search_cache(),
+            session=get_http_session(),
+            scheduler=get_request_scheduler(),
+            metrics=get_metrics(),
+            flights=get_single_flight()
+        )
+    return st.session_state['scraper']
+
+# 価格列（float32）の表示形式
+PRICE_COLUMN_CONFIG = {
+    '価格': st.column_config.NumberColumn(format="%.2f"),
+    '送料（USD）': st.column_config.NumberColumn(format="%.2f"),
+}
+
+def price_histogram(histogram, title):
+    """集計済みのビンから価格分布のヒストグラムを作る"""
+    import plotly.express as px
+
+    fig = px.bar(histogram, x="価格", y="件数", hover_data=["下限", "上限"], title=title)
+    fig.update_traces(width=(histogram["上限"] - histogram["下限"]).tolist(), marker_line_width=0)
+    fig.update_layout(bargap=0)
+    return fig
+
+def show_search_event(status, event):
+    """検索中のイベントを画面に表示する（進み具合は status の場所に上書きする）"""
+    if event['type'] in (ebay_scraper.EVENT_CACHE_HIT, ebay_scraper.EVENT_QUEUED, ebay_scraper.EVENT_SENDING,
+                         ebay_scraper.EVENT_COALESCED):
+        status.info(event['message'])
+    elif event['type'] == ebay_scraper.EVENT_DEBUG and st.session_state.get('debug_mode', False):
+        st.text(f"DEBUG: {event['message']}")
+
+def mock_data_fallback(scraper, events, keyword, limit, condition):
+    """検索が失敗・0件で終わった場合の表示（モックデータに切り替えた場合はその行を返す）"""
+    for event in events:
+        if event['type'] == ebay_scraper.EVENT_ROBOT_CHECK:
+            st.error("eBayのロボット検出に引っかかりました。モックデータを使用します。")
+            st.session_state['use_mock_data'] = True
+            return scraper._get_mock_data(keyword, limit, condition) if event['page'] == 1 else []
+        if event['type'] == ebay_scraper.EVENT_ERROR and event['page'] > 1:
+            # 2ページ目以降の失敗はそれまでの結果を残して終了する
+            st.warning(f"{event['page']}ページ目の取得に失敗したため、取得を終了しました: {str(event['exception'])}")
+            return []
+        if event['type'] == ebay_scraper.EVENT_ERROR:
+            st.error(f"検索中にエラーが発生しました: {str(event['exception'])}")
+            st.error("".join(traceback.format_exception(event['exception'])))
+            st.warning("eBayからのデータ取得に失敗しました。モックデータを使用しますか？")
+            button_key = "error_mock"
+        elif event['type'] == ebay_scraper.EVENT_NO_RESULTS:
+            st.warning("検索条件に一致する商品が見つかりませんでした。モックデータを使用しますか？")
+            button_key = "no_results_mock"
+        else:
+            continue
+        if st.button("モックデータを使用", key=button_key):
+            st.session_state['use_mock_data'] = True
+            return scraper._get_mock_data(keyword, limit, condition)
+        return []
+    return []
+
+def run_single_search(scraper, keyword, limit, max_pages, **filters):
+    """1つのキーワードを検索する（ページごとに途中経過の表とグラフを更新する）"""
+    import chart_data
+    from price_normalizer import normalize_prices
+    from result_schema import to_frame
+
+    search_results = []
+    status = st.empty()
+    progress_placeholder = st.empty()
+    events = []
+
+    def on_event(event):
+        events.append(event)
+        show_search_event(status, event)
+
+    for page_rows in scraper.search_pages(keyword=keyword, limit=limit, max_pages=max_pages, on_event=on_event,
+                                          **filters):
+        search_results.extend(page_rows)
+        partial_df = normalize_prices(to_frame(search_results), scraper.exchange_rate, scraper.usd_rates)
+        with progress_placeholder.container():
+            st.info(f"{len(search_results)}件 / {limit}件を取得しました...")
+            st.dataframe(partial_df[['タイトル', '価格', '価格（円）', '配送', '状態', '場所', '出品者']], use_container_width=True,
+                         column_config=PRICE_COLUMN_CONFIG)
+            histogram = chart_data.aggregate(partial_df)["histogram"]
+            st.plotly_chart(price_histogram(histogram, "価格分布（取得中）"), use_container_width=True)
+    status.empty()
+    progress_placeholder.empty()
+    return search_results + mock_data_fallback(scraper, events, keyword, limit, filters.get('condition'))
+
+def run_batch_search(scraper, keywords, limit, max_pages, **filters):
+    """複数のキーワードを一括検索する（キーワードごとの進捗を表示する）"""
+    import pandas as pd
+
+    if scraper.use_mock_data:
+        search_results = []
+        for keyword in keywords:
+            for row in scraper._get_mock_data(keyword, limit, filters.get('condition')):
+                search_results.append({'キーワード': keyword, **row})
+        return search_results
+
+    progress_bar = st.progress(0.0, text=f"0 / {len(keywords)} キーワード完了")
+    progress_table = st.empty()
+    finished_states = (batch_search.STATUS_DONE, batch_search.STATUS_ERROR, batch_search.STATUS_CANCELLED)
+
+    def on_progress(progress):
+        finished = sum(1 for state in progress.values() if state['状態'] in finished_states)
+        items = sum(state['件数'] for state in progress.values())
+        progress_bar.progress(finished / len(progress), text=f"{finished} / {len(progress)} キーワード完了（{items}件）")
+        progress_table.dataframe(pd.DataFrame.from_dict(progress, orient='index'), use_container_width=True)
+
+    search_results, progress = batch_search.BatchSearch(scraper).run(
+        keywords,
+        limit=limit,
+        max_pages=max_pages,
+        use_cache=not scraper.bypass_cache,
+        on_progress=on_progress,
+        **filters
+    )
+    on_progress(progress)
+
+    failed = [keyword for keyword, state in progress.items()
+              if state['状態'] in (batch_search.STATUS_ERROR, batch_search.STATUS_CANCELLED)]
+    if failed:
+        st.warning(f"{len(failed)}件のキーワードで取得に失敗しました: {', '.join(failed[:10])}")
+    return search_results
+
+def render_history(store, keywords=None):
+    """蓄積した検索結果から価格の推移と出品者の活動を表示する"""
+    import plotly.express as px
+    from listing_store import normalize_keyword
+
+    stats = store.stats()
+    stats_col1, stats_col2, stats_col3 = st.columns(3)
+    stats_col1.metric("保存済みの商品数", f"{stats['listings']}")
+    stats_col2.metric("価格の記録数", f"{stats['observations']}")
+    stats_col3.metric("キーワード数", f"{stats['keywords']}")
+    if stats['listings'] == 0:
+        st.info("まだ保存された検索結果はありません。")
+        return
+
+    # 今回の検索キーワードがあれば最初に選択しておく
+    options = ["すべて"] + store.keywords()['キーワード'].tolist()
+    default_keyword = next((normalize_keyword(k) for k in keywords or [] if normalize_keyword(k) in options), "すべて")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        keyword = st.selectbox("キーワード", options, index=options.index(default_keyword), key="history_keyword")
+    with col2:
+        seller = st.text_input("出品者", key="history_seller")
+    with col3:
+        days = st.selectbox("期間", [7, 30, 90, 365], index=1, format_func=lambda d: f"過去{d}日", key="history_days")
+    keyword = None if keyword == "すべて" else keyword
+
+    trend = store.price_trend(keyword=keyword, seller=seller or None, days=days)
+    if trend.empty:
+        st.info("この条件の価格の記録はありません。")
+    else:
+        fig = px.line(trend, x="日付", y=["平均価格", "最低価格", "最高価格"], markers=True, title="価格の推移")
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("**出品者の活動**")
+    st.dataframe(store.seller_activity(keyword=keyword, seller=seller or None, days=days),
+                 use_container_width=True, column_config={'平均価格': st.column_config.NumberColumn(format="%.2f")})
+
+def render_watchlists(watchlist):
+    """保存した検索と、前回の確認以降の変更（記録済みの差分から表示し、eBayには接続しない）"""
+    watches = watchlist.watches()
+    if watches:
+        # 定期取得のスレッドは保存した検索がある場合にだけ動かす
+        get_watch_poller()
+    unseen = sum(watch['unseen'] for watch in watches)
+    with st.expander(f"ウォッチリスト（未確認の変更 {unseen}件）" if unseen else "ウォッチリスト"):
+        # 直近の検索条件を保存する
+        last_search = st.session_state.get('last_search')
+        if last_search:
+            col1, col2, col3 = st.columns([2, 1, 1])
+            name = col1.text_input("保存する名前", value=last_search['keyword'], key='watch_name')
+            interval = col2.selectbox("取得の間隔", [30, 60, 180, 360, 1440], index=1, key='watch_interval',
+                                      format_func=lambda m: f"{m // 60}時間ごと" if m >= 60 else f"{m}分ごと")
+            max_pages = col3.number_input("最大ページ数", min_value=1, max_value=10, value=2, key='watch_max_pages')
+            if st.button("直近の検索条件をウォッチリストに保存"):
+                watchlist.add(name or last_search['keyword'], last_search, interval_minutes=interval,
+                              max_pages=int(max_pages))
+                get_watch_poller().wake()
+                st.success("保存しました。新着順に取得し、以降は新着と価格の変更を記録します。")
+                watches = watchlist.watches()
+        else:
+            st.caption("検索すると、その検索条件をウォッチリストに保存できます。")
+
+        if not watches:
+            return
+
+        labels = {watch['id']: f"{watch['name']}（未確認 {watch['unseen']}件）" for watch in watches}
+        watch_id = st.selectbox("保存した検索", list(labels), format_func=labels.get, key='watch_selected')
+        watch = next(watch for watch in watches if watch['id'] == watch_id)
+        st.caption(f"前回の取得: {watch['last_polled'] or '未取得'} {watch['last_status'] or ''} / "
+                   f"前回の確認: {watch['last_visited']}")
+
+        from watchlist import FULL_POLL_INTERVAL
+
+        st.caption("定期取得は新着順に取得し、前回までに見た商品のページで止めるため、それより後のページの"
+                   f"価格変更は {FULL_POLL_INTERVAL // 3600}時間ごとに最大ページ数まで取得し直した時に記録されます。")
+        show_all = st.checkbox("確認済みの変更も表示する", key='watch_show_all')
+        changes = watchlist.changes(watch_id, since=None if show_all else watch['last_visited'])
+        if changes.empty:
+            st.info("前回の確認以降の変更はありません。" if not show_all else "まだ変更は記録されていません。")
+        else:
+            st.dataframe(changes, use_container_width=True, hide_index=True, column_config={
+                '価格': st.column_config.NumberColumn(format="%.2f"),
+                '前回の価格': st.column_config.NumberColumn(format="%.2f"),
+                '差額': st.column_config.NumberColumn(format="%+.2f"),
+                'リンク': st.column_config.LinkColumn(display_text="商品ページ"),
+            })
+
+        col1, col2, col3 = st.columns(3)
+        if col1.button("確認済みにする", disabled=not watch['unseen']):
+            watchlist.mark_visited(watch_id)
+            st.rerun()
+        if col2.button("今すぐ取得"):
+            watchlist.request_poll(watch_id)
+            get_watch_poller().wake()
+            st.info("バックグラウンドで取得します。しばらくしてから画面を更新してください。")
+        if col3.button("削除"):
+            watchlist.remove(watch_id)
+            st.rerun()
+
+def render_card_view(df):
+    """表示中のページのカードだけを1つのHTMLで描画する"""
+    import card_grid
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    sort_option = col1.selectbox("並び順", list(card_grid.SORT_OPTIONS), key='card_sort')
+    page_size = col2.selectbox("表示件数", card_grid.PAGE_SIZES, index=1, key='card_page_size')
+    pages = card_grid.page_count(len(df), page_size)
+    # 件数や表示件数が変わってページ数が減った場合は最終ページに戻す
+    if st.session_state.get('card_page', 1) > pages:
+        st.session_state['card_page'] = pages
+    page = col3.number_input("ページ", min_value=1, max_value=pages, step=1, key='card_page')
+
+    page_df = card_grid.page_slice(card_grid.sort_frame(df, sort_option), page, page_size)
+    st.caption(f"{len(df)}件中 {(page - 1) * page_size + 1}〜{(page - 1) * page_size + len(page_df)}件目"
+               f"（{page}/{pages}ページ）")
+    st.html(card_grid.build_card_grid(page_df))
+
+def render_export(df, result_hash):
+    """選んだ形式のファイルをボタンを押した時だけ作成してダウンロードボタンを表示する"""
+    import result_export
+
+    col1, col2 = st.columns([1, 3])
+    fmt = col1.selectbox("保存形式", list(result_export.FORMATS), key='export_format', label_visibility="collapsed")
+    prepared = st.session_state.get('export_prepared')
+    if col2.button("検索結果をファイルに保存"):
+        prepared = {"hash": result_hash, "format": fmt, "file_name":
+                    result_export.export_file_name(fmt, datetime.now().strftime("%Y%m%d_%H%M%S"))}
+        st.session_state['export_prepared'] = prepared
+
+    # 作成済みのファイルが今の検索結果・形式のものならダウンロードボタンを表示する
+    if prepared and prepared["hash"] == result_hash and prepared["format"] == fmt:
         try:
-            # リクエスト前の待機時間を大幅に増やす
-            delay = self.delay + random.uniform(3, 8)  # 3～8秒のランダムな遅延を追加
-            st.info(f"eBayにリクエストを送信します。{delay:.1f}秒お待ちください...")
-            time.sleep(delay)
-            
-            headers = {
-                'User-Agent': self._get_random_user_agent(),
-                'Accept-Language': 'en-US,en;q=0.9,ja;q=0.8',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.8,image/webp,image/apng,*/*;q=0.5',
-                'Referer': 'https://www.ebay.com/',
-                'Sec-Fetch-Dest': 'document',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-Site': 'same-origin',
-                'Sec-Fetch-User': '?1',
-                'Upgrade-Insecure-Requests': '1',
-                'Connection': 'keep-alive',
-                'Cache-Control': 'max-age=0'
-            }
-            
-            # リクエストを送信する前にCookieを取得する試み
-            try:
-                session = requests.Session()
-                home_page = session.get('https://www.ebay.com/', headers=headers, timeout=15)
-                # Cookieが設定されたセッションを使用
-                response = session.get(search_url, params=params, headers=headers, timeout=20)
-            except:
-                # セッションアプローチが失敗した場合は通常のリクエストを試みる
-                response = requests.get(search_url, params=params, headers=headers, timeout=20)
-            
-            response.raise_for_status()
-            
-            # デバッグ用に応答の内容を確認
-            if "Robot Check" in response.text or "ロボットチェック" in response.text:
-                st.error("eBayのロボット検出に引っかかりました。モックデータを使用します。")
-                st.session_state['use_mock_data'] = True
-                return self._get_mock_data(keyword, limit, item_condition)
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            items = soup.select('li.s-item')
+            data = get_export_data(result_hash, fmt, df)
+            st.download_button(
+                label=f"{prepared['file_name']} をダウンロード（{len(data) / 1024:,.0f}KB）",
+                data=data,
+                file_name=prepared["file_name"],
+                mime=result_export.FORMATS[fmt][1],
+            )
+        except Exception as e:
+            st.error(f"エクスポートエラー: {str(e)}")
+            st.error(traceback.format_exc())
+
+FILTER_KEYS = ['filter_price', 'filter_title', 'filter_conditions', 'filter_locations', 'filter_sellers']
+
+def render_filters(df):
+    """保存した検索結果の絞り込み（絞り込んだ DataFrame と条件を表す文字列を返す）"""
+    import result_filter
+
+    with st.expander("検索結果の絞り込み"):
+        col1, col2 = st.columns(2)
+        low, high = float(df['価格'].min()), float(df['価格'].max())
+        price_range = None
+        if high > low:
+            price_range = col1.slider("価格 ($)", min_value=low, max_value=high, value=(low, high), key='filter_price')
+            if price_range == (low, high):
+                price_range = None
+        title = col2.text_input("タイトルに含む文字", key='filter_title').strip()
+        col3, col4, col5 = st.columns(3)
+        conditions = col3.multiselect("状態", result_filter.filter_options(df, '状態'), key='filter_conditions')
+        locations = col4.multiselect("発送元", result_filter.filter_options(df, '場所'), key='filter_locations')
+        sellers = col5.multiselect("出品者", result_filter.filter_options(df, '出品者'), key='filter_sellers')
+
+    filtered = result_filter.filter_frame(df, price_range, conditions, locations, sellers, title)
+    if len(filtered) < len(df):
+        st.caption(f"{len(df)}件中 {len(filtered)}件を表示しています")
+    filter_key = json.dumps([price_range, conditions, locations, sellers, title], ensure_ascii=False)
+    return filtered, filter_key
+
+def render_results(df, scraper, result_hash):
+    """検索結果をテーブル・カード・グラフのタブとファイルのダウンロードで表示する"""
+    import plotly.express as px
+    import dedup
+
+    # 似た商品（同じ出品者のほぼ同じタイトル）を1行にまとめた結果（グラフの集計にも使う）
+    grouped_df = dedup.collapse_groups(df)
+
+    # タブを作成
+    tab1, tab2, tab3, tab4 = st.tabs(["テーブル表示", "カード表示", "グラフ", "履歴"])
+
+    with tab1:
+        # 安全にリンク列を処理
+        try:
+            group_similar = st.checkbox("似た商品をまとめて表示する", value=True, key='group_similar',
+                                        help="同じ出品者のほぼ同じタイトルの商品（再出品など）を1行にまとめ、件数を表示します。")
+            table_df = grouped_df if group_similar else df
+            # リンク列をマスク
+            df_display = table_df.copy()
+            # リンクを「商品ページ」というテキストに置き換え
+            df_display['リンク'] = ['商品ページ' for _ in range(len(table_df))]
             
-            # アイテムが見つからない場合の処理
-            if not items:
-                st.warning("検索結果が見つかりませんでした。モックデータを使用しますか？")
-                st.warning(f"検索URL: {response.url}")
-                use_mock = st.button("モックデータを使用", key="no_results_mock")
-                if use_mock:
-                    st.session_state['use_mock_data'] = True
-                    return self._get_mock_data(keyword, limit, item_condition)
-                return []
+            # 表示するカラムを設定
+            display_columns = ['タイトル', '価格', '価格（円）', '配送', '状態', '場所', '出品者', 'リンク']
+            if '合計（円）' in df.columns:
+                display_columns[4:4] = ['送料（USD）', '合計（円）']
+            if 'キーワード' in df.columns:
+                display_columns.insert(0, 'キーワード')
+            if group_similar:
+                display_columns.insert(display_columns.index('タイトル') + 1, '件数')
+            st.dataframe(df_display[display_columns], use_container_width=True, column_config=PRICE_COLUMN_CONFIG)
+        except Exception as e:
+            st.error(f"テーブル表示エラー: {str(e)}")
+            st.dataframe(df[['タイトル', '価格', '価格（円）', '配送', '状態', '場所', '出品者']], use_container_width=True)
+
+    with tab2:
+        try:
+            render_card_view(df)
+        except Exception as e:
+            st.error(f"カード表示エラー: {str(e)}")
+
+    with tab3:
+        try:
+            # 重複・再出品で価格の分布や平均が偏らないように、似た商品は1件として集計する
+            charts = get_chart_data(f"{result_hash}:grouped", grouped_df)
+            if len(grouped_df) < len(df):
+                st.caption(f"似た商品をまとめた {len(grouped_df)}件（{len(df)}件中）を集計しています。")
             
-            results = []
-            current_date = datetime.now().strftime("%Y-%m-%d")
+            # 価格分布のヒストグラム
+            st.plotly_chart(price_histogram(charts["histogram"], "価格分布"), use_container_width=True)
             
-            for item in items[:limit]:
-                try:
-                    title_elem = item.select_one('.s-item__title')
-                    price_elem = item.select_one('.s-item__price')
-                    link_elem = item.select_one('.s-item__link')
-                    shipping_elem = item.select_one('.s-item__shipping')
-                    location_elem = item.select_one('.s-item__location')
-                    seller_elem = item.select_one('.s-item__seller-info-text')
-                    
-                    if all([title_elem, price_elem, link_elem]) and "Shop on eBay" not in title_elem.text:
-                        title = title_elem.text.strip()
-                        price_text = price_elem.text.strip()
-                        
-                        # リンクを安全に取得
-                        link = link_elem.get('href', 'https://www.ebay.com').split('?')[0]
-                        if not link or not link.startswith('http'):
-                            link = 'https://www.ebay.com'
-                        
-                        # 価格情報の抽出 - 正規表現を改善
-                        price_value = re.search(r'(\d+\.\d+)|(\d+)', price_text)
-                        if price_value:
-                            price_str = price_value.group(1) if price_value.group(1) else price_value.group(2)
-                            price = float(price_str)
-                        else:
-                            price = 0.0
-                        
-                        # 円価格の計算
-                        price_jpy = int(price * self.exchange_rate)
-                        
-                        # 配送情報
-                        shipping = shipping_elem.text.strip() if shipping_elem else "不明"
-                        
-                        # 出品場所の取得
-                        location = location_elem.text.strip() if location_elem else "不明"
-                        
-                        # 出品者情報の取得
-                        seller = ""
-                        shop_name = "N/A"
-                        if seller_elem:
-                            seller_text = seller_elem.text.strip()
-                            seller_match = re.search(r'([a-zA-Z0-9._-]+)\s*\(', seller_text)
-                            if seller_match:
-                                seller = seller_match.group(1)
-                            shop_match = re.search(r'\((.*?)\)', seller_text)
-                            if shop_match:
-                                shop_name = shop_match.group(1)
-                        
-                        # 画像URLの取得
-                        img_elem = item.select_one('.s-item__image-img')
-                        img_url = img_elem.get('src', '') if img_elem else ''
-                        if not img_url or not img_url.startswith('http'):
-                            img_url = 'https://via.placeholder.com/150'
-                        
-                        results.append({
-                            'タイトル': title,
-                            '価格': price,
-                            '価格（円）': price_jpy,
-                            '価格（表示）': price_text,
-                            '配送': shipping,
-                            '状態': item_condition or "不明",
-                            '場所': location,
-                            '出品者': seller,
-                            'ショップ名': [shop_name] if shop_name != "N/A" else "N/A",
-                            '出品日時': current_date,
-                            'リンク': link,
-                            '画像URL': img_url
-                        })
-                except Exception as item_error:
-                    # 個別のアイテム処理でのエラーをスキップ
-                    st.debug(f"アイテム処理エラー: {str(item_error)}")
-                    continue
+            # 発送元の円グラフ
+            if charts["locations"] is not None:
+                fig_location = px.pie(charts["locations"], names='場所', values='件数', title="発送元の分布")
+                st.plotly_chart(fig_location, use_container_width=True)
             
-            # 結果が0件の場合はモックデータの使用を提案
-            if len(results) == 0:
-                st.warning("検索条件に一致する商品が見つかりませんでした。モックデータを使用しますか？")
-                use_mock = st.button("モックデータを使用", key="no_results_mock")
-                if use_mock:
-                    st.session_state['use_mock_data'] = True
-                    return self._get_mock_data(keyword, limit, item_condition)
-                
-            return results
-        
+            # 統計情報
+            stats = charts["stats"]
+            stats_col1, stats_col2, stats_col3, stats_col4 = st.columns(4)
+            stats_col1.metric("平均価格", f"${stats['mean']:.2f}\n(¥{int(stats['mean'] * scraper.exchange_rate)})")
+            stats_col2.metric("最低価格", f"${stats['min']:.2f}\n(¥{int(stats['min'] * scraper.exchange_rate)})")
+            stats_col3.metric("最高価格", f"${stats['max']:.2f}\n(¥{int(stats['max'] * scraper.exchange_rate)})")
+            stats_col4.metric("商品数", f"{stats['count']}")
         except Exception as e:
-            st.error(f"検索中にエラーが発生しました: {str(e)}")
-            st.error(traceback.format_exc())
-            st.warning("eBayからのデータ取得に失敗しました。モックデータを使用しますか？")
-            use_mock = st.button("モックデータを使用", key="error_mock")
-            if use_mock:
-                st.session_state['use_mock_data'] = True
-                return self._get_mock_data(keyword, limit, item_condition)
-            return []
-    
-    def _get_mock_data(self, keyword, limit=10, condition=None):
-        """モックデータを生成する"""
-        countries = ["Japan", "United States", "China", "United Kingdom", "Germany", "France"]
-        sellers = ["yokitackle", "takuai", "active-sports-08", "gaku_jpshop", "japan-higasi-116"]
-        shop_names = [["YOKI Fishing Gear Emporium"], ["Mother Lake Japan"], ["sparky-co-ltd"], ["gaku_jpshop"], "N/A"]
-        conditions = ["新品", "中古", "不明"]
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        mock_items = []
-        
-        for i in range(min(limit, 20)):
-            price = round(random.uniform(20, 500), 2)
-            price_jpy = int(price * self.exchange_rate)
-            seller_idx = random.randint(0, len(sellers)-1)
-            
-            # 条件が指定されている場合はそれを使用、なければランダム
-            item_condition = condition if condition else random.choice(conditions)
-            
-            mock_items.append({
-                'タイトル': f"{keyword} アイテム #{i+1} (モックデータ)",
-                '価格': price,
-                '価格（円）': price_jpy,
-                '価格（表示）': f"US ${price}",
-                '配送': random.choice(["送料無料", f"JPY {random.randint(5, 30)}00.0", "不明"]),
-                '状態': item_condition,
-                '場所': random.choice(countries),
-                '出品者': sellers[seller_idx],
-                'ショップ名': shop_names[seller_idx],
-                '出品日時': current_date,
-                'リンク': "https://www.ebay.com/",
-                '画像URL': "https://via.placeholder.com/150"
-            })
-        return mock_items
+            st.error(f"グラフ表示エラー: {str(e)}")
+
+    with tab4:
+        try:
+            keywords = df['キーワード'].unique().tolist() if 'キーワード' in df.columns else []
+            render_history(get_listing_store(), keywords or [st.session_state.get('last_keyword')])
+        except Exception as e:
+            st.error(f"履歴表示エラー: {str(e)}")
+
+    render_export(df, result_hash)
+
+# 計測の段階の表示名
+STAGE_LABELS = {
+    search_metrics.STAGE_CACHE: "キャッシュの参照",
+    search_metrics.STAGE_QUEUE: "順番待ち（レート制限）",
+    search_metrics.STAGE_COALESCED: "同じ検索の結果待ち",
+    search_metrics.STAGE_HOMEPAGE: "トップページ（Cookie取得）",
+    search_metrics.STAGE_REQUEST: "検索ページの取得",
+    search_metrics.STAGE_PARSE: "HTMLの解析",
+    search_metrics.STAGE_DATAFRAME: "DataFrameの作成",
+    search_metrics.STAGE_DEDUP: "重複の除去・グループ化",
+    search_metrics.STAGE_RENDER: "描画",
+    "search": "検索全体",
+    "rerun": "再実行全体",
+}
+
+def render_metrics(metrics):
+    """段階ごとの処理時間とカウンタの表示（デバッグモード用）"""
+    import pandas as pd
+
+    with st.expander("処理時間の計測", expanded=True):
+        summary = metrics.summary()
+        counters = summary["counters"]
+        lookups = counters.get(search_metrics.COUNTER_CACHE_HITS, 0) + counters.get(search_metrics.COUNTER_CACHE_MISSES, 0)
+        col1, col2, col3, col4, col5, col6 = st.columns(6)
+        col1.metric("リクエスト", counters.get(search_metrics.COUNTER_REQUESTS, 0))
+        col2.metric("キャッシュのヒット率",
+                    f"{counters.get(search_metrics.COUNTER_CACHE_HITS, 0) / lookups:.0%}" if lookups else "-")
+        col3.metric("ロボット検出", counters.get(search_metrics.COUNTER_ROBOT_CHECKS, 0))
+        col4.metric("解析した商品", counters.get(search_metrics.COUNTER_ITEMS_PARSED, 0))
+        col5.metric("除外した商品", counters.get(search_metrics.COUNTER_ITEMS_DROPPED, 0),
+                    help="解析エラーの商品と、前のページと重複した商品")
+        col6.metric("共有した取得", counters.get(search_metrics.COUNTER_COALESCED, 0),
+                    help="ほかのセッションが同時に実行した同じ条件の検索の結果を使い、リクエストを送らなかったページ数")
+
+        # 段階ごとの処理時間（直近500回の分布）
+        stages = pd.DataFrame([
+            {"段階": STAGE_LABELS.get(stage, stage), "回数": values["count"],
+             **{label: values[key] * 1000 if values[key] is not None else None
+                for key, label in [("mean", "平均（ms）"), ("p50", "p50（ms）"), ("p95", "p95（ms）"), ("max", "最大（ms）")]}}
+            for stage, values in summary["stages"].items()
+        ])
+        if not stages.empty:
+            st.dataframe(stages, hide_index=True, use_container_width=True,
+                         column_config={label: st.column_config.NumberColumn(format="%.1f")
+                                        for label in ["平均（ms）", "p50（ms）", "p95（ms）", "最大（ms）"]})
+
+        # 直近の検索の段階ごとの内訳
+        searches = metrics.recent_traces("search")
+        if searches:
+            trace = searches[0]
+            st.write(f"直近の検索（{trace.started_at:%H:%M:%S}）: {trace.duration:.2f}秒")
+            totals = pd.Series({STAGE_LABELS.get(stage, stage): seconds * 1000
+                                for stage, seconds in trace.stage_totals().items()}, name="処理時間（ms）")
+            st.bar_chart(totals, horizontal=True)
+
+        col1, col2, col3 = st.columns(3)
+        col1.download_button("トレース（JSON Lines）", metrics.to_jsonl(), file_name="traces.jsonl",
+                             mime="application/x-ndjson")
+        col2.download_button("メトリクス（Prometheus形式）", metrics.to_prometheus(), file_name="metrics.prom",
+                             mime="text/plain")
+        # ファイルへの書き出しはプロセス全体の設定（以降の検索・再実行のたびに更新する）
+        writing = metrics.prometheus_path is not None
+        if col3.toggle("ファイルに書き出す", value=writing,
+                       help=f"{DEFAULT_METRICS_DIR} の traces.jsonl にトレースを追記し、metrics.prom を更新します") != writing:
+            if writing:
+                metrics.jsonl_path = metrics.prometheus_path = None
+            else:
+                metrics.jsonl_path = os.path.join(DEFAULT_METRICS_DIR, "traces.jsonl")
+                metrics.prometheus_path = os.path.join(DEFAULT_METRICS_DIR, "metrics.prom")
+                metrics.write_prometheus(metrics.prometheus_path)
 
 def main():
+    # Streamlitの設定
+    st.set_page_config(
+        page_title="eBay商品検索",
+        page_icon="🔍",
+        layout="wide"
+    )
+
     try:
-        scraper = EbayScraper(requests_per_minute=3)  # 分あたりのリクエスト数を3に削減
+        scraper = get_scraper()
         
         st.title("eBay商品検索アプリ")
         st.markdown("""
@@ -335,6 +592,20 @@ def main():
                                       help="ドル円の為替レート。現在の為替レートに合わせて調整してください。")
             scraper.exchange_rate = new_rate
             st.write(f"現在の為替レート: $1 = ¥{scraper.exchange_rate}")
+            # ドル以外の通貨の価格・送料のドル換算（指定しない場合は price_normalizer の既定値）
+            if st.checkbox("ドル以外の通貨の換算レートを指定する", key='custom_usd_rates'):
+                from price_normalizer import USD_RATES
+                
+                rate_cols = st.columns(len(FOREIGN_CURRENCIES))
+                scraper.usd_rates = {**USD_RATES, **{
+                    currency: col.number_input(f"1 {currency} = $", min_value=0.01, max_value=100.0,
+                                               value=USD_RATES[currency], step=0.01, key=f'usd_rate_{currency}')
+                    for col, currency in zip(rate_cols, FOREIGN_CURRENCIES)
+                }}
+            else:
+                scraper.usd_rates = None
+                st.caption(f"{'・'.join(FOREIGN_CURRENCIES)} の価格・送料は、2024年初め頃のおおよその固定レートで"
+                           "ドルに換算しています。")
         
         # 開発者モード（トラブルシューティング用）
         with st.expander("開発者オプション"):
@@ -345,25 +616,80 @@ def main():
                 st.session_state['use_mock_data'] = False
                 st.success("実際のデータを使用モードに設定しました")
             st.write(f"現在のモード: {'モックデータ' if st.session_state.get('use_mock_data', False) else '実際のデータ'}")
+            # モックデータの件数・シード（表・カード・グラフ・エクスポートの負荷試験用）
+            mock_col1, mock_col2 = st.columns(2)
+            with mock_col1:
+                st.selectbox("モックデータの件数", MOCK_ROW_OPTIONS, key='mock_rows',
+                             format_func=lambda rows: "取得件数と同じ" if rows is None else f"{rows:,}件")
+            with mock_col2:
+                st.number_input("モックデータのシード", min_value=0, value=0, step=1, key='mock_seed',
+                                help="同じシードでは同じデータを生成します。")
+            st.checkbox("検索結果ページのHTMLを生成して解析する", key='mock_html',
+                        help="モックデータを実際のページと同じ構造のHTMLにしてから解析します（解析の負荷試験用）。")
+            
+            # 検索キャッシュ
+            st.checkbox("キャッシュを使用しない（常にeBayから取得）", key='bypass_cache')
+            cache = scraper.cache
+            # 有効期間はこのセッションの検索だけに使う（共有のキャッシュの保存期間は変えない）
+            scraper.cache_max_age = st.number_input("キャッシュ有効期間（分）", min_value=1, max_value=CACHE_TTL_MINUTES,
+                                                    value=DEFAULT_CACHE_MAX_AGE_MINUTES, step=5, key='cache_max_age',
+                                                    help="この期間より前に取得した検索結果は使わずに取得し直します。") * 60
+            cache_stats = cache.stats()
+            st.write(f"キャッシュ: {cache_stats['entries']}件 / {cache_stats['bytes'] / 1024 / 1024:.1f}MB"
+                     f"（ヒット {cache_stats['hits']}・ミス {cache_stats['misses']}・"
+                     f"ヒット率 {cache_stats['hit_rate']:.0%}）")
+            if st.button("キャッシュをクリア"):
+                cache.clear()
+                st.success("キャッシュをクリアしました")
+            
+            # HTTPレスポンスの記録・再生（オフラインでの再現・ベンチマーク用）
+            http_mode = st.radio("HTTPモード", ["通常", "記録", "再生"], horizontal=True,
+                                 help="記録: eBayからのレスポンスを保存します。再生: 保存したレスポンスを使い、eBayには接続しません。")
+            scraper.session = get_http_session()
+            if http_mode != "通常":
+                fixtures_dir = st.text_input("記録の保存先", value=DEFAULT_FIXTURES_DIR)
+                scraper.session = get_fixture_session(http_mode, fixtures_dir)
+                if http_mode == "記録":
+                    st.write(f"記録済み: {scraper.session.recorder.recorded}件")
+                else:
+                    adapter = scraper.session.replay_adapter
+                    st.write(f"再生: ヒット {adapter.hits}件・記録なし {adapter.misses}件")
+            
+            # リクエストスケジューラ（全セッション共通）
+            scheduler_stats = scraper.scheduler.stats()
+            st.write(f"リクエスト: 分あたり{scheduler_stats['requests_per_minute']}件 / "
+                     f"待機中 {scheduler_stats['queued']}件・送信済み {scheduler_stats['completed']}件・"
+                     f"失敗 {scheduler_stats['failed']}件")
+            flight_stats = scraper.flights.stats()
+            st.write(f"同じ条件の同時検索: 取得中 {flight_stats['in_flight']}件 / "
+                     f"取得 {flight_stats['executed']}件・結果を共有 {flight_stats['coalesced']}件")
             
             # デバッグオプション
-            debug_mode = st.checkbox("デバッグモード", value=False)
+            debug_mode = st.checkbox("デバッグモード", value=False, key='debug_mode')
             if debug_mode:
                 st.info("デバッグモードが有効になっています。エラーの詳細が表示されます。")
-                # デバッグ関数の定義
-                def st_debug(message):
-                    if debug_mode:
-                        st.text(f"DEBUG: {message}")
-                st.debug = st_debug
-            else:
-                # 何もしないデバッグ関数
-                st.debug = lambda x: None
+        
+        # 保存した検索の差分（取得はバックグラウンドのスレッドが行う）
+        try:
+            render_watchlists(get_watchlist())
+        except Exception as e:
+            st.warning(f"ウォッチリストを読み込めませんでした: {str(e)}")
+        
+        # 一括検索では複数のキーワードをまとめて検索し、結果を1つの表にまとめる
+        search_mode = st.radio("検索モード", ["単一キーワード", "一括検索"], horizontal=True)
+        batch_mode = search_mode == "一括検索"
         
         with st.form(key='search_form'):
             col1, col2 = st.columns(2)
             
             with col1:
-                keyword = st.text_input("検索キーワード", placeholder="例: vintage camera")
+                if batch_mode:
+                    keyword = ""
+                    keywords_text = st.text_area("検索キーワード（1行に1つ）", placeholder="vintage camera\nfilm camera")
+                    keyword_file = st.file_uploader("キーワードのCSVファイル", type=["csv", "txt"],
+                                                    help="「keyword」「キーワード」「SKU」列があればその列を、なければ先頭の列を使います。")
+                else:
+                    keyword = st.text_input("検索キーワード", placeholder="例: vintage camera")
                 selected_category = st.selectbox(
                     "カテゴリー",
                     options=list(scraper.categories.keys()),
@@ -397,144 +723,120 @@ def main():
                     index=0
                 )
             
+            # 取得件数（1ページ50件を超える場合は複数ページを順に取得）
+            col3, col4 = st.columns(2)
+            with col3:
+                limit = st.number_input("取得件数" + ("（キーワードごと）" if batch_mode else ""),
+                                        min_value=10, max_value=2000, value=50, step=50)
+            with col4:
+                max_pages = st.number_input("最大ページ数", min_value=1, max_value=40, value=10, step=1,
+                                            help="1ページあたり50件。ページごとにリクエスト間隔の待機が入ります。")
+            
             submit_button = st.form_submit_button(label="検索")
         
-        if submit_button and keyword:
+        keywords = parse_keywords(keywords_text, keyword_file) if batch_mode and submit_button else []
+        if submit_button and batch_mode and not keywords:
+            st.warning("検索キーワードを入力するか、CSVファイルをアップロードしてください。")
+        
+        if submit_button and (keyword or keywords):
+            scraper.use_mock_data = st.session_state.get('use_mock_data', False)
+            scraper.mock_rows = st.session_state.get('mock_rows')
+            scraper.mock_seed = int(st.session_state.get('mock_seed', 0))
+            scraper.mock_html = st.session_state.get('mock_html', False)
+            scraper.bypass_cache = st.session_state.get('bypass_cache', False)
             with st.spinner("検索中..."):
-                category_id = scraper.categories[selected_category]
-                condition_val = None if condition == "すべて" else condition
-                from_country_code = scraper.countries[from_country]
-                to_country_code = scraper.countries[to_country]
+                # 単一・一括検索で共通の検索条件
+                filters = {
+                    'category': scraper.categories[selected_category],
+                    'min_price': min_price if min_price > 0 else None,
+                    'max_price': max_price if max_price > 0 else None,
+                    'condition': None if condition == "すべて" else condition,
+                    'from_country': scraper.countries[from_country],
+                    'to_country': scraper.countries[to_country]
+                }
                 
-                search_results = scraper.search(
-                    keyword=keyword,
-                    category=category_id,
-                    min_price=min_price if min_price > 0 else None,
-                    max_price=max_price if max_price > 0 else None,
-                    condition=condition_val,
-                    from_country=from_country_code,
-                    to_country=to_country_code
-                )
+                from price_normalizer import normalize_prices
+                from result_schema import frame_hash, to_frame
                 
-                if search_results:
-                    df = pd.DataFrame(search_results)
-                    
-                    # 検索結果の保存
-                    st.session_state['search_results'] = df
+                # 検索1回分（取得・解析・DataFrameの作成）の処理時間を記録する
+                with scraper.metrics.trace("search", keywords=len(keywords) if batch_mode else 1):
+                    if batch_mode:
+                        search_results = run_batch_search(scraper, keywords, int(limit), int(max_pages), **filters)
+                    else:
+                        search_results = run_single_search(scraper, keyword, int(limit), int(max_pages), **filters)
                     
-                    # タブを作成
-                    tab1, tab2, tab3 = st.tabs(["テーブル表示", "カード表示", "グラフ"])
-                    
-                    with tab1:
-                        # 安全にリンク列を処理
-                        try:
-                            # リンク列をマスク
-                            df_display = df.copy()
-                            # リンクを「商品ページ」というテキストに置き換え
-                            df_display['リンク'] = ['商品ページ' for _ in range(len(df))]
-                            
-                            # 表示するカラムを設定
-                            display_columns = ['タイトル', '価格', '価格（円）', '配送', '状態', '場所', '出品者', 'リンク']
-                            st.dataframe(df_display[display_columns], use_container_width=True)
-                        except Exception as e:
-                            st.error(f"テーブル表示エラー: {str(e)}")
-                            st.dataframe(df[['タイトル', '価格', '価格（円）', '配送', '状態', '場所', '出品者']], use_container_width=True)
-                    
-                    with tab2:
+                    if search_results:
+                        # 価格・送料を正規化する（桁区切り・価格の範囲・通貨・送料込みの合計）
+                        with scraper.metrics.span(search_metrics.STAGE_DATAFRAME):
+                            df = normalize_prices(to_frame(search_results), scraper.exchange_rate, scraper.usd_rates)
+                
+                if search_results:
+                    # 検索結果を商品データベースに蓄積する（商品IDのない行・モックデータは保存しない）
+                    st.session_state['last_keyword'] = keyword
+                    if not batch_mode:
+                        # ウォッチリストに保存できるように検索条件を残す
+                        st.session_state['last_search'] = {'keyword': keyword, **filters}
+                    if not st.session_state.get('use_mock_data', False):
                         try:
-                            # カード表示
-                            for i in range(0, len(df), 3):
-                                cols = st.columns(3)
-                                for j in range(3):
-                                    if i+j < len(df):
-                                        with cols[j]:
-                                            try:
-                                                item = df.iloc[i+j]
-                                                # 画像URLが有効か確認
-                                                img_url = item['画像URL'] if item['画像URL'] and item['画像URL'].startswith('http') else "https://via.placeholder.com/150"
-                                                st.image(img_url, width=150)
-                                                
-                                                # 商品タイトルを表示
-                                                title = item['タイトル']
-                                                if len(title) > 50:
-                                                    title = title[:50] + "..."
-                                                st.markdown(f"**{title}**")
-                                                
-                                                # 価格と配送情報
-                                                st.markdown(f"価格: **{item['価格（表示）']}** (¥{item['価格（円）']})")
-                                                st.markdown(f"配送: {item['配送']}")
-                                                st.markdown(f"場所: {item['場所']}")
-                                                st.markdown(f"出品者: {item['出品者']}")
-                                                
-                                                # リンクが有効か確認
-                                                link = item['リンク'] if item['リンク'] and item['リンク'].startswith('http') else "https://www.ebay.com"
-                                                st.markdown(f"[商品ページを開く]({link})")
-                                            except Exception as card_error:
-                                                st.warning(f"カード表示エラー: {str(card_error)}")
+                            rows = [{**row, '価格': price} for row, price in zip(search_results, df['価格'].tolist())]
+                            saved = get_listing_store().upsert(rows, keyword=keyword)
+                            if saved['new'] or saved['updated']:
+                                st.caption(f"履歴に保存しました（新規 {saved['new']}件・更新 {saved['updated']}件・"
+                                           f"価格変更 {saved['price_changes']}件）")
                         except Exception as e:
-                            st.error(f"カード表示エラー: {str(e)}")
+                            st.warning(f"履歴の保存に失敗しました: {str(e)}")
                     
-                    with tab3:
-                        try:
-                            # 価格分布のヒストグラム
-                            fig = px.histogram(df, x="価格", nbins=20, title="価格分布")
-                            st.plotly_chart(fig, use_container_width=True)
-                            
-                            # 発送元の円グラフ
-                            if '場所' in df.columns:
-                                fig_location = px.pie(df, names='場所', title="発送元の分布")
-                                st.plotly_chart(fig_location, use_container_width=True)
-                            
-                            # 統計情報
-                            stats_col1, stats_col2, stats_col3, stats_col4 = st.columns(4)
-                            stats_col1.metric("平均価格", f"${df['価格'].mean():.2f}\n(¥{int(df['価格'].mean() * scraper.exchange_rate)})")
-                            stats_col2.metric("最低価格", f"${df['価格'].min():.2f}\n(¥{int(df['価格'].min() * scraper.exchange_rate)})")
-                            stats_col3.metric("最高価格", f"${df['価格'].max():.2f}\n(¥{int(df['価格'].max() * scraper.exchange_rate)})")
-                            stats_col4.metric("商品数", f"{len(df)}")
-                        except Exception as e:
-                            st.error(f"グラフ表示エラー: {str(e)}")
+                    # 同じ商品の重複を除き、同じ出品者のほぼ同じタイトルの商品（再出品など）をグループにまとめる
+                    import dedup
+                    with scraper.metrics.span(search_metrics.STAGE_DEDUP):
+                        unique_df = dedup.drop_duplicate_items(df)
+                        if len(unique_df) < len(df):
+                            st.caption(f"重複していた{len(df) - len(unique_df)}件を除きました")
+                        df = dedup.add_groups(unique_df)
                     
-                    # CSVダウンロード
-                    try:
-                        # CSVエクスポート用のデータフレームを準備
-                        export_df = df.copy()
-                        
-                        # CSVとして必要なカラムの名前マッピング
-                        column_mapping = {
-                            'タイトル': '商品名',
-                            '配送': '送料'
-                        }
-                        
-                        # 添付ファイルのカラム順を維持するためのマッピング
-                        export_df = export_df.rename(columns=column_mapping)
-                        
-                        # 標準の出力カラム順を設定
-                        export_columns = ['商品名', '価格', '価格（円）', '送料', '状態', '場所', '出品者', 'ショップ名', '出品日時']
-                        
-                        # 欠けているカラムがあれば追加
-                        for col in export_columns:
-                            if col not in export_df.columns:
-                                export_df[col] = ""
-                        
-                        # カラム順を設定
-                        export_df = export_df[export_columns]
-                        
-                        # CSVとしてエクスポート
-                        csv = export_df.to_csv(index=False).encode('utf-8')
-                        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        
-                        st.download_button(
-                            label="検索結果をCSVとして保存",
-                            data=csv,
-                            file_name=f"ebay_results_{current_time}.csv",
-                            mime="text/csv",
-                        )
-                    except Exception as e:
-                        st.error(f"CSVダウンロードエラー: {str(e)}")
-                        st.error(traceback.format_exc())
+                    # 検索結果の保存（ハッシュ値はグラフ・エクスポートのキャッシュのキー）
+                    st.session_state['search_results'] = df
+                    st.session_state['search_results_hash'] = frame_hash(df)
+                    st.session_state['search_results_rate'] = scraper.exchange_rate
+                    st.session_state['search_results_usd_rates'] = scraper.usd_rates
+                    # 前の検索結果の絞り込みの条件は選択肢が変わるため解除する
+                    for key in FILTER_KEYS:
+                        st.session_state.pop(key, None)
                 else:
+                    st.session_state.pop('search_results', None)
                     st.warning("検索結果が見つかりませんでした。検索条件を変更してお試しください。")
-    
+        
+        # 表示の切り替えやダウンロードの操作で再実行された場合も、保存した検索結果を表示する
+        if 'search_results' in st.session_state:
+            df = st.session_state['search_results']
+            # 為替レートが変わった場合は円の列だけを計算し直す（再検索はしない）
+            if st.session_state.get('search_results_usd_rates') != scraper.usd_rates:
+                # ドル以外の通貨の換算レートが変わった場合は、表示の価格・送料から正規化し直す
+                from price_normalizer import normalize_prices
+                from result_schema import frame_hash
+                df = normalize_prices(df, scraper.exchange_rate, scraper.usd_rates)
+                st.session_state['search_results'] = df
+                st.session_state['search_results_hash'] = frame_hash(df)
+                st.session_state['search_results_rate'] = scraper.exchange_rate
+                st.session_state['search_results_usd_rates'] = scraper.usd_rates
+            elif st.session_state.get('search_results_rate') != scraper.exchange_rate:
+                from price_normalizer import apply_exchange_rate
+                df = apply_exchange_rate(df, scraper.exchange_rate)
+                st.session_state['search_results'] = df
+                st.session_state['search_results_rate'] = scraper.exchange_rate
+            
+            filtered_df, filter_key = render_filters(df)
+            if filtered_df.empty:
+                st.info("絞り込みの条件に一致する商品がありません。")
+            else:
+                # 集計・エクスポートのキャッシュは検索結果・為替レート・絞り込みの条件ごと
+                result_key = f"{st.session_state['search_results_hash']}:{scraper.exchange_rate}:{filter_key}"
+                with scraper.metrics.span(search_metrics.STAGE_RENDER):
+                    render_results(filtered_df, scraper, result_key)
+        
+        if st.session_state.get('debug_mode', False):
+            render_metrics(scraper.metrics)
+
     except Exception as e:
         st.error(f"アプリケーションエラー: {str(e)}")
         st.error(traceback.format_exc())
@@ -543,5 +845,7 @@ if __name__ == "__main__":
     # セッション状態の初期化
     if 'use_mock_data' not in st.session_state:
         st.session_state['use_mock_data'] = False
-    
-    main() 
\ No newline at end of file
+
+    # 再実行ごとの処理時間を記録する（検索・描画の段階は開発者オプションの計測の表示で確認できる）
+    with get_metrics().trace("rerun"):
+        main() 
\ No newline at end of file
@@ -0,0 +1,269 @@
+"""複数キーワードの一括検索
+
+全キーワードの取得をレート制限スケジューラに登録し、届いたレスポンスから順に
+解析用のワーカープールで解析する（解析中も後続の取得は並行して進む）。
+結果は「キーワード」列を付けた1つのリストにまとめる。
+"""
+import io
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics as search_metrics
+from listing_parser import parse_listings
+
+# キーワード状態の表示名
+STATUS_QUEUED = "待機中"
+STATUS_FETCHING = "取得中"
+STATUS_PARSING = "解析中"
+STATUS_DONE = "完了"
+STATUS_ERROR = "エラー"
+STATUS_CANCELLED = "中断"
+
+# キーワード列の見出し（大文字小文字・前後の空白は区別しない）
+KEYWORD_COLUMNS = {"keyword", "keywords", "キーワード", "sku"}
+
+
+def parse_keywords(text="", csv_file=None):
+    """テキスト（1行1キーワード）とCSVファイルからキーワードのリストを作る（重複は除く）"""
+    keywords = [line.strip() for line in (text or "").splitlines()]
+
+    if csv_file is not None:
+        import pandas as pd
+
+        data = csv_file.getvalue() if hasattr(csv_file, "getvalue") else csv_file.read()
+        if isinstance(data, bytes):
+            data = data.decode("utf-8-sig")
+        try:
+            frame = pd.read_csv(io.StringIO(data), dtype=str, header=None)
+        except pd.errors.EmptyDataError:
+            # 空ファイル・空行だけのファイルはCSV側のキーワードなしとして扱う
+            frame = pd.DataFrame({0: pd.Series(dtype=str)})
+        # 1行目にキーワード列の見出しがあればその列を、なければ（見出しなしとみなして）先頭の列を使う
+        header = [str(value).strip().lower() for value in frame.iloc[0]] if len(frame) else []
+        column = next((i for i, name in enumerate(header) if name in KEYWORD_COLUMNS), None)
+        if column is None:
+            values = frame[0]
+        else:
+            values = frame[column].iloc[1:]
+        keywords.extend(values.dropna().str.strip())
+
+    return list(dict.fromkeys(k for k in keywords if k))
+
+
+class BatchSearch:
+    """キーワードごとの取得と解析を並行して進める一括検索
+
+    - parse_workers: 解析に使うスレッド数（lxmlは解析中にGILを解放する）
+    - parse_executor: スレッドの代わりに使う Executor（ProcessPoolExecutor なども指定可能）
+    """
+
+    def __init__(self, scraper, parse_workers=2, parse_executor=None):
+        self.scraper = scraper
+        self.parse_workers = parse_workers
+        self.parse_executor = parse_executor
+
+    def run(self, keywords, limit=50, max_pages=1, use_cache=True, on_progress=None, poll_interval=0.5, **filters):
+        """一括検索を実行し、(結果の行のリスト, キーワードごとの進捗) を返す
+
+        filters には EbayScraper.build_params と同じ検索条件（category, min_price など）を渡す。
+        on_progress は進捗が変わるたび（および待機中は poll_interval 秒ごと）に進捗の辞書で呼ばれる。
+        処理時間とカウンタは呼び出したスレッドで実行中のトレース（scraper.metrics.trace）に記録する。
+        """
+        scraper = self.scraper
+        trace = scraper.metrics.current_trace()
+        condition = filters.get("condition")
+        progress = {
+            keyword: {"状態": STATUS_QUEUED, "ページ": 0, "件数": 0, "待ち時間（秒）": None, "メッセージ": ""}
+            for keyword in keywords
+        }
+        rows_by_keyword = {keyword: [] for keyword in keywords}
+        seen_links = {keyword: set() for keyword in keywords}
+        pending = {}
+        # この一括検索が実行している取得・解析（ほかのセッションが同じ検索の結果を待っている場合がある）
+        leading = {}
+        # 取得ごとのこれまでの再送の回数
+        attempts = {}
+        stopped = False
+
+        executor = self.parse_executor or ThreadPoolExecutor(max_workers=self.parse_workers,
+                                                              thread_name_prefix="ebay-parse")
+
+        def page_params(keyword, page):
+            params = scraper.build_params(keyword, **filters)
+            if page > 1:
+                params["_pgn"] = str(page)
+            return params
+
+        def start_page(keyword, page):
+            params = page_params(keyword, page)
+            if use_cache and scraper.cache is not None:
+                cached = scraper.cached_rows(params, trace=trace)
+                if cached is not None:
+                    add_rows(keyword, page, cached)
+                    return
+            # ほかのセッションが同じ条件のページを取得中ならリクエストを送らずにその結果を待つ
+            key, flight, leader = scraper.join_flight(params, trace=trace)
+            if not leader:
+                pending[flight] = ("shared", keyword, page, params, time.perf_counter())
+                return
+            leading[key] = flight
+            # 最初の確認の後に前のリーダーが完了した場合は、その結果がキャッシュにある
+            if use_cache and scraper.cache is not None:
+                cached = scraper.cached_rows(params, trace=trace, recheck=True)
+                if cached is not None:
+                    settle(params, cached)
+                    add_rows(keyword, page, cached)
+                    return
+            submit(keyword, page, params)
+
+        def submit(keyword, page, params, attempt=0):
+            request = scraper.submit_page(params, trace=trace)
+            attempts[request.future] = attempt
+            pending[request.future] = ("fetch", keyword, page, params, request)
+
+        def settle(params, rows=None, exception=None, cancel=False):
+            """実行した取得・解析の結果を、同じ検索の結果を待っている呼び出し元に渡す"""
+            key = scraper.flight_key(params)
+            flight = leading.pop(key, None)
+            if flight is None:
+                return
+            if cancel:
+                scraper.flights.cancel(key, flight)
+            else:
+                scraper.finish_flight(key, flight, rows, exception)
+
+        def add_rows(keyword, page, rows):
+            state = progress[keyword]
+            state["ページ"] = page
+            collected = rows_by_keyword[keyword]
+            new_rows = scraper.drop_seen_rows(rows, seen_links[keyword], trace=trace)
+            collected.extend(new_rows[:limit - len(collected)])
+            state["件数"] = len(collected)
+
+            # 次のページが必要か判定（件数不足・ページが満杯・最大ページ数未満・新しい商品あり）
+            if (not stopped and len(collected) < limit and page < max_pages
+                    and new_rows and len(rows) >= scraper.page_size):
+                start_page(keyword, page + 1)
+            elif not any(entry[1] == keyword for entry in pending.values()):
+                state["状態"] = STATUS_DONE
+                state["待ち時間（秒）"] = None
+
+        def report():
+            for entry in pending.values():
+                if entry[0] == "fetch":
+                    state = progress[entry[1]]
+                    if entry[4].position() is None:
+                        state["状態"] = STATUS_FETCHING
+                        state["待ち時間（秒）"] = None
+                    else:
+                        state["状態"] = STATUS_QUEUED
+                        state["待ち時間（秒）"] = round(entry[4].eta())
+                elif entry[0] == "shared":
+                    # ほかのセッションが取得中の同じ条件のページの結果待ち
+                    progress[entry[1]]["状態"] = STATUS_FETCHING
+                    progress[entry[1]]["待ち時間（秒）"] = None
+            if on_progress is not None:
+                on_progress(progress)
+
+        try:
+            for keyword in keywords:
+                start_page(keyword, 1)
+            report()
+
+            while pending:
+                done, _ = wait(list(pending), timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, keyword, page, params, extra = pending.pop(future)
+                    state = progress[keyword]
+                    if kind == "shared":
+                        scraper.metrics.observe(search_metrics.STAGE_COALESCED, time.perf_counter() - extra,
+                                                start=extra, trace=trace)
+                        if future.cancelled():
+                            # 実行していたセッションが中断した場合は取得し直す
+                            start_page(keyword, page)
+                            continue
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        if kind != "shared":
+                            settle(params, exception=e)
+                        state["状態"] = STATUS_ERROR
+                        state["メッセージ"] = str(e)
+                        scraper.metrics.incr(search_metrics.COUNTER_ERRORS, trace=trace)
+                        continue
+
+                    if kind == "shared":
+                        if result is None:
+                            state["状態"] = STATUS_ERROR
+                            state["メッセージ"] = "ロボット検出"
+                            stopped = True
+                            for cancelled in self._cancel_fetches(pending, progress):
+                                settle(cancelled, cancel=True)
+                            continue
+                        add_rows(keyword, page, scraper.shared_rows(future))
+                    elif kind == "fetch":
+                        attempt = attempts.pop(future, 0)
+                        if not stopped and scraper.retry_after_error(result, attempt, trace=trace):
+                            # 混雑・一時的なエラーは待ち時間を空けて送り直す（再送もレート制限の対象）
+                            submit(keyword, page, params, attempt + 1)
+                            continue
+                        if result.status_code >= 400:
+                            state["状態"] = STATUS_ERROR
+                            state["メッセージ"] = f"HTTP {result.status_code}"
+                            scraper.metrics.incr(search_metrics.COUNTER_ERRORS, trace=trace)
+                            settle(params, exception=RuntimeError(state["メッセージ"]))
+                            continue
+                        if scraper.is_robot_check(result, trace=trace):
+                            # ロボット検出時は残りの取得をすべて取り消す
+                            state["状態"] = STATUS_ERROR
+                            state["メッセージ"] = "ロボット検出"
+                            stopped = True
+                            settle(params, None)
+                            for cancelled in self._cancel_fetches(pending, progress):
+                                settle(cancelled, cancel=True)
+                            continue
+                        state["状態"] = STATUS_PARSING
+                        state["待ち時間（秒）"] = None
+                        if self.parse_executor is None:
+                            parse_future = executor.submit(scraper.parse_page, result.text, condition, trace=trace)
+                        else:
+                            # 別プロセスの Executor にはスクレイパーを渡せないため、解析の関数だけを渡す
+                            parse_future = executor.submit(parse_listings, result.text, condition, scraper.exchange_rate)
+                        pending[parse_future] = ("parse", keyword, page, params, result.text)
+                    else:
+                        # キャッシュを使わない場合も、取得した結果でキャッシュを更新する
+                        if result and scraper.cache is not None:
+                            scraper.cache.set(params, extra, result)
+                        settle(params, result)
+                        if self.parse_executor is not None:
+                            scraper.metrics.incr(search_metrics.COUNTER_ITEMS_PARSED, len(result), trace=trace)
+                        add_rows(keyword, page, result)
+                report()
+        except BaseException:
+            # 画面の再実行などで中断された場合は未送信のリクエストを取り消し、
+            # 同じ検索の結果を待っている呼び出し元には中断を知らせる
+            self._cancel_fetches(pending, progress)
+            for key, flight in leading.items():
+                scraper.flights.cancel(key, flight)
+            raise
+        finally:
+            if self.parse_executor is None:
+                executor.shutdown(wait=False)
+
+        results = []
+        for keyword in keywords:
+            for row in rows_by_keyword[keyword]:
+                results.append({'キーワード': keyword, **row})
+        return results, progress
+
+    @staticmethod
+    def _cancel_fetches(pending, progress):
+        """未送信の取得を取り消す（取り消した取得の検索パラメータのリストを返す）"""
+        cancelled = []
+        for future, entry in list(pending.items()):
+            if entry[0] == "fetch" and future.cancel():
+                del pending[future]
+                progress[entry[1]]["状態"] = STATUS_CANCELLED
+                progress[entry[1]]["待ち時間（秒）"] = None
+                cancelled.append(entry[3])
+        return cancelled
@@ -0,0 +1,131 @@
+"""重複の除去と似たタイトルのグループ化のベンチマーク
+
+出品者ごとに商品のタイトルを作り、その一部を少し変えた再出品（単語の追加・削除・大文字小文字・
+記号の違い）と同じ商品IDの重複を混ぜた検索結果を作る。dedup.drop_duplicate_items と
+dedup.add_groups（MinHash + LSH）の処理時間を計測し、小さい件数ではすべての組み合わせの
+Jaccard 係数を計算する方法と比べて、同じグループにまとめた組の一致率も表示する。
+
+使い方:
+    python benchmarks/bench_dedup.py [--rows 10000 100000] [--exact-rows 3000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import dedup
+
+WORDS = ("vintage camera lens canon nikon minolta olympus pentax film body mint tested working japan "
+         "rare boxed manual auto focus zoom prime wide tele 35mm 50mm 28mm 135mm f1.4 f1.8 f2.8 black "
+         "silver chrome strap cap case flash meter shutter slr rangefinder excellent near").split()
+
+
+def make_frame(count, seed=0):
+    """count 件の検索結果を作る（約3割が再出品、約1割が商品IDの重複）"""
+    rng = np.random.default_rng(seed)
+    sellers = [f"seller_{i}" for i in range(max(1, count // 40))]
+    titles, seller_names, links = [], [], []
+    originals = []
+    for i in range(count):
+        if originals and rng.random() < 0.1:
+            # 同じ商品が別のページ・検索にも出てきた
+            source = originals[rng.integers(len(originals))]
+            titles.append(titles[source])
+            seller_names.append(seller_names[source])
+            links.append(links[source])
+            continue
+        if originals and rng.random() < 0.3:
+            # 同じ出品者の再出品（タイトルを少しだけ変える）
+            source = originals[rng.integers(len(originals))]
+            words = titles[source].split()
+            change = rng.integers(3)
+            if change == 0:
+                words.append(str(rng.choice(WORDS)))
+            elif change == 1 and len(words) > 6:
+                words.pop(int(rng.integers(len(words))))
+            else:
+                words = [word.upper() if rng.random() < 0.3 else word + "!" if rng.random() < 0.1 else word
+                         for word in words]
+            titles.append(" ".join(words))
+            seller_names.append(seller_names[source])
+        else:
+            titles.append(" ".join(rng.choice(WORDS, size=int(rng.integers(8, 14)), replace=False)))
+            seller_names.append(sellers[rng.integers(len(sellers))])
+            originals.append(i)
+        links.append(f"https://www.ebay.com/itm/{300000000000 + i}")
+    return pd.DataFrame({
+        'タイトル': pd.array(titles, dtype="string"),
+        '出品者': pd.Categorical(seller_names),
+        'リンク': pd.array(links, dtype="string"),
+        '価格': rng.uniform(10, 500, size=count).astype(np.float32),
+    })
+
+
+def exact_pairs(df, threshold):
+    """すべての組み合わせの Jaccard 係数から、同じグループにすべき組を求める（O(n²)）"""
+    token_sets = [set(dedup.pd.Series([title]).str.lower().str.findall(dedup.TOKEN_PATTERN)[0])
+                  for title in df['タイトル'].fillna("")]
+    sellers = df['出品者'].astype(str).tolist()
+    pairs = set()
+    for i in range(len(df)):
+        for j in range(i + 1, len(df)):
+            if sellers[i] != sellers[j]:
+                continue
+            union = len(token_sets[i] | token_sets[j])
+            if union and len(token_sets[i] & token_sets[j]) / union >= threshold:
+                pairs.add((i, j))
+    return pairs
+
+
+def grouped_pairs(groups):
+    pairs = set()
+    for members in pd.Series(np.arange(len(groups))).groupby(groups).groups.values():
+        members = sorted(members)
+        pairs.update((a, b) for k, a in enumerate(members) for b in members[k + 1:])
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="検索結果の件数")
+    parser.add_argument("--exact-rows", type=int, default=3000, help="すべての組み合わせと比べる件数（0で省略）")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最速の結果を採用）")
+    args = parser.parse_args()
+
+    for count in args.rows:
+        df = make_frame(count)
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            unique = dedup.drop_duplicate_items(df)
+            dedup_time = time.perf_counter() - start
+            grouped = dedup.add_groups(unique)
+            times.append((time.perf_counter() - start, dedup_time))
+        total, dedup_time = min(times)
+        groups = grouped['グループ'].nunique()
+        print(f"{count:>7}件: 重複除去 {dedup_time * 1000:>7.1f} ms ({len(df) - len(unique)}件除去)  "
+              f"グループ化まで {total * 1000:>8.1f} ms ({count / total:>9.0f} rows/sec)  "
+              f"{len(unique)}件 → {groups}グループ")
+
+    if args.exact_rows:
+        df = dedup.drop_duplicate_items(make_frame(args.exact_rows, seed=1))
+        start = time.perf_counter()
+        expected = exact_pairs(df, dedup.SIMILARITY_THRESHOLD)
+        exact_time = time.perf_counter() - start
+        start = time.perf_counter()
+        found = grouped_pairs(dedup.title_groups(df))
+        lsh_time = time.perf_counter() - start
+        recall = len(found & expected) / len(expected) if expected else 1.0
+        precision = len(found & expected) / len(found) if found else 1.0
+        print(f"すべての組み合わせ（{len(df)}件）: {exact_time * 1000:.1f} ms / MinHash + LSH: {lsh_time * 1000:.1f} ms"
+              f"  再現率 {recall:.1%}・適合率 {precision:.1%}（グループ内の組の比較）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
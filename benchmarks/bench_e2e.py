@@ -0,0 +1,118 @@
+"""検索処理全体のベンチマーク（ネットワーク不要）
+
+記録したレスポンスを再生する EbaySession を使い、ebay_scraper.EbayScraper の検索から
+解析・DataFrame作成・CSVエクスポートまでを 1/10/100 ページ分で計測する。
+各段階の所要時間（中央値）と全体の遅延のパーセンタイル、items/sec を表示する。
+
+--fixtures を指定しない場合は、benchmarks/samples のページから合成した記録を使う。
+実際のレスポンスで計測するには、アプリの開発者オプション「HTTPモード: 記録」で
+検索してから --fixtures にその保存先と --keyword に検索キーワードを指定する。
+
+使い方:
+    python benchmarks/bench_e2e.py [--pages 1 10 100] [--repeat 5] [--fixtures DIR --keyword KW]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import requests
+
+import ebay_scraper
+import metrics
+from bench_parser import load_samples
+from http_fixtures import save_fixture
+from http_session import HOME_URL, EbaySession
+from rate_limiter import RequestScheduler
+from result_export import export_bytes
+from result_schema import to_frame
+
+ITEM_LINK_RE = re.compile(r'/itm/(\d+)')
+
+
+def build_synthetic_fixtures(directory, scraper, keyword, pages):
+    """サンプルページから pages ページ分の検索結果の記録を作る（商品IDはページごとに変える）"""
+    samples = load_samples()
+    save_fixture(directory, HOME_URL, "<html><body></body></html>")
+    for page in range(1, pages + 1):
+        params = scraper.build_params(keyword)
+        if page > 1:
+            params["_pgn"] = str(page)
+        url = requests.Request("GET", ebay_scraper.SEARCH_URL, params=params).prepare().url
+        body = ITEM_LINK_RE.sub(lambda m: f"/itm/{page:04d}{m.group(1)}", samples[(page - 1) % len(samples)])
+        save_fixture(directory, url, body, headers={"Content-Type": "text/html; charset=utf-8"})
+
+
+def run_once(scraper, keyword, pages):
+    """1回分を計測する（段階ごとの処理時間は scraper.metrics のトレースから取り出す）"""
+    with scraper.metrics.trace("bench", pages=pages) as trace:
+        start = time.perf_counter()
+        rows = scraper.search(keyword, limit=pages * scraper.page_size, max_pages=pages)
+        search_time = time.perf_counter() - start
+
+        with scraper.metrics.span(metrics.STAGE_DATAFRAME):
+            df = to_frame(rows)
+
+        with scraper.metrics.span("export"):
+            export_bytes(df, "CSV")
+
+    stages = trace.stage_totals()
+    request_time = stages.get(metrics.STAGE_HOMEPAGE, 0.0) + stages.get(metrics.STAGE_REQUEST, 0.0)
+    parse_time = stages.get(metrics.STAGE_PARSE, 0.0)
+    return len(rows), {
+        "リクエスト": request_time,
+        "解析": parse_time,
+        "その他": search_time - request_time - parse_time,
+        "DataFrame": stages.get(metrics.STAGE_DATAFRAME, 0.0),
+        "エクスポート": stages.get("export", 0.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100], help="取得するページ数")
+    parser.add_argument("--repeat", type=int, default=5, help="ページ数ごとの計測回数")
+    parser.add_argument("--fixtures", help="記録したレスポンスのディレクトリ（省略時は合成した記録を使う）")
+    parser.add_argument("--keyword", default="vintage camera", help="検索キーワード")
+    args = parser.parse_args()
+
+    # レート制限の待機は計測しない
+    scheduler = RequestScheduler(requests_per_minute=60 * 1000 * 1000)
+    fixtures_dir = args.fixtures
+    if fixtures_dir is None:
+        fixtures_dir = tempfile.mkdtemp(prefix="ebay_fixtures_")
+        build_synthetic_fixtures(fixtures_dir, ebay_scraper.EbayScraper(scheduler=scheduler), args.keyword, max(args.pages))
+
+    scraper = ebay_scraper.EbayScraper(session=EbaySession(replay_dir=fixtures_dir), scheduler=scheduler)
+
+    stages = ["リクエスト", "解析", "その他", "DataFrame", "エクスポート"]
+    print(f"{'ページ':>6} {'件数':>6} " + " ".join(f"{s:>10}" for s in stages)
+          + f" {'p50':>9} {'p90':>9} {'p99':>9} {'items/sec':>10}")
+    for pages in args.pages:
+        totals = []
+        stage_times = {stage: [] for stage in stages}
+        items = 0
+        for _ in range(args.repeat):
+            items, timings = run_once(scraper, args.keyword, pages)
+            totals.append(sum(timings.values()))
+            for stage in stages:
+                stage_times[stage].append(timings[stage])
+        p50, p90, p99 = np.percentile(totals, [50, 90, 99])
+        print(f"{pages:>6} {items:>6} "
+              + " ".join(f"{np.median(stage_times[s]) * 1000:>8.1f}ms" for s in stages)
+              + f" {p50 * 1000:>7.1f}ms {p90 * 1000:>7.1f}ms {p99 * 1000:>7.1f}ms {items / p50:>10.0f}")
+
+    replay = scraper.session.replay_adapter
+    if replay.misses:
+        print(f"記録のないリクエストが {replay.misses}件ありました（--fixtures と --keyword を確認してください）")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""大量の検索結果での処理時間のベンチマーク（負荷試験）
+
+mock_data で生成した検索結果に対して、アプリが検索後・表示のたびに行う処理（DataFrameの作成、
+価格の正規化、重複の除去とグループ化、絞り込み、グラフの集計、カード表示の1ページ、
+CSVのエクスポート）を1段階ずつ計測し、件数が増えた時にどこが遅くなるかを表示する。
+生成した検索結果ページのHTMLの解析速度も計測し、解析結果が生成した行と一致することを確認する
+（一致しない場合は終了コード1で終了する）。
+
+使い方:
+    python benchmarks/bench_mock_load.py [--rows 10000 100000 1000000] [--html-rows 10000] [--seed 0]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import card_grid
+import chart_data
+import dedup
+import listing_parser
+import mock_data
+import result_export
+from price_normalizer import normalize_prices
+from result_filter import filter_frame
+from result_schema import frame_hash, to_frame
+
+KEYWORD = "vintage camera"
+CURRENT_DATE = "2024-01-01"
+CARD_PAGE_SIZE = 24
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def measure_pipeline(count, seed):
+    """件数 count の検索結果でアプリの各段階の処理時間を計測する（段階名と秒のリスト）"""
+    timings = []
+
+    def stage(name, func):
+        result, seconds = _timed(func)
+        timings.append((name, seconds))
+        return result
+
+    rows = stage("モックデータの生成", lambda: mock_data.generate_rows(KEYWORD, count, seed=seed,
+                                                                  current_date=CURRENT_DATE))
+    df = stage("DataFrameの作成", lambda: to_frame(rows))
+    df = stage("価格の正規化", lambda: normalize_prices(df))
+    df = stage("重複の除去・グループ化", lambda: dedup.add_groups(dedup.drop_duplicate_items(df)))
+    stage("ハッシュ値", lambda: frame_hash(df))
+    filtered = stage("絞り込み", lambda: filter_frame(df, price_range=(10, 500), title="Vintage"))
+    grouped = stage("グループの集約", lambda: dedup.collapse_groups(filtered))
+    stage("グラフの集計", lambda: chart_data.aggregate(grouped))
+    stage("カード表示（1ページ）", lambda: card_grid.build_card_grid(
+        card_grid.page_slice(card_grid.sort_frame(filtered, "価格の安い順"), 1, CARD_PAGE_SIZE)))
+    stage("CSVのエクスポート", lambda: result_export.export_bytes(filtered, "CSV"))
+    return timings, df
+
+
+def measure_html(count, seed):
+    """生成したHTMLの解析速度を計測し、解析結果が生成した行と一致する件数を返す"""
+    rows = mock_data.generate_rows(KEYWORD, count, seed=seed, current_date=CURRENT_DATE)
+    pages, generate_time = _timed(lambda: mock_data.generate_pages(KEYWORD, count, seed=seed))
+    parsed, parse_time = _timed(lambda: [row for page in pages
+                                         for row in listing_parser.parse_listings(page, current_date=CURRENT_DATE)])
+    # 解析では状態は検索条件の値（指定なしの場合は「不明」）になる
+    matched = sum(1 for row, parsed_row in zip(rows, parsed) if {**row, '状態': "不明"} == parsed_row)
+    size = sum(len(page) for page in pages)
+    print(f"HTML {count}件（{len(pages)}ページ・{size / 1024 / 1024:.1f}MB）: 生成 {generate_time * 1000:.1f} ms  "
+          f"解析 {parse_time * 1000:.1f} ms ({count / parse_time:.0f} rows/sec・{listing_parser.default_backend()})  "
+          f"一致 {matched} / {len(parsed)}件")
+    return matched == len(rows) == len(parsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="検索結果の件数")
+    parser.add_argument("--html-rows", type=int, default=10000, help="HTMLを生成して解析する件数（0で省略）")
+    parser.add_argument("--seed", type=int, default=0, help="モックデータのシード")
+    args = parser.parse_args()
+
+    for count in args.rows:
+        timings, df = measure_pipeline(count, args.seed)
+        total = sum(seconds for _, seconds in timings)
+        print(f"--- {count}件（重複除去後 {len(df)}件・{df['グループ'].nunique()}グループ・"
+              f"メモリ {df.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MB）")
+        for name, seconds in timings:
+            print(f"{name:<16} {seconds * 1000:>9.1f} ms  {seconds / total:>4.0%}")
+        print(f"{'合計':<16} {total * 1000:>9.1f} ms")
+
+    if args.html_rows and not measure_html(args.html_rows, args.seed):
+        print("解析結果が生成した行と一致しません")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
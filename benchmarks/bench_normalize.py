@@ -0,0 +1,73 @@
+"""価格・送料の正規化のベンチマーク（rows/sec）
+
+サンプルページの解析結果を複製した検索結果に対して、従来の1件ずつの価格の抽出
+（re.search で最初の数字だけを取り出す）と price_normalizer.normalize_prices の
+列単位の処理を比較する。従来の処理と価格が異なる件数（桁区切りなど）も表示する。
+
+使い方:
+    python benchmarks/bench_normalize.py [--rows 10000 100000]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from bench_schema import make_rows
+from price_normalizer import normalize_prices
+from result_schema import to_frame
+
+LEGACY_PRICE_RE = re.compile(r'(\d+\.\d+)|(\d+)')
+
+
+def legacy_prices(df, exchange_rate):
+    """変更前の価格の抽出（1件ずつ正規表現で最初の数字を取り出す）"""
+    prices = []
+    for price_text in df['価格（表示）']:
+        match = LEGACY_PRICE_RE.search(price_text)
+        price = float(match.group(1) or match.group(2)) if match else 0.0
+        prices.append((price, int(price * exchange_rate)))
+    return prices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="検索結果の件数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最速の結果を採用）")
+    parser.add_argument("--exchange-rate", type=float, default=150.0, help="USD/JPY為替レート")
+    args = parser.parse_args()
+
+    for count in args.rows:
+        df = to_frame(make_rows(count))
+        print(f"--- {count}件")
+
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            legacy = legacy_prices(df, args.exchange_rate)
+            times.append(time.perf_counter() - start)
+        legacy_time = min(times)
+        print(f"{'従来（価格のみ）':<18} {legacy_time * 1000:>8.1f} ms  ({count / legacy_time:>10.0f} rows/sec)")
+
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            normalized = normalize_prices(df, args.exchange_rate)
+            times.append(time.perf_counter() - start)
+        normalized_time = min(times)
+        print(f"{'normalize_prices':<18} {normalized_time * 1000:>8.1f} ms  ({count / normalized_time:>10.0f} rows/sec)"
+              "  価格・範囲・通貨・送料・合計")
+
+        legacy_price = np.array([price for price, _ in legacy], dtype=np.float32)
+        changed = int((~np.isclose(legacy_price, normalized['価格'].to_numpy())).sum())
+        shipping_known = int(normalized['送料（USD）'].notna().sum())
+        print(f"従来と価格が異なる行: {changed}件 / 送料を数値にできた行: {shipping_known}件")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""検索結果ページ解析のベンチマーク
+
+benchmarks/samples/ に保存したサンプルページ（eBayの li.s-item の構造を模した合成ページ）を使い、
+従来の解析処理（BeautifulSoup + 商品ごとに7回の select_one）と listing_parser の各バックエンドを比較する。
+解析結果が従来の処理と完全に一致することも確認し、一致しない場合は終了コード1で終了する。
+
+使い方:
+    python benchmarks/bench_parser.py [--repeat 5] [--min-speedup 1.5]
+"""
+import argparse
+import glob
+import gzip
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+import listing_parser
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples")
+CURRENT_DATE = "2024-01-01"
+
+
+def legacy_parse(html, condition=None, exchange_rate=150):
+    """変更前の EbayScraper.search の解析処理（比較用）"""
+    soup = BeautifulSoup(html, 'html.parser')
+    items = soup.select('li.s-item')
+    results = []
+    for item in items:
+        try:
+            title_elem = item.select_one('.s-item__title')
+            price_elem = item.select_one('.s-item__price')
+            link_elem = item.select_one('.s-item__link')
+            shipping_elem = item.select_one('.s-item__shipping')
+            location_elem = item.select_one('.s-item__location')
+            seller_elem = item.select_one('.s-item__seller-info-text')
+
+            if all([title_elem, price_elem, link_elem]) and "Shop on eBay" not in title_elem.text:
+                title = title_elem.text.strip()
+                price_text = price_elem.text.strip()
+                link = link_elem.get('href', 'https://www.ebay.com').split('?')[0]
+                if not link or not link.startswith('http'):
+                    link = 'https://www.ebay.com'
+                price_value = re.search(r'(\d+\.\d+)|(\d+)', price_text)
+                if price_value:
+                    price_str = price_value.group(1) if price_value.group(1) else price_value.group(2)
+                    price = float(price_str)
+                else:
+                    price = 0.0
+                price_jpy = int(price * exchange_rate)
+                shipping = shipping_elem.text.strip() if shipping_elem else "不明"
+                location = location_elem.text.strip() if location_elem else "不明"
+                seller = ""
+                shop_name = "N/A"
+                if seller_elem:
+                    seller_text = seller_elem.text.strip()
+                    seller_match = re.search(r'([a-zA-Z0-9._-]+)\s*\(', seller_text)
+                    if seller_match:
+                        seller = seller_match.group(1)
+                    shop_match = re.search(r'\((.*?)\)', seller_text)
+                    if shop_match:
+                        shop_name = shop_match.group(1)
+                img_elem = item.select_one('.s-item__image-img')
+                img_url = img_elem.get('src', '') if img_elem else ''
+                if not img_url or not img_url.startswith('http'):
+                    img_url = 'https://via.placeholder.com/150'
+                results.append({
+                    'タイトル': title,
+                    '価格': price,
+                    '価格（円）': price_jpy,
+                    '価格（表示）': price_text,
+                    '配送': shipping,
+                    '状態': condition or "不明",
+                    '場所': location,
+                    '出品者': seller,
+                    'ショップ名': [shop_name] if shop_name != "N/A" else "N/A",
+                    '出品日時': CURRENT_DATE,
+                    'リンク': link,
+                    '画像URL': img_url
+                })
+        except Exception:
+            continue
+    return results
+
+
+def load_samples():
+    pages = []
+    for path in sorted(glob.glob(os.path.join(SAMPLES_DIR, "*.html.gz"))):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+def bench(name, func, pages, repeat):
+    best = None
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = sum(len(func(html)) for html in pages)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    rate = items / best if best else float("inf")
+    print(f"{name:<24} {items:>6} items  {best * 1000:>9.1f} ms  {rate:>10.0f} items/sec")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数（最速の結果を採用）")
+    parser.add_argument("--min-speedup", type=float, default=None,
+                        help="既定バックエンドの速度向上がこの倍率を下回ったら終了コード1で終了する")
+    args = parser.parse_args()
+
+    pages = load_samples()
+    if not pages:
+        print(f"サンプルページが見つかりません: {SAMPLES_DIR}")
+        return 1
+
+    # 解析結果の一致確認
+    backends = ["lxml", "html.parser"] if listing_parser.HAS_LXML else ["html.parser"]
+    for backend in backends:
+        for html in pages:
+            expected = legacy_parse(html)
+            actual = listing_parser.parse_listings(html, current_date=CURRENT_DATE, backend=backend)
+            if actual != expected:
+                print(f"解析結果が従来の処理と一致しません（{backend}）")
+                return 1
+    print(f"解析結果の一致を確認しました（{', '.join(backends)}）")
+
+    baseline = bench("legacy (select_one)", legacy_parse, pages, args.repeat)
+    rates = {}
+    for backend in backends:
+        rates[backend] = bench(f"listing_parser ({backend})", lambda html, b=backend: listing_parser.parse_listings(
+            html, current_date=CURRENT_DATE, backend=b), pages, args.repeat)
+
+    speedup = rates[listing_parser.default_backend()] / baseline
+    print(f"速度向上（既定バックエンド {listing_parser.default_backend()}）: {speedup:.1f}倍")
+    if args.min_speedup is not None and speedup < args.min_speedup:
+        print(f"速度向上が基準（{args.min_speedup}倍）を下回りました")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""検索結果の保持形式のベンチマーク（メモリ使用量と処理速度）
+
+サンプルページの解析結果を複製して大量の検索結果を作り、従来の形式（辞書のリストから
+そのまま作った型なしの DataFrame）と result_schema.to_frame の型付き DataFrame を比較する。
+
+使い方:
+    python benchmarks/bench_schema.py [--rows 10000 100000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import listing_parser
+from bench_parser import CURRENT_DATE, load_samples
+from result_schema import to_frame
+
+
+def make_rows(count):
+    """サンプルページの解析結果を複製して count 件の行を作る（リンクは重複しないように変える）"""
+    base = []
+    for html in load_samples():
+        base.extend(listing_parser.parse_listings(html, current_date=CURRENT_DATE))
+    rows = []
+    for i in range(count):
+        row = dict(base[i % len(base)])
+        row['リンク'] = f"https://www.ebay.com/itm/{200000000000 + i}"
+        rows.append(row)
+    return rows
+
+
+def workload(df):
+    """画面で行う代表的な処理（価格の統計・発送元ごとの集計・絞り込み）"""
+    df['価格'].mean()
+    df.groupby('場所', observed=True)['価格'].agg(['count', 'mean'])
+    df[(df['価格'] >= 50) & (df['価格'] <= 500) & (df['出品者'] == 'takuai')]
+
+
+def measure(name, build, rows, repeat):
+    build_time = min(_timed(lambda: build(rows)) for _ in range(repeat))
+    df = build(rows)
+    work_time = min(_timed(lambda: workload(df)) for _ in range(repeat))
+    memory = df.memory_usage(deep=True).sum()
+    print(f"{name:<22} 作成 {build_time * 1000:>8.1f} ms  処理 {work_time * 1000:>7.1f} ms  "
+          f"メモリ {memory / 1024 / 1024:>8.2f} MB  ({len(rows) / build_time:>9.0f} rows/sec)")
+    return memory
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="検索結果の件数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最速の結果を採用）")
+    args = parser.parse_args()
+
+    for count in args.rows:
+        rows = make_rows(count)
+        print(f"--- {count}件")
+        legacy = measure("従来（型なし）", pd.DataFrame, rows, args.repeat)
+        typed = measure("result_schema", to_frame, rows, args.repeat)
+        print(f"メモリ使用量: 従来の {typed / legacy:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""同じ条件の同時検索をまとめる処理（single-flight）のベンチマーク
+
+複数のセッション（スレッド）が同じキーワードを同時に検索した場合に、eBayへのリクエスト数と
+全員の検索が終わるまでの時間を、SingleFlight をセッション間で共有した場合と共有しない場合で比べる。
+eBayには接続せず、mock_data で生成した検索結果ページを一定の遅延の後に返すセッションを使う。
+レート制限は --rpm の分あたりのリクエスト数（ランダムな遅延は入れない）で、全セッションで共有する。
+
+使い方:
+    python benchmarks/bench_single_flight.py [--sessions 5] [--keywords 2] [--pages 2] [--rpm 60]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics as search_metrics
+import mock_data
+from ebay_scraper import EbayScraper
+from rate_limiter import RequestScheduler
+from single_flight import SingleFlight
+
+
+class SimulatedResponse:
+    status_code = 200
+
+    def __init__(self, text, url):
+        self.text = text
+        self.url = url
+
+    def raise_for_status(self):
+        pass
+
+
+class SimulatedSession:
+    """検索結果ページを latency 秒後に返すセッション（送信したリクエスト数を数える）"""
+
+    def __init__(self, latency, page_size):
+        self.latency = latency
+        self.page_size = page_size
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def ensure_cookies(self, headers):
+        return False
+
+    def reset_cookies(self):
+        pass
+
+    def get(self, url, params=None, **kwargs):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        page = int(params.get("_pgn", 1))
+        rows = self.page_size * page
+        html = mock_data.generate_pages(params["_nkw"], rows, page_size=self.page_size)[page - 1]
+        return SimulatedResponse(html, url)
+
+
+def measure(shared, args):
+    """全セッションの検索が終わるまでの時間・リクエスト数・共有したページ数"""
+    session = SimulatedSession(args.latency, page_size=50)
+    scheduler = RequestScheduler(requests_per_minute=args.rpm, burst=1)
+    metrics = search_metrics.Metrics()
+    flights = SingleFlight() if shared else None
+    keywords = [f"vintage camera {i}" for i in range(args.keywords)]
+    errors = []
+
+    def run_session(keyword):
+        scraper = EbayScraper(session=session, scheduler=scheduler, metrics=metrics, flights=flights)
+        scraper.poll_interval = 0.05
+        try:
+            scraper.search(keyword, limit=50 * args.pages)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run_session, args=(keyword,))
+               for keyword in keywords for _ in range(args.sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, session.requests, metrics.summary()["counters"].get(search_metrics.COUNTER_COALESCED, 0), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=5, help="同じキーワードを同時に検索するセッション数")
+    parser.add_argument("--keywords", type=int, default=2, help="キーワードの数")
+    parser.add_argument("--pages", type=int, default=2, help="1回の検索で取得するページ数")
+    parser.add_argument("--rpm", type=float, default=60, help="分あたりのリクエスト数")
+    parser.add_argument("--latency", type=float, default=0.5, help="1リクエストの応答時間（秒）")
+    args = parser.parse_args()
+
+    searches = args.sessions * args.keywords
+    print(f"{searches}件の検索（{args.keywords}キーワード × {args.sessions}セッション・{args.pages}ページずつ）"
+          f"・分あたり{args.rpm:g}リクエスト")
+    for label, shared in (("共有しない", False), ("SingleFlight", True)):
+        elapsed, requests, coalesced, errors = measure(shared, args)
+        print(f"{label:<14} リクエスト {requests:>4}件  結果を共有 {coalesced:>4}ページ  "
+              f"全員の完了まで {elapsed:>7.1f} 秒" + (f"  エラー {len(errors)}件" if errors else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""アプリの起動時間のベンチマーク
+
+新しいPythonプロセスで app.py を AppTest で実行し、最初の表示（モジュールの読み込みを含む）
+までの時間と、チェックボックスの切り替えによる再実行の時間（中央値）を計測する。
+あわせて `python -X importtime` で app の読み込みに時間のかかっているモジュールを表示する。
+
+使い方:
+    python benchmarks/bench_startup.py [--runs 3] [--reruns 10] [--top 15]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 新しいプロセスで実行する計測（結果はJSONで標準出力に書く）
+RUN_APP = """
+import json, statistics, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=60)
+at.run()
+first = time.perf_counter() - start
+reruns = []
+for _ in range({reruns}):
+    start = time.perf_counter()
+    checkbox = at.checkbox(key="debug_mode")
+    checkbox.set_value(not checkbox.value).run()
+    reruns.append(time.perf_counter() - start)
+print(json.dumps({{"first": first, "rerun": statistics.median(reruns), "errors": len(at.exception)}}))
+"""
+
+
+def measure_app(reruns):
+    output = subprocess.run([sys.executable, "-c", RUN_APP.format(reruns=reruns)], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_times(module):
+    """python -X importtime の結果から module が直接読み込んだモジュールの（累積時間 μs, 名前）と合計を返す"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 名前の前の空白の数が読み込みの深さ（子のモジュールは親より先に出力される）
+        entries.append((int(cumulative), name.strip(), len(name) - len(name.lstrip())))
+
+    index = next(i for i, (_, name, _) in enumerate(entries) if name == module)
+    total, _, depth = entries[index]
+    children = []
+    for cumulative, name, child_depth in reversed(entries[:index]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 2:
+            children.append((cumulative, name))
+    return total, children
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="起動の計測回数（最速の結果を採用）")
+    parser.add_argument("--reruns", type=int, default=10, help="再実行の計測回数")
+    parser.add_argument("--top", type=int, default=15, help="表示するモジュールの数")
+    args = parser.parse_args()
+
+    results = [measure_app(args.reruns) for _ in range(args.runs)]
+    best = min(results, key=lambda result: result["first"])
+    print(f"最初の表示（新しいプロセス）: {best['first'] * 1000:>8.1f} ms")
+    print(f"再実行（中央値）            : {best['rerun'] * 1000:>8.1f} ms")
+    if best["errors"]:
+        print(f"アプリでエラーが発生しました: {best['errors']}件")
+
+    total, children = import_times("app")
+    print(f"\nimport app: {total / 1000:.1f} ms（app が読み込むモジュールの累積時間）")
+    for cumulative, name in sorted(children, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+    return 1 if best["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""カード表示のページ分割とHTML生成
+
+検索結果の DataFrame を並べ替えてから表示するページ分だけを切り出し、
+カードのグリッドを1つのHTMLにまとめて組み立てる。Streamlitの要素は結果の件数に
+関係なく1ページにつき1つだけになるため、件数が増えても描画時間が変わらない。
+"""
+import html
+
+import pandas as pd
+
+from listing_parser import DEFAULT_LINK, PLACEHOLDER_IMAGE
+
+PAGE_SIZES = [12, 24, 48, 96]
+
+# 並び順の表示名と（列名, 昇順か）の対応。None は取得した順
+SORT_OPTIONS = {
+    "取得順": None,
+    "価格の安い順": ('価格', True),
+    "価格の高い順": ('価格', False),
+    "送料込みの安い順": ('合計（USD）', True),
+    "出品日時の新しい順": ('出品日時', False),
+    "タイトル順": ('タイトル', True),
+}
+
+TITLE_LENGTH = 50
+
+CARD_GRID_STYLE = """
+<style>
+.card-grid {display: grid; grid-template-columns: repeat(auto-fill, minmax(220px, 1fr)); gap: 1rem;}
+.card-grid .card {border: 1px solid rgba(128, 128, 128, 0.3); border-radius: 0.5rem; padding: 0.75rem;
+                  display: flex; flex-direction: column; gap: 0.25rem; font-size: 0.9rem;}
+.card-grid .card img {width: 150px; height: 150px; object-fit: contain; align-self: center;}
+.card-grid .card .title {font-weight: bold;}
+</style>
+"""
+
+
+def sort_frame(df, sort_option):
+    """SORT_OPTIONS の並び順で並べ替える（同じ値の行は取得した順のまま）"""
+    order = SORT_OPTIONS.get(sort_option)
+    if order is None or order[0] not in df.columns:
+        return df
+    column, ascending = order
+    return df.sort_values(column, ascending=ascending, kind='stable', na_position='last')
+
+
+def page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+
+def page_slice(df, page, page_size):
+    """1から数えた page ページ目の行を切り出す"""
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
+
+
+def _text(series):
+    """列を表示用の文字列にそろえてHTMLエスケープする（欠損値は空文字）"""
+    values = series.astype(object).where(series.notna(), "").astype(str)
+    return values.map(html.escape)
+
+
+def _url(series, default):
+    """http で始まらないURLを default に置き換える"""
+    values = series.astype(object).where(series.notna(), "").astype(str)
+    return values.where(values.str.startswith('http'), default).map(lambda url: html.escape(url, quote=True))
+
+
+def build_card_grid(page_df):
+    """ページ分の行からカードのグリッドのHTMLを組み立てる"""
+    if page_df.empty:
+        return ""
+
+    titles = page_df['タイトル'].astype(object).where(page_df['タイトル'].notna(), "").astype(str)
+    titles = titles.where(titles.str.len() <= TITLE_LENGTH, titles.str.slice(0, TITLE_LENGTH) + "...")
+    yen = pd.to_numeric(page_df['価格（円）'], errors='coerce').fillna(0).astype('int64')
+
+    cards = (
+        '<div class="card">'
+        + '<img src="' + _url(page_df['画像URL'], PLACEHOLDER_IMAGE) + '" loading="lazy">'
+        + '<div class="title">' + titles.map(html.escape) + '</div>'
+        + '<div>価格: <b>' + _text(page_df['価格（表示）']) + '</b> (¥' + yen.astype(str) + ')</div>'
+        + '<div>配送: ' + _text(page_df['配送']) + '</div>'
+        + '<div>場所: ' + _text(page_df['場所']) + '</div>'
+        + '<div>出品者: ' + _text(page_df['出品者']) + '</div>'
+        + '<a href="' + _url(page_df['リンク'], DEFAULT_LINK) + '" target="_blank">商品ページを開く</a>'
+        + '</div>'
+    )
+    return CARD_GRID_STYLE + '<div class="card-grid">' + "".join(cards) + '</div>'
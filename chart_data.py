@@ -0,0 +1,44 @@
+"""グラフタブ用の集計
+
+価格のヒストグラムのビン・発送元ごとの件数・価格の統計をまとめて計算する。
+グラフには集計結果だけを渡すため、検索結果の件数に関係なくブラウザに送るデータ量と
+描画時間は一定になる。
+"""
+import numpy as np
+import pandas as pd
+
+HISTOGRAM_BINS = 20
+# 発送元の円グラフに個別に表示する上位の件数（それ以外は「その他」にまとめる）
+TOP_LOCATIONS = 10
+OTHER_LABEL = "その他"
+
+
+def aggregate(df, bins=HISTOGRAM_BINS, top_locations=TOP_LOCATIONS):
+    """ヒストグラム・発送元の件数・価格の統計を返す"""
+    prices = pd.to_numeric(df['価格'], errors='coerce').to_numpy(dtype=np.float64)
+    prices = prices[~np.isnan(prices)]
+
+    if len(prices):
+        counts, edges = np.histogram(prices, bins=bins)
+        stats = {"mean": float(prices.mean()), "min": float(prices.min()), "max": float(prices.max())}
+    else:
+        counts, edges = np.zeros(0, dtype=np.int64), np.zeros(1)
+        stats = {"mean": 0.0, "min": 0.0, "max": 0.0}
+    stats["count"] = len(df)
+
+    histogram = pd.DataFrame({
+        "価格": (edges[:-1] + edges[1:]) / 2,
+        "下限": edges[:-1],
+        "上限": edges[1:],
+        "件数": counts,
+    })
+
+    locations = None
+    if '場所' in df.columns:
+        location_counts = df['場所'].value_counts(dropna=True, sort=True)
+        if len(location_counts) > top_locations:
+            other = location_counts.iloc[top_locations:].sum()
+            location_counts = pd.concat([location_counts.iloc[:top_locations], pd.Series({OTHER_LABEL: other})])
+        locations = pd.DataFrame({"場所": location_counts.index.astype(str), "件数": location_counts.to_numpy()})
+
+    return {"histogram": histogram, "locations": locations, "stats": stats}
@@ -0,0 +1,157 @@
+"""ブラウザなしで実行する一括取得コマンド（夜間の定期取得など）
+
+キーワードのファイル（1行1キーワードのテキスト、またはキーワード列のあるCSV）を読み込み、
+アプリの一括検索と同じ処理（batch_search.BatchSearch）で取得して、
+価格・送料を正規化した結果を Parquet / CSV / JSON Lines のファイルに書き出す。
+
+使い方:
+    python crawl.py keywords.txt -o results.parquet [--limit 200] [--max-pages 4] [--rpm 3]
+    python crawl.py keywords.csv -o results.csv.gz --store data/listings.sqlite3
+    python crawl.py keywords.txt -o results.parquet --metrics-prom /var/lib/node_exporter/ebay.prom
+"""
+import argparse
+import logging
+import sys
+import time
+
+import batch_search
+from ebay_scraper import EbayScraper
+from http_session import EbaySession
+from listing_store import DEFAULT_STORE_PATH, ListingStore
+from metrics import STAGE_DATAFRAME, Metrics
+from price_normalizer import normalize_prices
+from rate_limiter import RequestScheduler
+from result_export import FORMATS, format_for_path, write_export
+from result_schema import to_frame
+from search_cache import SearchCache
+
+logger = logging.getLogger("crawl")
+
+CONDITIONS = {"新品": "新品", "new": "新品", "中古": "中古", "used": "中古"}
+
+
+def read_keywords(path):
+    """キーワードのファイルを読み込む（"-" は標準入力）"""
+    if path == "-":
+        return batch_search.parse_keywords(sys.stdin.read())
+    if path.lower().endswith(".csv"):
+        with open(path, "rb") as f:
+            return batch_search.parse_keywords(csv_file=f)
+    with open(path, encoding="utf-8-sig") as f:
+        return batch_search.parse_keywords(f.read())
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("keywords", help="キーワードのファイル（.txt / .csv、- で標準入力）")
+    parser.add_argument("-o", "--output", required=True, help="出力先（拡張子 .parquet / .csv / .csv.gz / .jsonl）")
+    parser.add_argument("--format", choices=list(FORMATS), help="出力形式（省略時は拡張子から判定）")
+    parser.add_argument("--limit", type=int, default=50, help="キーワードごとの取得件数")
+    parser.add_argument("--max-pages", type=int, default=1, help="キーワードごとの最大ページ数（1ページ50件）")
+
+    group = parser.add_argument_group("検索条件")
+    group.add_argument("--category", default="", help="eBayのカテゴリID")
+    group.add_argument("--min-price", type=float, help="最低価格（$）")
+    group.add_argument("--max-price", type=float, help="最高価格（$）")
+    group.add_argument("--condition", choices=list(CONDITIONS), help="商品の状態")
+    group.add_argument("--from-country", default="", help="発送元の国コード（例: JP）")
+    group.add_argument("--to-country", default="", help="発送先の国コード（例: JP）")
+    group.add_argument("--exchange-rate", type=float, default=150.0, help="USD/JPY為替レート")
+
+    group = parser.add_argument_group("取得の設定")
+    group.add_argument("--rpm", type=float, default=3, help="分あたりのリクエスト数")
+    group.add_argument("--jitter", type=float, nargs=2, default=(3, 8), metavar=("MIN", "MAX"),
+                       help="リクエストごとに追加するランダムな待ち時間（秒）")
+    group.add_argument("--request-workers", type=int, default=4, help="リクエストを送信するスレッド数")
+    group.add_argument("--parse-workers", type=int, default=2, help="解析に使うスレッド数")
+    group.add_argument("--no-cache", action="store_true", help="検索キャッシュを読まずに取得し直す")
+    group.add_argument("--replay", metavar="DIR", help="記録したレスポンスを再生する（eBayには接続しない）")
+    group.add_argument("--store", nargs="?", const=DEFAULT_STORE_PATH, metavar="PATH",
+                       help="取得結果を商品データベースにも蓄積する")
+    group = parser.add_argument_group("計測")
+    group.add_argument("--metrics-jsonl", metavar="PATH", help="段階ごとの処理時間のトレースを JSON Lines で追記する")
+    group.add_argument("--metrics-prom", metavar="PATH",
+                       help="処理時間のヒストグラムとカウンタを Prometheus のテキスト形式で書き出す")
+    parser.add_argument("-v", "--verbose", action="store_true", help="詳しいログを表示する")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+
+    fmt = args.format or format_for_path(args.output)
+    if fmt is None:
+        logger.error("出力形式を判定できません。--format を指定してください: %s", args.output)
+        return 2
+
+    keywords = read_keywords(args.keywords)
+    if not keywords:
+        logger.error("キーワードがありません: %s", args.keywords)
+        return 2
+
+    metrics = Metrics(jsonl_path=args.metrics_jsonl, prometheus_path=args.metrics_prom)
+    scraper = EbayScraper(
+        requests_per_minute=args.rpm,
+        cache=SearchCache(),
+        session=EbaySession(replay_dir=args.replay) if args.replay else EbaySession(),
+        scheduler=RequestScheduler(requests_per_minute=args.rpm, jitter=tuple(args.jitter),
+                                   max_workers=args.request_workers),
+        metrics=metrics,
+    )
+    scraper.exchange_rate = args.exchange_rate
+    filters = {
+        "category": args.category,
+        "min_price": args.min_price,
+        "max_price": args.max_price,
+        "condition": CONDITIONS.get(args.condition),
+        "from_country": args.from_country,
+        "to_country": args.to_country,
+    }
+
+    last_states = {}
+
+    def on_progress(progress):
+        for keyword, state in progress.items():
+            if last_states.get(keyword) != state["状態"]:
+                last_states[keyword] = state["状態"]
+                logger.info("%s: %s（%d件）%s", keyword, state["状態"], state["件数"],
+                            f" {state['メッセージ']}" if state["メッセージ"] else "")
+
+    logger.info("%d件のキーワードを取得します（分あたり%sリクエスト）", len(keywords), args.rpm)
+    start = time.perf_counter()
+    with metrics.trace("crawl", keywords=len(keywords)) as trace:
+        rows, progress = batch_search.BatchSearch(scraper, parse_workers=args.parse_workers).run(
+            keywords,
+            limit=args.limit,
+            max_pages=args.max_pages,
+            use_cache=not args.no_cache,
+            on_progress=on_progress,
+            **filters
+        )
+
+        with metrics.span(STAGE_DATAFRAME):
+            df = normalize_prices(to_frame(rows), args.exchange_rate)
+    logger.debug("段階ごとの処理時間: %s", ", ".join(f"{stage} {seconds:.2f}秒"
+                                                   for stage, seconds in trace.stage_totals().items()))
+    with open(args.output, "wb") as f:
+        write_export(df, fmt, f)
+    logger.info("%d件を %s に書き出しました（%.1f秒）", len(df), args.output, time.perf_counter() - start)
+
+    if args.store and rows:
+        prices = df['価格'].tolist()
+        saved = ListingStore(args.store).upsert([{**row, '価格': price} for row, price in zip(rows, prices)])
+        logger.info("商品データベースに保存しました（新規 %d件・更新 %d件・価格変更 %d件）",
+                    saved["new"], saved["updated"], saved["price_changes"])
+
+    failed = [keyword for keyword, state in progress.items()
+              if state["状態"] in (batch_search.STATUS_ERROR, batch_search.STATUS_CANCELLED)]
+    if failed:
+        logger.warning("%d件のキーワードで取得に失敗しました: %s", len(failed), ", ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
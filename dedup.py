@@ -0,0 +1,153 @@
+"""検索結果の重複の除去と、似たタイトルの商品のグループ化
+
+同じ商品がページ・キーワード・検索をまたいで何度も出てくると、価格分布や平均価格が
+偏る。「リンク」の商品IDが同じ行は1件にまとめ、さらに同じ出品者のほぼ同じタイトルの商品
+（再出品など）を MinHash と LSH（Locality Sensitive Hashing）で1つのグループにまとめる。
+すべての組み合わせを比べないため、10万件以上の結果でも数秒以内に終わる。
+"""
+import numpy as np
+import pandas as pd
+
+from listing_store import ITEM_ID_RE
+
+# 同じグループとみなすタイトルの単語の Jaccard 係数（MinHash による推定値）
+SIMILARITY_THRESHOLD = 0.8
+# MinHash の関数の数と LSH のバンドの数（1バンドあたり NUM_PERM / BANDS 個）
+# バンド8 × 8個の場合、類似度0.77前後から同じバケットに入る確率が高くなる
+NUM_PERM = 64
+BANDS = 8
+
+TOKEN_PATTERN = r'\w+'
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def item_ids(df):
+    """「リンク」から取り出した商品ID（取り出せない行は欠損値）"""
+    return df['リンク'].astype(object).astype(str).str.extract(ITEM_ID_RE, expand=False)
+
+
+def drop_duplicate_items(df):
+    """商品IDが同じ行を最初の1件だけ残して除く（商品IDのない行はそのまま残す）"""
+    ids = item_ids(df)
+    duplicated = ids.notna() & ids.duplicated()
+    if not duplicated.any():
+        return df
+    return df[~duplicated.to_numpy()].reset_index(drop=True)
+
+
+def _random_constants(rng, size):
+    """乗算用の奇数の64ビット整数"""
+    return rng.integers(1, 2 ** 63, size=size, dtype=np.uint64) | np.uint64(1)
+
+
+def minhash_signatures(titles, num_perm=NUM_PERM, seed=1):
+    """タイトルの単語の集合の MinHash（(行数, num_perm) の uint32 配列と、単語のある行のマスク）
+
+    ハッシュ関数は multiply-shift 方式（x ^ b）* a >> 32 で、異なる単語ごとに一度だけ計算して
+    表にし、行ごとの最小値は numpy の reduceat で求める。
+    """
+    # explode 後のインデックスを行の位置として使うため、0から始まる連番にそろえる
+    titles = pd.Series(titles, dtype=object).reset_index(drop=True).fillna("").astype(str)
+    tokens = titles.str.lower().str.findall(TOKEN_PATTERN).explode().dropna()
+    n = len(titles)
+    signatures = np.full((n, num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    has_tokens = np.zeros(n, dtype=bool)
+    if tokens.empty:
+        return signatures, has_tokens
+
+    rows = tokens.index.to_numpy()
+    codes, vocabulary = pd.factorize(tokens.to_numpy(dtype=object))
+    # explode は行の順番を保つので、行ごとの単語は連続している
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    token_rows = rows[starts]
+    has_tokens[token_rows] = True
+
+    rng = np.random.default_rng(seed)
+    multipliers = _random_constants(rng, num_perm)
+    offsets = rng.integers(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+    values = pd.util.hash_array(np.asarray(vocabulary, dtype=object)) & _MASK32
+    table = (((values[None, :] ^ offsets[:, None]) * multipliers[:, None]) >> np.uint64(32)).astype(np.uint32)
+    for k in range(num_perm):
+        signatures[token_rows, k] = np.minimum.reduceat(table[k][codes], starts)
+    return signatures, has_tokens
+
+
+def _components(n, left, right):
+    """辺 (left[i], right[i]) でつながった行に同じラベル（最小の行番号）を付ける"""
+    labels = np.arange(n)
+    if len(left) == 0:
+        return labels
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, left, labels[right])
+        np.minimum.at(labels, right, labels[left])
+        # ラベルをたどって根に寄せる（パスの短縮）
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def title_groups(df, threshold=SIMILARITY_THRESHOLD, num_perm=NUM_PERM, bands=BANDS, seed=1):
+    """同じ出品者のほぼ同じタイトルの行に同じグループ番号を付ける（0から、最初に出てきた順）
+
+    LSH でバンドのハッシュ値が一致した行だけを候補にし、MinHash で推定した類似度が
+    threshold 以上の行をつなぐ。出品者が分からない行はグループにまとめない。
+    """
+    n = len(df)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    sellers = df['出品者'].astype(object)
+    seller_codes, _ = pd.factorize(sellers.where(sellers.notna() & (sellers.astype(str) != ""), None))
+    signatures, has_tokens = minhash_signatures(df['タイトル'], num_perm, seed)
+    candidates = np.flatnonzero(has_tokens & (seller_codes >= 0))
+
+    rows_per_band = num_perm // bands
+    rng = np.random.default_rng(seed + 1)
+    band_multipliers = _random_constants(rng, rows_per_band + 1)
+    lefts, rights = [], []
+    for band in range(bands):
+        band_values = signatures[candidates, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+        keys = (band_values * band_multipliers[:rows_per_band]).sum(axis=1, dtype=np.uint64)
+        keys += seller_codes[candidates].astype(np.uint64) * band_multipliers[rows_per_band]
+
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        first = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        # 同じバケットの先頭（元の順番で最初の行）を代表にする
+        representative = candidates[order[np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))]]
+        members = candidates[order]
+        pairs = representative != members
+        if not pairs.any():
+            continue
+        members, representative = members[pairs], representative[pairs]
+        similarity = (signatures[members] == signatures[representative]).mean(axis=1)
+        matched = similarity >= threshold
+        lefts.append(members[matched])
+        rights.append(representative[matched])
+
+    if lefts:
+        labels = _components(n, np.concatenate(lefts), np.concatenate(rights))
+    else:
+        labels = np.arange(n)
+    groups, _ = pd.factorize(labels)
+    return groups
+
+
+def add_groups(df, threshold=SIMILARITY_THRESHOLD):
+    """「グループ」（似た商品のグループ番号）と「グループ件数」の列を追加する"""
+    groups = title_groups(df, threshold)
+    counts = np.bincount(groups)[groups] if len(groups) else groups
+    return df.assign(**{'グループ': groups.astype(np.int32), 'グループ件数': counts.astype(np.int32)})
+
+
+def collapse_groups(df):
+    """グループごとに最初の1行だけを残し、グループの行数を「件数」の列にする
+
+    絞り込み後の DataFrame にも使えるように、件数は渡された行から数える。
+    """
+    if 'グループ' not in df.columns:
+        return df.assign(件数=1)
+    counts = df['グループ'].map(df['グループ'].value_counts())
+    first = ~df['グループ'].duplicated().to_numpy()
+    return df[first].assign(件数=counts[first].to_numpy().astype(np.int32))
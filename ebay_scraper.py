@@ -0,0 +1,499 @@
+"""eBayの検索結果の取得と解析（UIに依存しないライブラリ）
+
+Streamlitのアプリ（app.py）と、ブラウザなしで実行する一括取得のコマンド（crawl.py）の
+両方から使う。画面への表示は行わず、取得の進み具合やエラーはイベント（辞書）として
+on_event に渡す。
+"""
+import logging
+import random
+import time
+from concurrent.futures import wait
+from types import MappingProxyType
+
+import metrics as search_metrics
+from http_session import EbaySession
+from listing_parser import DEFAULT_LINK, parse_listings
+from rate_limiter import RequestScheduler
+from search_cache import make_cache_key
+from single_flight import SingleFlight
+
+SEARCH_URL = "https://www.ebay.com/sch/i.html"
+
+# 検索結果の並び順（eBayの _sop）
+SORT_ENDING_SOON = "12"  # 終了日時: 近い順
+SORT_NEWLY_LISTED = "10"  # 出品日時: 新しい順（ウォッチリストの差分の取得で使う）
+
+# 再送する応答のステータス（eBayの混雑・制限による一時的なエラー）
+RETRY_STATUSES = (502, 503, 504)
+
+# イベントの種類（on_event に渡す辞書の "type"）
+EVENT_CACHE_HIT = "cache_hit"      # キャッシュから取得した
+EVENT_QUEUED = "queued"            # リクエストの順番待ち（position, eta）
+EVENT_SENDING = "sending"          # リクエストを送信中
+EVENT_COALESCED = "coalesced"      # ほかのセッションが取得中の同じ条件のページの結果を待っている
+EVENT_PAGE = "page"                # 1ページ分を取得した（rows, total）
+EVENT_ERROR = "error"              # 取得に失敗した（exception）。1ページ目なら結果なしで終了
+EVENT_ROBOT_CHECK = "robot_check"  # ロボット検出のページが返った
+EVENT_NO_RESULTS = "no_results"    # 1ページ目に商品がなかった
+EVENT_DEBUG = "debug"              # デバッグ用の情報
+
+logger = logging.getLogger(__name__)
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.0 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:90.0) Gecko/20100101 Firefox/90.0',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36 Edg/121.0.2277.128',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.6 Safari/605.1.15',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0'
+]
+
+# eBayのカテゴリリスト（簡略化版）
+CATEGORIES = {
+    "すべてのカテゴリ": "",
+    "アンティーク": "20081",
+    "アート": "550",
+    "ベビー": "2984",
+    "本、コミック、雑誌": "267",
+    "ビジネスと産業": "12576",
+    "カメラ、写真": "625",
+    "携帯電話、スマートフォン": "15032",
+    "衣類、靴、アクセサリー": "11450",
+    "コイン、紙幣": "11116",
+    "コレクション": "1",
+    "コンピュータ、タブレット": "58058",
+    "家電製品": "293",
+    "クラフト": "14339",
+    "人形、ぬいぐるみ": "237",
+    "DVDと映画": "11232",
+    "eBayモーターズ": "6000",
+    "エンターテイメントメモラビリア": "45100",
+    "ギフトカード、チケット": "172008",
+    "健康、美容": "26395",
+    "家、庭、DIY": "11700",
+    "ジュエリー、時計": "281",
+    "音楽": "11233",
+    "楽器、ギア": "619",
+    "ペット用品": "1281",
+    "陶器、ガラス": "870",
+    "不動産": "10542",
+    "スポーツ用品": "888",
+    "スポーツメモラビリア": "64482",
+    "おもちゃ、ホビー": "220",
+    "旅行": "3252",
+    "ビデオゲーム、コンソール": "1249"
+}
+
+# 国のリスト
+COUNTRIES = {
+    "すべての国": "",
+    "日本": "JP",
+    "アメリカ": "US",
+    "イギリス": "GB",
+    "ドイツ": "DE",
+    "フランス": "FR",
+    "中国": "CN",
+    "韓国": "KR",
+    "オーストラリア": "AU",
+    "カナダ": "CA",
+    "イタリア": "IT",
+    "スペイン": "ES",
+    "香港": "HK",
+    "シンガポール": "SG",
+    "タイ": "TH"
+}
+
+
+class EbayScraper:
+    """eBayの検索結果を取得・解析する
+
+    - use_mock_data: eBayに接続せずにモックデータ（mock_data で生成）を返す
+    - bypass_cache: キャッシュを読まずに取得し直す（取得した結果でキャッシュは更新する）
+    - cache_max_age: キャッシュを有効とみなす経過秒数（None の場合はキャッシュの ttl）。キャッシュは
+      全セッションで共有するため、有効期間はキャッシュではなくスクレイパー（セッション）ごとに持つ
+    - on_event: 取得の進み具合・エラーを受け取る関数（イベントの辞書を1つ受け取る）
+    - metrics: 段階ごとの処理時間とカウンタの記録先（metrics.Metrics）
+    - max_retries / retry_backoff: 502/503/504 の応答を再送する回数と、最初の再送までの秒数（再送ごとに倍）。
+      再送はスケジューラを通し、待ち時間は全セッションの送信に適用する
+    - flights: 実行中の同じ検索をまとめる SingleFlight（全セッションで共有すると、同時に実行された
+      同じ条件の検索はリクエスト・解析を1回だけ行い、結果を共有する）
+    """
+
+    def __init__(self, requests_per_minute=3, cache=None, session=None, scheduler=None, on_event=None, metrics=None,
+                 flights=None):  # 分あたりのリクエスト数を3に削減
+        self.requests_per_minute = requests_per_minute
+        self.cache = cache  # SearchCache（Noneの場合はキャッシュしない）
+        self.session = session or EbaySession()  # 接続とCookieを使い回す共有セッション
+        # リクエストの送信間隔を管理するスケジューラ（3～8秒のランダムな遅延を追加）
+        self.scheduler = scheduler or RequestScheduler(requests_per_minute, jitter=(3, 8))
+        self.page_size = 50  # 1ページあたりの取得件数（eBayの _ipg）
+        self.poll_interval = 0.5  # 順番待ちの通知間隔（秒）
+        self.max_retries = 2
+        self.retry_backoff = 10
+        self.use_mock_data = False
+        self.mock_rows = None  # モックデータの件数（None の場合は取得件数と同じ）
+        self.mock_seed = 0  # モックデータの乱数のシード（同じシードなら同じデータになる）
+        self.mock_html = False  # モックデータを検索結果ページのHTMLとして生成して解析する
+        self.bypass_cache = False
+        self.cache_max_age = None
+        self.on_event = on_event
+        self.metrics = metrics or search_metrics.Metrics()
+        self.flights = flights or SingleFlight()
+        # 静的な表はプロセス内で共有する
+        self.user_agents = USER_AGENTS
+        self.categories = CATEGORIES
+        self.countries = COUNTRIES
+        self.exchange_rate = 150  # USD to JPY exchange rate (仮の為替レート)
+        self.usd_rates = None  # ドル以外の通貨のドル換算レート（None の場合は price_normalizer.USD_RATES）
+    
+    def _get_random_user_agent(self):
+        return random.choice(self.user_agents)
+    
+    def build_params(self, keyword, category="", min_price=None, max_price=None, condition=None, from_country=None, to_country=None, sort=None):
+        params = {
+            "_nkw": keyword,
+            "_sacat": category,
+            "_sop": sort or SORT_ENDING_SOON,
+            "_ipg": str(self.page_size)  # 1ページあたりの結果数を50に減らす（負荷軽減）
+        }
+        
+        if min_price and max_price:
+            params["_udlo"] = min_price
+            params["_udhi"] = max_price
+        
+        if condition:
+            if condition == "新品":
+                params["LH_ItemCondition"] = "1000"
+            elif condition == "中古":
+                params["LH_ItemCondition"] = "3000"
+        
+        # 発送元の国を指定
+        if from_country and from_country != "":
+            params["LH_PrefLoc"] = "2"  # 2 = specified location
+            params["_fsradio"] = "&LH_LocatedIn=1"
+            params["_fsradio2"] = "&LH_LocatedIn=1"
+            params["_salic"] = from_country
+        
+        # 発送先の国を指定
+        if to_country and to_country != "":
+            params["LH_FS"] = "1"  # 1 = Will ship to selected location
+            params["_fsct"] = to_country
+        
+        return params
+    
+    def search(self, keyword, category="", min_price=None, max_price=None, condition=None, from_country=None, to_country=None, limit=50, max_pages=None, on_event=None):
+        """検索結果をすべて取得してリストで返す（limitが1ページを超える場合は複数ページを取得）"""
+        results = []
+        for page_rows in self.search_pages(keyword, category, min_price, max_price, condition,
+                                           from_country, to_country, limit=limit, max_pages=max_pages,
+                                           on_event=on_event):
+            results.extend(page_rows)
+        return results
+    
+    def search_pages(self, keyword, category="", min_price=None, max_price=None, condition=None, from_country=None, to_country=None, limit=50, max_pages=None, on_event=None, sort=None):
+        """検索結果をページ単位で順に返すジェネレータ
+        
+        limit件に達した時、max_pagesに達した時、空のページが返った時、または取得に失敗した時に終了する。
+        取得の進み具合と終了の理由は on_event（省略時は self.on_event）にイベントの辞書で通知する。
+        sort には検索結果の並び順（SORT_ENDING_SOON など）を指定する。
+        """
+        # 条件パラメータをローカル変数にコピーして、後で参照できるようにする
+        item_condition = condition
+        params = self.build_params(keyword, category, min_price, max_price, condition, from_country, to_country, sort)
+        emit = self._emitter(on_event)
+        
+        # モックデータの使用オプション
+        if self.use_mock_data:
+            # モックデータを返す
+            yield self._get_mock_data(keyword, limit, item_condition)
+            return
+        
+        remaining = limit
+        page = 1
+        seen_links = set()
+        while remaining > 0 and (max_pages is None or page <= max_pages):
+            page_params = dict(params)
+            if page > 1:
+                page_params["_pgn"] = str(page)
+            
+            try:
+                rows = self._fetch_page(page_params, item_condition, emit)
+            except Exception as e:
+                # 2ページ目以降の失敗はそれまでの結果を残して終了する
+                self.metrics.incr(search_metrics.COUNTER_ERRORS)
+                emit(EVENT_ERROR, f"{page}ページ目の取得に失敗しました: {str(e)}", page=page, exception=e)
+                return
+            
+            if rows is None:
+                emit(EVENT_ROBOT_CHECK, "eBayのロボット検出に引っかかりました。", page=page)
+                return
+            
+            # 最終ページを超えると同じページが返ることがあるため、新しい商品がなければ終了する
+            new_rows = self.drop_seen_rows(rows, seen_links)
+            if not new_rows:
+                if page == 1:
+                    emit(EVENT_NO_RESULTS, "検索条件に一致する商品が見つかりませんでした。", page=page)
+                return
+            
+            page_rows = new_rows[:remaining]
+            remaining -= len(page_rows)
+            emit(EVENT_PAGE, f"{page}ページ目: {len(page_rows)}件", page=page, rows=len(page_rows),
+                 total=limit - remaining)
+            yield page_rows
+            
+            # 1ページ分に満たない場合は最終ページ
+            if len(rows) < self.page_size:
+                return
+            page += 1
+    
+    def drop_seen_rows(self, rows, seen_links, trace=None):
+        """前のページまでに取得した商品を除いた行を返し、seen_links に新しい商品のリンクを追加する
+        
+        リンクのない行（プレースホルダーのリンク）は区別できないため除かない。
+        """
+        new_rows = [row for row in rows if row['リンク'] == DEFAULT_LINK or row['リンク'] not in seen_links]
+        seen_links.update(row['リンク'] for row in new_rows)
+        self.metrics.incr(search_metrics.COUNTER_ITEMS_DROPPED, len(rows) - len(new_rows), trace=trace)
+        return new_rows
+    
+    def _emitter(self, on_event):
+        """イベントを on_event とログに送る関数を作る"""
+        handler = on_event or self.on_event
+        
+        def emit(event_type, message, **data):
+            logger.debug("%s: %s", event_type, message)
+            if handler is not None:
+                handler({"type": event_type, "message": message, **data})
+        return emit
+    
+    def _request_headers(self):
+        return {
+            'User-Agent': self._get_random_user_agent(),
+            'Accept-Language': 'en-US,en;q=0.9,ja;q=0.8',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.8,image/webp,image/apng,*/*;q=0.5',
+            'Referer': 'https://www.ebay.com/',
+            'Sec-Fetch-Dest': 'document',
+            'Sec-Fetch-Mode': 'navigate',
+            'Sec-Fetch-Site': 'same-origin',
+            'Sec-Fetch-User': '?1',
+            'Upgrade-Insecure-Requests': '1',
+            'Cache-Control': 'max-age=0'
+        }
+    
+    def submit_page(self, params, trace=None):
+        """検索ページの取得をスケジューラに登録する（ScheduledRequestを返す）
+        
+        共有セッションのCookieは期限切れの場合のみトップページから取得し直す。
+        順番待ち・トップページ・検索ページの処理時間は trace（省略時はこのスレッドのトレース）に記録する。
+        """
+        trace = trace or self.metrics.current_trace()
+        return self.scheduler.submit(self._get_page, params, self._request_headers(), time.perf_counter(), trace)
+    
+    def _get_page(self, params, headers, submitted_at, trace):
+        """スケジューラのスレッドで検索ページを取得する"""
+        start = time.perf_counter()
+        self.metrics.observe(search_metrics.STAGE_QUEUE, start - submitted_at, start=submitted_at, trace=trace)
+        if self.session.ensure_cookies(headers):
+            self.metrics.observe(search_metrics.STAGE_HOMEPAGE, time.perf_counter() - start, start=start, trace=trace)
+            self.metrics.incr(search_metrics.COUNTER_REQUESTS, trace=trace)
+        self.metrics.incr(search_metrics.COUNTER_REQUESTS, trace=trace)
+        with self.metrics.span(search_metrics.STAGE_REQUEST, trace=trace):
+            return self.session.get(SEARCH_URL, params=params, headers=headers, timeout=20, refresh_cookies=False)
+    
+    def retry_after_error(self, response, attempt, trace=None):
+        """502/503/504 の応答を再送するかどうか（再送する場合はスケジューラの送信を遅らせる）
+        
+        attempt はこれまでの再送の回数。待ち時間は Retry-After ヘッダーがあればその秒数（最初の再送の
+        待ち時間以上）にする。
+        """
+        if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+            return False
+        delay = self.retry_backoff * 2 ** attempt
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        self.scheduler.backoff(delay)
+        self.metrics.incr(search_metrics.COUNTER_RETRIES, trace=trace)
+        return True
+    
+    def cached_rows(self, params, trace=None, recheck=False):
+        """キャッシュの行を返す（ない場合・期限切れの場合は None）
+        
+        recheck: 同じページのキャッシュを確認し直す場合（ミスは最初の確認で数えているため、ヒットだけを数える）
+        """
+        with self.metrics.span(search_metrics.STAGE_CACHE, trace=trace):
+            cached = self.cache.get(params, max_age=self.cache_max_age, count_miss=not recheck)
+        if cached is None:
+            if not recheck:
+                self.metrics.incr(search_metrics.COUNTER_CACHE_MISSES, trace=trace)
+            return None
+        self.metrics.incr(search_metrics.COUNTER_CACHE_HITS, trace=trace)
+        return self.rows_from_cache(cached['rows'])
+    
+    def parse_page(self, html, item_condition, on_error=None, trace=None):
+        """検索結果ページを解析する（解析した件数と、解析エラーで除外した件数を記録する）"""
+        errors = []
+        
+        def record_error(item_error):
+            errors.append(item_error)
+            if on_error is not None:
+                on_error(item_error)
+        
+        with self.metrics.span(search_metrics.STAGE_PARSE, trace=trace):
+            rows = parse_listings(html, condition=item_condition, exchange_rate=self.exchange_rate,
+                                  on_error=record_error)
+        self.metrics.incr(search_metrics.COUNTER_ITEMS_PARSED, len(rows), trace=trace)
+        self.metrics.incr(search_metrics.COUNTER_ITEMS_DROPPED, len(errors), trace=trace)
+        return rows
+    
+    def is_robot_check(self, response, trace=None):
+        """ロボットチェックのページかどうか（該当する場合はCookieを破棄する）"""
+        if "Robot Check" in response.text or "ロボットチェック" in response.text:
+            # ロボット判定されたCookieは使い回さない
+            self.session.reset_cookies()
+            self.metrics.incr(search_metrics.COUNTER_ROBOT_CHECKS, trace=trace)
+            return True
+        return False
+    
+    def flight_key(self, params):
+        """実行中の同じ検索をまとめるキー（正規化した検索パラメータと、接続に使うセッション）"""
+        return (id(self.session), make_cache_key(params))
+    
+    def join_flight(self, params, trace=None):
+        """同じ検索の取得・解析に参加する（キー・Future・自分が実行するかどうかを返す）"""
+        key = self.flight_key(params)
+        flight, leader = self.flights.join(key)
+        if not leader:
+            self.metrics.incr(search_metrics.COUNTER_COALESCED, trace=trace)
+        return key, flight, leader
+    
+    def finish_flight(self, key, flight, rows=None, exception=None):
+        """取得・解析の結果を、同じ検索の完了を待っている呼び出し元に渡す（ロボット検出時は rows に None）
+        
+        結果は呼び出し元の間で共有するため、読み取り専用の行のタプルにする。
+        """
+        if rows is not None:
+            rows = tuple(MappingProxyType(dict(row)) for row in rows)
+        self.flights.finish(key, flight, rows, exception)
+    
+    def shared_rows(self, flight):
+        """ほかの呼び出し元が取得・解析した結果を、このスクレイパーの為替レートの行のコピーにする"""
+        rows = flight.result()
+        if rows is None:
+            return None
+        return self.rows_from_cache([dict(row) for row in rows])
+    
+    def _fetch_page(self, params, item_condition, emit):
+        """1ページ分を取得して解析する。ロボット検出時は None を返す
+        
+        ほかのセッションが同じ条件のページを取得中の場合は、リクエストを送らずにその結果を待つ。
+        """
+        # キャッシュの確認（バイパス指定時は読み込まずに取得し直して上書きする）
+        use_cache = self.cache is not None and not self.bypass_cache
+        if use_cache:
+            cached = self.cached_rows(params)
+            if cached is not None:
+                emit(EVENT_CACHE_HIT, "キャッシュから検索結果を取得しました。")
+                return cached
+        
+        page_label = f"（{params['_pgn']}ページ目）" if "_pgn" in params else ""
+        while True:
+            key, flight, leader = self.join_flight(params)
+            if leader:
+                break
+            emit(EVENT_COALESCED, f"同じ条件の検索を実行中のため、その結果を待っています{page_label}...")
+            with self.metrics.span(search_metrics.STAGE_COALESCED):
+                wait([flight])
+            # 実行していた呼び出し元が中断した場合は、自分が実行するか次の実行を待つ
+            if not flight.cancelled():
+                return self.shared_rows(flight)
+        
+        # 最初の確認の後に前のリーダーが完了した場合は、その結果がキャッシュにあるので取得し直さない
+        if use_cache:
+            cached = self.cached_rows(params, recheck=True)
+            if cached is not None:
+                self.finish_flight(key, flight, cached)
+                emit(EVENT_CACHE_HIT, "キャッシュから検索結果を取得しました。")
+                return cached
+        
+        try:
+            results = self._fetch_and_parse(params, item_condition, page_label, emit)
+        except BaseException as e:
+            self.finish_flight(key, flight, exception=e)
+            raise
+        self.finish_flight(key, flight, results)
+        return results
+    
+    def _fetch_and_parse(self, params, item_condition, page_label, emit):
+        """スケジューラ経由で1ページ分を取得して解析する。ロボット検出時は None を返す"""
+        # 送信はプロセス全体のスケジューラに任せ、順番待ちの間は順番と待ち時間の目安を通知する
+        attempt = 0
+        while True:
+            request = self.submit_page(params)
+            try:
+                while not request.wait(timeout=self.poll_interval):
+                    position = request.position()
+                    if position is None:
+                        emit(EVENT_SENDING, f"eBayにリクエストを送信しています{page_label}...")
+                    else:
+                        eta = request.eta()
+                        emit(EVENT_QUEUED, f"リクエストの順番待ち{page_label}: {position + 1}番目（あと約{eta:.0f}秒）",
+                             position=position, eta=eta)
+            except BaseException:
+                # 画面の再実行などで中断された場合は未送信のリクエストを取り消す
+                request.future.cancel()
+                raise
+            response = request.result()
+            # 混雑・一時的なエラーは待ち時間を空けて送り直す（再送もレート制限の対象）
+            if not self.retry_after_error(response, attempt):
+                break
+            emit(EVENT_DEBUG, f"HTTP {response.status_code} のため再送します{page_label}（{attempt + 1}回目）")
+            attempt += 1
+        
+        response.raise_for_status()
+        
+        # デバッグ用に応答の内容を確認
+        if self.is_robot_check(response):
+            return None
+        
+        # 1ページ分すべてを解析する（キャッシュにはページ全体を保存する）
+        results = self.parse_page(
+            response.text,
+            item_condition,
+            on_error=lambda item_error: emit(EVENT_DEBUG, f"アイテム処理エラー: {str(item_error)}")
+        )
+        
+        # アイテムが見つからない場合
+        if not results:
+            emit(EVENT_DEBUG, f"検索URL: {response.url}")
+        
+        if results and self.cache is not None:
+            self.cache.set(params, response.text, results)
+        
+        return results
+    
+    def rows_from_cache(self, rows):
+        """キャッシュの行を現在の為替レートで円価格を計算し直して返す"""
+        for row in rows:
+            row['価格（円）'] = int(row['価格'] * self.exchange_rate)
+        return rows
+    
+    def _get_mock_data(self, keyword, limit=10, condition=None):
+        """モックデータを生成する（件数は mock_rows、指定がなければ limit）
+        
+        mock_html が True の場合は検索結果ページのHTMLを生成してから解析する（解析の負荷試験用）。
+        """
+        import mock_data
+        
+        count = self.mock_rows or limit
+        if not self.mock_html:
+            return mock_data.generate_rows(keyword, count, condition, seed=self.mock_seed,
+                                           exchange_rate=self.exchange_rate)
+        rows = []
+        for html in mock_data.generate_pages(keyword, count, condition, page_size=self.page_size, seed=self.mock_seed,
+                                             exchange_rate=self.exchange_rate):
+            rows.extend(self.parse_page(html, condition))
+        return rows
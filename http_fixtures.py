@@ -0,0 +1,121 @@
+"""HTTPレスポンスの記録と再生
+
+記録モードでは EbaySession が受け取ったレスポンス（URL・パラメータ・ヘッダー・本文）を
+1リクエスト1ファイル（gzip圧縮したJSON）でディレクトリに保存する。
+再生モードでは保存したレスポンスを返す requests のトランスポートアダプタを使い、
+ネットワークなしで検索・解析の処理全体を再現できるようにする。
+"""
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+# 本文は展開済みのテキストで保存するため、転送時のヘッダーは保存しない
+SKIPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+# Cookieはファイルに残さない
+SKIPPED_REQUEST_HEADERS = {"cookie"}
+
+
+def fixture_key(method, url):
+    """メソッドとURLからファイル名用のキーを作る（クエリパラメータの順番は区別しない）"""
+    parts = urlsplit(url)
+    query = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    payload = json.dumps([method.upper(), parts.scheme, parts.netloc, parts.path, query], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def save_fixture(directory, url, body, method="GET", status_code=200, headers=None, request_headers=None,
+                 encoding="utf-8"):
+    """レスポンス1件を保存する（保存したファイルのパスを返す）"""
+    os.makedirs(directory, exist_ok=True)
+    parts = urlsplit(url)
+    fixture = {
+        "method": method.upper(),
+        "url": url,
+        "params": dict(parse_qsl(parts.query, keep_blank_values=True)),
+        "request_headers": {k: v for k, v in (request_headers or {}).items() if k.lower() not in SKIPPED_REQUEST_HEADERS},
+        "status_code": status_code,
+        "headers": {k: v for k, v in (headers or {}).items() if k.lower() not in SKIPPED_RESPONSE_HEADERS},
+        "encoding": encoding,
+        "body": body,
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    path = os.path.join(directory, f"{fixture_key(method, url)}.json.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(fixture, f, ensure_ascii=False)
+    return path
+
+
+def load_fixture(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FixtureRecorder:
+    """requests のレスポンスフックとしてレスポンスを保存する"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.recorded = 0
+
+    def __call__(self, response, *args, **kwargs):
+        request = response.request
+        save_fixture(
+            self.directory,
+            request.url,
+            response.text,
+            method=request.method,
+            status_code=response.status_code,
+            headers=response.headers,
+            request_headers=request.headers,
+            encoding=response.encoding or "utf-8",
+        )
+        self.recorded += 1
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """保存したレスポンスを返すトランスポートアダプタ
+
+    記録のないリクエストは requests.ConnectionError になる（ネットワークには接続しない）。
+    """
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._fixtures = {}
+
+    def _load(self, key):
+        if key not in self._fixtures:
+            path = os.path.join(self.directory, f"{key}.json.gz")
+            self._fixtures[key] = load_fixture(path) if os.path.exists(path) else None
+        return self._fixtures[key]
+
+    def send(self, request, **kwargs):
+        fixture = self._load(fixture_key(request.method, request.url))
+        if fixture is None:
+            self.misses += 1
+            raise requests.ConnectionError(f"記録されたレスポンスがありません: {request.method} {request.url}",
+                                           request=request)
+        self.hits += 1
+
+        response = requests.Response()
+        response.status_code = fixture["status_code"]
+        response.headers = CaseInsensitiveDict(fixture["headers"])
+        response.encoding = fixture["encoding"]
+        response._content = fixture["body"].encode(fixture["encoding"])
+        response.url = request.url
+        response.request = request
+        response.reason = "OK" if response.status_code < 400 else "Error"
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,107 @@
+"""eBayへのリクエストに使う共有HTTPセッション
+
+接続プール・keep-alive・gzip/deflateを有効にした requests.Session を1つだけ作り、
+プロセス内のすべての検索で使い回す。トップページへのアクセスでのCookie取得は、
+Cookieがない場合か期限切れの場合にだけ行う。
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HOME_URL = 'https://www.ebay.com/'
+
+
+class EbaySession:
+    """スレッド間で共有できるeBay用のHTTPセッション
+
+    - pool_maxsize: ホストごとに保持する接続数
+    - cookie_max_age: 有効期限のないセッションCookieを取り直すまでの秒数
+    - retries: 接続できなかった場合の再試行の回数（eBayに届いたリクエストは再送しない。502/503/504 の
+      再送はスケジューラを通して EbayScraper が行う）
+    - record_dir: 指定するとレスポンスをこのディレクトリに記録する
+    - replay_dir: 指定するとネットワークに接続せず、このディレクトリの記録を返す
+    """
+
+    def __init__(self, pool_maxsize=10, cookie_max_age=30 * 60, retries=2, record_dir=None, replay_dir=None):
+        self.cookie_max_age = cookie_max_age
+        self.cookie_refreshes = 0
+        self._cookies_fetched_at = None
+        self._lock = threading.Lock()
+
+        self._session = requests.Session()
+        # ここでの再送はスケジューラを通らない（レート制限・リクエスト数の計測の外になる）ため、
+        # 送信前の接続の失敗だけを再試行する
+        retry = Retry(
+            total=None,
+            connect=retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=1,
+            allowed_methods=["GET"],
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        })
+
+        self.recorder = None
+        self.replay_adapter = None
+        if replay_dir:
+            from http_fixtures import ReplayAdapter
+
+            self.replay_adapter = ReplayAdapter(replay_dir)
+            self._session.mount('https://', self.replay_adapter)
+            self._session.mount('http://', self.replay_adapter)
+        if record_dir:
+            from http_fixtures import FixtureRecorder
+
+            self.recorder = FixtureRecorder(record_dir)
+            self._session.hooks['response'].append(self.recorder)
+
+    def _cookies_valid(self):
+        if self._cookies_fetched_at is None:
+            return False
+        # 期限切れのCookieを削除し、まだCookieが残っているか確認する
+        self._session.cookies.clear_expired_cookies()
+        if len(self._session.cookies) == 0:
+            return False
+        return time.time() - self._cookies_fetched_at < self.cookie_max_age
+
+    def ensure_cookies(self, headers=None, timeout=15):
+        """Cookieがない・期限切れの場合のみトップページにアクセスして取得する"""
+        with self._lock:
+            if self._cookies_valid():
+                return False
+            try:
+                self._session.get(HOME_URL, headers=headers, timeout=timeout)
+            except requests.RequestException:
+                # Cookieが取得できなくても検索自体は続行する
+                return False
+            self._cookies_fetched_at = time.time()
+            self.cookie_refreshes += 1
+            return True
+
+    def reset_cookies(self):
+        """保存しているCookieを破棄する（次のリクエストで取得し直す）"""
+        with self._lock:
+            self._session.cookies.clear()
+            self._cookies_fetched_at = None
+
+    def get(self, url, params=None, headers=None, timeout=20, refresh_cookies=True):
+        """必要に応じてCookieを取得してからGETリクエストを送信する
+
+        呼び出し側で ensure_cookies を済ませた場合は refresh_cookies=False にする。
+        """
+        if refresh_cookies:
+            self.ensure_cookies(headers)
+        return self._session.get(url, params=params, headers=headers, timeout=timeout)
+
+    def close(self):
+        self._session.close()
@@ -0,0 +1,208 @@
+"""eBay検索結果ページ（li.s-item）の高速パーサー
+
+lxmlが利用できる場合はlxmlで、利用できない場合はBeautifulSoup（html.parser）で解析する。
+各商品の要素は1回の走査で必要なフィールドをすべて取り出す。
+"""
+import importlib.util
+import re
+from datetime import datetime
+
+# lxml自体は起動時間を抑えるため、最初に解析する時に読み込む
+HAS_LXML = importlib.util.find_spec("lxml") is not None
+
+# 正規表現はループの外で一度だけコンパイルする
+PRICE_RE = re.compile(r'(\d+\.\d+)|(\d+)')
+SELLER_RE = re.compile(r'([a-zA-Z0-9._-]+)\s*\(')
+SHOP_RE = re.compile(r'\((.*?)\)')
+
+# 取り出すフィールドとクラス名の対応
+FIELD_CLASSES = {
+    's-item__title': 'title',
+    's-item__price': 'price',
+    's-item__link': 'link',
+    's-item__shipping': 'shipping',
+    's-item__location': 'location',
+    's-item__seller-info-text': 'seller',
+    's-item__image-img': 'image',
+}
+
+DEFAULT_LINK = 'https://www.ebay.com'
+PLACEHOLDER_IMAGE = 'https://via.placeholder.com/150'
+
+
+def default_backend():
+    """利用可能な最速のバックエンド名を返す"""
+    return 'lxml' if HAS_LXML else 'html.parser'
+
+
+def parse_listings(html, condition=None, exchange_rate=150, current_date=None, backend=None, on_error=None):
+    """検索結果ページのHTMLから商品のリストを作成する
+
+    戻り値の各要素は EbayScraper.search が返す辞書と同じ形式。
+    on_error を渡すと、個別の商品の解析エラーを受け取れる（その商品はスキップされる）。
+    """
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+    if current_date is None:
+        current_date = datetime.now().strftime("%Y-%m-%d")
+    backend = backend or default_backend()
+
+    if backend == 'lxml':
+        fields_list = _extract_lxml(html)
+    else:
+        fields_list = _extract_soup(html)
+
+    results = []
+    for fields in fields_list:
+        try:
+            row = _build_row(fields, condition, exchange_rate, current_date)
+        except Exception as item_error:
+            if on_error is not None:
+                on_error(item_error)
+            continue
+        if row is not None:
+            results.append(row)
+    return results
+
+
+def _extract_lxml(html):
+    if not html.strip():
+        return []
+    from lxml import etree
+    import lxml.html
+
+    parser = lxml.html.HTMLParser(encoding='utf-8')
+    root = lxml.html.document_fromstring(html.encode('utf-8'), parser=parser)
+
+    fields_list = []
+    for item in root.iter('li'):
+        item_classes = item.get('class')
+        if not item_classes or 's-item' not in item_classes.split():
+            continue
+        fields = {}
+        # 子孫要素を文書順に1回だけ走査し、各クラスの最初の要素を採用する（select_oneと同じ）
+        for elem in item.iterdescendants(etree.Element):
+            classes = elem.get('class')
+            if not classes:
+                continue
+            for cls in classes.split():
+                field = FIELD_CLASSES.get(cls)
+                if field is not None and field not in fields:
+                    fields[field] = elem
+        fields_list.append({
+            'title': _lxml_text(fields.get('title')),
+            'price': _lxml_text(fields.get('price')),
+            'link': _attr(fields.get('link'), 'href', DEFAULT_LINK),
+            'shipping': _lxml_text(fields.get('shipping')),
+            'location': _lxml_text(fields.get('location')),
+            'seller': _lxml_text(fields.get('seller')),
+            'image': _attr(fields.get('image'), 'src', ''),
+        })
+    return fields_list
+
+
+def _extract_soup(html):
+    # BeautifulSoupはlxmlがない場合にだけ使うため、最初に使う時に読み込む
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    # li.s-item 以外は木を作らずに読み飛ばす
+    # 解析時のclass属性は分割前の文字列で渡されるため、空白で分割して判定する
+    item_strainer = SoupStrainer('li', class_=lambda classes: classes is not None and 's-item' in classes.split())
+    soup = BeautifulSoup(html, 'html.parser', parse_only=item_strainer)
+
+    fields_list = []
+    for item in soup.find_all('li', class_='s-item'):
+        fields = {}
+        for elem in item.descendants:
+            classes = getattr(elem, 'attrs', None) and elem.attrs.get('class')
+            if not classes:
+                continue
+            for cls in classes:
+                field = FIELD_CLASSES.get(cls)
+                if field is not None and field not in fields:
+                    fields[field] = elem
+        fields_list.append({
+            'title': _soup_text(fields.get('title')),
+            'price': _soup_text(fields.get('price')),
+            'link': _attr(fields.get('link'), 'href', DEFAULT_LINK),
+            'shipping': _soup_text(fields.get('shipping')),
+            'location': _soup_text(fields.get('location')),
+            'seller': _soup_text(fields.get('seller')),
+            'image': _attr(fields.get('image'), 'src', ''),
+        })
+    return fields_list
+
+
+def _lxml_text(elem):
+    return elem.text_content() if elem is not None else None
+
+
+def _soup_text(elem):
+    return elem.text if elem is not None else None
+
+
+def _attr(elem, name, default):
+    return elem.get(name, default) if elem is not None else None
+
+
+def _build_row(fields, condition, exchange_rate, current_date):
+    title_text = fields['title']
+    price_text = fields['price']
+    link = fields['link']
+    if title_text is None or price_text is None or link is None or "Shop on eBay" in title_text:
+        return None
+
+    title = title_text.strip()
+    price_text = price_text.strip()
+
+    # リンクを安全に取得
+    link = link.split('?')[0]
+    if not link or not link.startswith('http'):
+        link = DEFAULT_LINK
+
+    # 価格情報の抽出
+    price_value = PRICE_RE.search(price_text)
+    if price_value:
+        price_str = price_value.group(1) if price_value.group(1) else price_value.group(2)
+        price = float(price_str)
+    else:
+        price = 0.0
+
+    # 円価格の計算
+    price_jpy = int(price * exchange_rate)
+
+    # 配送情報・出品場所
+    shipping = fields['shipping'].strip() if fields['shipping'] is not None else "不明"
+    location = fields['location'].strip() if fields['location'] is not None else "不明"
+
+    # 出品者情報の取得
+    seller = ""
+    shop_name = "N/A"
+    if fields['seller'] is not None:
+        seller_text = fields['seller'].strip()
+        seller_match = SELLER_RE.search(seller_text)
+        if seller_match:
+            seller = seller_match.group(1)
+        shop_match = SHOP_RE.search(seller_text)
+        if shop_match:
+            shop_name = shop_match.group(1)
+
+    # 画像URLの取得
+    img_url = fields['image'] or ''
+    if not img_url or not img_url.startswith('http'):
+        img_url = PLACEHOLDER_IMAGE
+
+    return {
+        'タイトル': title,
+        '価格': price,
+        '価格（円）': price_jpy,
+        '価格（表示）': price_text,
+        '配送': shipping,
+        '状態': condition or "不明",
+        '場所': location,
+        '出品者': seller,
+        'ショップ名': [shop_name] if shop_name != "N/A" else "N/A",
+        '出品日時': current_date,
+        'リンク': link,
+        '画像URL': img_url
+    }
@@ -0,0 +1,291 @@
+"""検索結果を蓄積するローカルの商品データベース（SQLite）
+
+検索のたびに結果を書き込み、商品は「リンク」のURLから取り出した商品IDで重複を除く。
+価格は前回から変わった場合にだけ履歴に追加する。キーワード・出品者・日付にインデックスを張り、
+何か月分蓄積しても価格の推移や出品者の活動をすぐに集計できるようにする。
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+# pandas と result_schema（pyarrow）は読み込みに時間がかかるため、使うメソッドの中で読み込む
+# （ウォッチリストから extract_item_id だけを使う場合に、アプリの最初の表示を遅くしない）
+
+# データベースの既定の保存先（アプリと同じディレクトリの data 配下）
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "listings.sqlite3")
+
+# https://www.ebay.com/itm/123456789012 や https://www.ebay.com/itm/title-slug/123456789012 の形式
+ITEM_ID_RE = re.compile(r'/itm/(?:[^/?#]+/)?(\d{6,})')
+
+# SQLiteのプレースホルダ数の上限に収まるように分割する件数
+CHUNK_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    item_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    seller TEXT,
+    shop_name TEXT,
+    location TEXT,
+    condition TEXT,
+    shipping TEXT,
+    link TEXT NOT NULL,
+    image_url TEXT,
+    last_price REAL,
+    last_price_text TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_listings_seller ON listings (seller, last_seen);
+CREATE INDEX IF NOT EXISTS idx_listings_first_seen ON listings (first_seen);
+
+CREATE TABLE IF NOT EXISTS listing_keywords (
+    keyword TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    PRIMARY KEY (keyword, item_id)
+);
+CREATE INDEX IF NOT EXISTS idx_listing_keywords_item ON listing_keywords (item_id);
+
+CREATE TABLE IF NOT EXISTS keyword_searches (
+    keyword TEXT PRIMARY KEY,
+    searches INTEGER NOT NULL,
+    first_searched TEXT NOT NULL,
+    last_searched TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS price_observations (
+    item_id TEXT NOT NULL,
+    observed_at TEXT NOT NULL,
+    price REAL NOT NULL,
+    price_text TEXT,
+    PRIMARY KEY (item_id, observed_at)
+);
+CREATE INDEX IF NOT EXISTS idx_price_observations_date ON price_observations (observed_at);
+"""
+
+
+def extract_item_id(link):
+    """商品ページのURLから商品IDを取り出す（取り出せない場合は None）"""
+    if not link:
+        return None
+    match = ITEM_ID_RE.search(link)
+    return match.group(1) if match else None
+
+
+def normalize_keyword(keyword):
+    """キーワードの大文字小文字・余分な空白をそろえる"""
+    return " ".join(str(keyword).lower().split()) if keyword else ""
+
+
+class ListingStore:
+    """検索結果を蓄積するSQLiteデータベース"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Streamlitの複数スレッドから共有するため check_same_thread=False とし、ロックで直列化する
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def upsert(self, rows, keyword=None, observed_at=None):
+        """検索結果を書き込む
+
+        rows は EbayScraper.search が返す辞書のリスト。「キーワード」列がある行はその値を、
+        ない行は keyword を検索キーワードとして記録する。
+        戻り値は新規・更新・価格変更・スキップ（商品IDなし）の件数。
+        """
+        from result_schema import normalize_shop_name
+
+        observed_at = observed_at or datetime.now().isoformat(timespec="seconds")
+        records = {}
+        keyword_links = set()
+        skipped = 0
+        for row in rows:
+            item_id = extract_item_id(row.get('リンク'))
+            if item_id is None:
+                skipped += 1
+                continue
+            records[item_id] = row
+            row_keyword = normalize_keyword(row.get('キーワード') or keyword)
+            if row_keyword:
+                keyword_links.add((row_keyword, item_id))
+
+        counts = {"new": 0, "updated": 0, "price_changes": 0, "skipped": skipped}
+        if not records:
+            return counts
+
+        with self._lock, self._conn:
+            last_prices = {}
+            item_ids = list(records)
+            for i in range(0, len(item_ids), CHUNK_SIZE):
+                chunk = item_ids[i:i + CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                last_prices.update(self._conn.execute(
+                    f"SELECT item_id, last_price FROM listings WHERE item_id IN ({placeholders})", chunk
+                ).fetchall())
+
+            listing_rows = []
+            observation_rows = []
+            for item_id, row in records.items():
+                price = float(row.get('価格') or 0.0)
+                price_text = row.get('価格（表示）')
+                listing_rows.append((
+                    item_id,
+                    row.get('タイトル', ''),
+                    row.get('出品者'),
+                    normalize_shop_name(row.get('ショップ名')),
+                    row.get('場所'),
+                    row.get('状態'),
+                    row.get('配送'),
+                    row.get('リンク'),
+                    row.get('画像URL'),
+                    price,
+                    price_text,
+                    observed_at,
+                    observed_at,
+                ))
+                if item_id not in last_prices:
+                    counts["new"] += 1
+                    observation_rows.append((item_id, observed_at, price, price_text))
+                else:
+                    counts["updated"] += 1
+                    if last_prices[item_id] != price:
+                        counts["price_changes"] += 1
+                        observation_rows.append((item_id, observed_at, price, price_text))
+
+            self._conn.executemany(
+                """
+                INSERT INTO listings (item_id, title, seller, shop_name, location, condition, shipping,
+                                      link, image_url, last_price, last_price_text, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (item_id) DO UPDATE SET
+                    title = excluded.title,
+                    seller = excluded.seller,
+                    shop_name = excluded.shop_name,
+                    location = excluded.location,
+                    condition = excluded.condition,
+                    shipping = excluded.shipping,
+                    link = excluded.link,
+                    image_url = excluded.image_url,
+                    last_price = excluded.last_price,
+                    last_price_text = excluded.last_price_text,
+                    last_seen = excluded.last_seen
+                """,
+                listing_rows,
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO price_observations (item_id, observed_at, price, price_text) VALUES (?, ?, ?, ?)",
+                observation_rows,
+            )
+            self._conn.executemany(
+                """
+                INSERT INTO listing_keywords (keyword, item_id, first_seen, last_seen) VALUES (?, ?, ?, ?)
+                ON CONFLICT (keyword, item_id) DO UPDATE SET last_seen = excluded.last_seen
+                """,
+                [(kw, item_id, observed_at, observed_at) for kw, item_id in keyword_links],
+            )
+            self._conn.executemany(
+                """
+                INSERT INTO keyword_searches (keyword, searches, first_searched, last_searched) VALUES (?, 1, ?, ?)
+                ON CONFLICT (keyword) DO UPDATE SET
+                    searches = searches + 1,
+                    last_searched = excluded.last_searched
+                """,
+                [(kw, observed_at, observed_at) for kw in {kw for kw, _ in keyword_links}],
+            )
+        return counts
+
+    def keywords(self):
+        """保存済みのキーワード（最近検索した順）"""
+        return self._query(
+            "SELECT keyword AS キーワード, searches AS 検索回数, last_searched AS 最終取得 "
+            "FROM keyword_searches ORDER BY last_searched DESC"
+        )
+
+    def price_trend(self, keyword=None, seller=None, days=30):
+        """日ごとの価格の推移（観測された価格の平均・最小・最大と観測数）"""
+        where, params = self._filters("o.observed_at", keyword, seller, days)
+        return self._query(
+            f"""
+            SELECT date(o.observed_at) AS 日付,
+                   AVG(o.price) AS 平均価格,
+                   MIN(o.price) AS 最低価格,
+                   MAX(o.price) AS 最高価格,
+                   COUNT(*) AS 観測数
+            FROM price_observations o
+            JOIN listings l ON l.item_id = o.item_id
+            {where}
+            GROUP BY date(o.observed_at)
+            ORDER BY 日付
+            """,
+            params,
+        )
+
+    def seller_activity(self, keyword=None, seller=None, days=30, limit=50):
+        """出品者ごとの活動（期間内に見つかった商品数・平均価格・最初と最後の取得日時）"""
+        where, params = self._filters("l.last_seen", keyword, seller, days)
+        return self._query(
+            f"""
+            SELECT l.seller AS 出品者,
+                   COUNT(*) AS 商品数,
+                   SUM(CASE WHEN l.first_seen >= ? THEN 1 ELSE 0 END) AS 新規出品,
+                   AVG(l.last_price) AS 平均価格,
+                   MIN(l.first_seen) AS 初回取得,
+                   MAX(l.last_seen) AS 最終取得
+            FROM listings l
+            {where}
+            GROUP BY l.seller
+            ORDER BY 商品数 DESC
+            LIMIT ?
+            """,
+            [self._since(days)] + params + [limit],
+        )
+
+    def item_history(self, item_id):
+        """商品1件の価格履歴"""
+        return self._query(
+            "SELECT observed_at AS 日時, price AS 価格, price_text AS 価格（表示） "
+            "FROM price_observations WHERE item_id = ? ORDER BY observed_at",
+            [item_id],
+        )
+
+    def stats(self):
+        """保存済みの商品数・価格履歴の件数・キーワード数"""
+        with self._lock:
+            listings, = self._conn.execute("SELECT COUNT(*) FROM listings").fetchone()
+            observations, = self._conn.execute("SELECT COUNT(*) FROM price_observations").fetchone()
+            keywords, = self._conn.execute("SELECT COUNT(*) FROM keyword_searches").fetchone()
+        return {"listings": listings, "observations": observations, "keywords": keywords}
+
+    @staticmethod
+    def _since(days):
+        return (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds") if days else ""
+
+    def _filters(self, date_column, keyword, seller, days):
+        clauses = []
+        params = []
+        if keyword:
+            clauses.append("l.item_id IN (SELECT item_id FROM listing_keywords WHERE keyword = ?)")
+            params.append(normalize_keyword(keyword))
+        if seller:
+            clauses.append("l.seller = ?")
+            params.append(seller)
+        if days:
+            clauses.append(f"{date_column} >= ?")
+            params.append(self._since(days))
+        where = "WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, params
+
+    def _query(self, sql, params=()):
+        import pandas as pd
+
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=list(params))
@@ -0,0 +1,282 @@
+"""検索処理の計測（段階ごとの処理時間とカウンタ）
+
+検索1回・画面の再実行1回ごとに、段階（キャッシュの参照、リクエストの順番待ち、トップページ・
+検索ページへのリクエスト、HTMLの解析、DataFrameの作成、描画）ごとの処理時間をトレースとして記録し、
+段階ごとの処理時間のヒストグラムとカウンタ（リクエスト数・キャッシュのヒット数など）を集計する。
+トレースは JSON Lines、集計は Prometheus のテキスト形式で書き出せる。
+"""
+import collections
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# 段階の名前
+STAGE_CACHE = "cache_lookup"      # 検索キャッシュの参照
+STAGE_QUEUE = "queue_wait"        # レート制限によるリクエストの順番待ち
+STAGE_COALESCED = "coalesced_wait"  # ほかのセッションが取得中の同じ検索の結果待ち
+STAGE_HOMEPAGE = "homepage"       # Cookie取得のためのトップページへのリクエスト
+STAGE_REQUEST = "search_request"  # 検索ページへのリクエスト
+STAGE_PARSE = "parse"             # 検索結果ページの解析
+STAGE_DATAFRAME = "dataframe"     # DataFrameの作成と価格の正規化
+STAGE_DEDUP = "dedup"             # 重複の除去と似た商品のグループ化
+STAGE_RENDER = "render"           # 検索結果の描画
+
+# カウンタの名前
+COUNTER_REQUESTS = "requests"
+COUNTER_CACHE_HITS = "cache_hits"
+COUNTER_CACHE_MISSES = "cache_misses"
+COUNTER_ROBOT_CHECKS = "robot_checks"
+COUNTER_ERRORS = "errors"
+COUNTER_RETRIES = "retries"  # 502/503/504 の応答でスケジューラを通して再送したリクエスト数
+COUNTER_ITEMS_PARSED = "items_parsed"
+COUNTER_ITEMS_DROPPED = "items_dropped"  # 解析エラー・前のページと重複した商品
+COUNTER_COALESCED = "coalesced"  # 実行中の同じ検索の結果を共有した（リクエストを送らなかった）ページ数
+
+# ヒストグラムの区切り（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRIC_PREFIX = "ebay_search"
+
+
+class LatencyHistogram:
+    """1つの段階の処理時間のヒストグラム
+
+    Prometheus用の累積の区切りごとの件数と、パーセンタイル用の直近 window 件の処理時間を持つ。
+    """
+
+    def __init__(self, buckets=BUCKETS, window=500):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = collections.deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+
+    def percentile(self, q):
+        """直近の処理時間の q パーセンタイル（記録がなければ None）"""
+        if not self.recent:
+            return None
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": max(self.recent) if self.recent else None,
+        }
+
+
+class Trace:
+    """検索1回・再実行1回の段階ごとの処理時間（別スレッドからも記録できる）"""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.started_at = datetime.now()
+        self.duration = None
+        self.spans = []
+        self.counters = collections.Counter()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_span(self, stage, start, seconds):
+        """start は time.perf_counter() の値"""
+        with self._lock:
+            self.spans.append((stage, start - self._start, seconds))
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def stage_totals(self):
+        """段階ごとの処理時間の合計"""
+        totals = collections.defaultdict(float)
+        with self._lock:
+            for stage, _, seconds in self.spans:
+                totals[stage] += seconds
+        return dict(totals)
+
+    def to_dict(self):
+        with self._lock:
+            spans = [{"stage": stage, "offset": round(offset, 6), "duration": round(seconds, 6)}
+                     for stage, offset, seconds in self.spans]
+            counters = dict(self.counters)
+        return {
+            "name": self.name,
+            "labels": self.labels,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "spans": spans,
+            "counters": counters,
+        }
+
+
+class Metrics:
+    """プロセス全体の計測値（スレッド間で共有できる）
+
+    - max_traces: 保持する直近のトレースの数
+    - jsonl_path: 指定すると終了したトレースをこのファイルに1行ずつ追記する
+    - prometheus_path: 指定するとトレースが終了するたびに Prometheus のテキスト形式で書き出す
+    """
+
+    def __init__(self, max_traces=100, jsonl_path=None, prometheus_path=None):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.counters = collections.Counter()
+        self.histograms = {}
+        self.traces = collections.deque(maxlen=max_traces)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def current_trace(self):
+        """このスレッドで実行中のトレース（なければ None）"""
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def observe(self, stage, seconds, start=None, trace=None):
+        """段階の処理時間を記録する（trace を省略するとこのスレッドのトレースに記録する）"""
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.observe(seconds)
+        trace = trace or self.current_trace()
+        if trace is not None:
+            trace.add_span(stage, start if start is not None else time.perf_counter() - seconds, seconds)
+
+    def incr(self, name, value=1, trace=None):
+        if not value:
+            return
+        with self._lock:
+            self.counters[name] += value
+        trace = trace or self.current_trace()
+        if trace is not None:
+            trace.incr(name, value)
+
+    @contextmanager
+    def span(self, stage, trace=None):
+        """with ブロックの処理時間を stage として記録する（例外で抜けた場合も記録する）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, start=start, trace=trace)
+
+    @contextmanager
+    def trace(self, name, **labels):
+        """検索1回・再実行1回のトレースを開始する（ブロック内の記録はこのトレースにまとめる）"""
+        trace = Trace(name, **labels)
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(trace)
+        try:
+            yield trace
+        finally:
+            stack.pop()
+            trace.finish()
+            # トレース全体の処理時間はトレースの名前の段階として集計する
+            with self._lock:
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = LatencyHistogram()
+                histogram.observe(trace.duration)
+                self.traces.append(trace)
+            if self.jsonl_path:
+                self._append_jsonl(trace)
+            if self.prometheus_path:
+                self.write_prometheus(self.prometheus_path)
+
+    def _append_jsonl(self, trace):
+        line = json.dumps(trace.to_dict(), ensure_ascii=False) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.jsonl_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def recent_traces(self, name=None):
+        """直近のトレース（新しい順）"""
+        with self._lock:
+            traces = list(self.traces)
+        return [trace for trace in reversed(traces) if name is None or trace.name == name]
+
+    def summary(self):
+        """段階ごとの処理時間の集計とカウンタ"""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "stages": {stage: histogram.summary() for stage, histogram in self.histograms.items()},
+            }
+
+    def to_jsonl(self):
+        """保持している直近のトレースを JSON Lines にする（古い順）"""
+        with self._lock:
+            traces = list(self.traces)
+        return "".join(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n" for trace in traces)
+
+    def to_prometheus(self):
+        """Prometheus のテキスト形式（text/plain; version=0.0.4）にする"""
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {stage: (histogram.buckets, list(histogram.bucket_counts), histogram.count, histogram.sum)
+                          for stage, histogram in self.histograms.items()}
+
+        lines = []
+        for name in sorted(counters):
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {counters[name]}")
+
+        metric = f"{METRIC_PREFIX}_stage_seconds"
+        lines.append(f"# HELP {metric} Time spent in each stage of a search or rerun.")
+        lines.append(f"# TYPE {metric} histogram")
+        for stage in sorted(histograms):
+            buckets, bucket_counts, count, total = histograms[stage]
+            for bound, bucket_count in zip(buckets, bucket_counts):
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {bucket_count}')
+            lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {count}')
+
+        lines.append(f"# TYPE {METRIC_PREFIX}_start_time_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}_start_time_seconds {self.started_at:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Prometheus のテキスト形式でファイルに書き出す（node_exporter の textfile collector 用）
+
+        読み込み中のファイルが途中で切れないように、一時ファイルに書いてから置き換える。
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.traces.clear()
+            self.started_at = time.time()
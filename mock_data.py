@@ -0,0 +1,295 @@
+"""負荷試験用のモックデータ（検索結果の行と、li.s-item の構造を模した検索結果ページ）
+
+同じシードからは同じデータを生成する。行は numpy の乱数から列ごとにまとめて作るため、
+100万件でも数秒で生成できる。価格は対数正規分布、出品者は一部の出品者に件数が偏る分布
+（Zipf）、発送元・通貨・送料・状態は実際の検索結果に近い割合で混ぜ、同じ商品の重複と
+同じ出品者の再出品（タイトルの1単語だけが違う別の商品）も含める。
+
+generate_rows は EbayScraper.search と同じ形式の辞書のリスト、generate_pages は同じ内容の
+検索結果ページのHTMLを返す（listing_parser の負荷試験用）。HTMLから解析した行は
+「状態」以外は generate_rows の行と一致する（解析では状態は検索条件の値か「不明」になる）。
+"""
+import html
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from price_normalizer import USD_RATES
+from result_schema import from_columns
+
+# タイトルに使う単語（キーワードの後に並べる）
+WORDS = (
+    "Vintage New Used Rare Genuine Original Japan Limited Edition Lot Set Mint Boxed Tested Working Black "
+    "Silver White Red Blue Gold Mini Pro Classic Deluxe Sealed Complete Manual Auto Digital Analog Portable "
+    "Large Small Heavy Duty Spare Parts Repair Case Cover Strap Cable Charger Battery Stand Mount Lens Body "
+    "Kit Bundle Pack Pair Size Model Series Collection Authentic Excellent Condition Japanese Import"
+).split()
+MIN_WORDS = 4
+MAX_WORDS = 10
+
+# 発送元と割合（出品者ごとに1つ）
+LOCATIONS = {
+    "United States": 0.42,
+    "Japan": 0.2,
+    "China": 0.12,
+    "United Kingdom": 0.08,
+    "Germany": 0.05,
+    "Hong Kong": 0.04,
+    "Canada": 0.03,
+    "Australia": 0.03,
+    "France": 0.03,
+}
+# 発送元ごとの価格の通貨の表記（ない場合はドル）
+LOCATION_CURRENCIES = {
+    "United Kingdom": ("GBP ", "GBP"),
+    "Germany": ("EUR ", "EUR"),
+    "France": ("EUR ", "EUR"),
+    "Canada": ("C $", "CAD"),
+    "Australia": ("AU $", "AUD"),
+}
+
+# 状態と割合（検索条件で状態を指定しない場合）、HTMLのサブタイトルの表記
+CONDITIONS = {"中古": 0.55, "新品": 0.35, "不明": 0.1}
+CONDITION_LABELS = {"中古": "Pre-Owned", "新品": "Brand New", "不明": ""}
+
+# 送料の表記の種類と割合
+SHIPPING_FREE = "Free shipping"
+SHIPPING_FREE_INTERNATIONAL = "Free International Shipping"
+SHIPPING_KINDS = {"free": 0.3, "free_international": 0.1, "usd": 0.45, "jpy": 0.05, "missing": 0.1}
+
+# 価格（ドル）の分布の中央値と対数の標準偏差、価格の範囲で表示される商品の割合
+PRICE_MEDIAN = 60.0
+PRICE_SIGMA = 1.0
+RANGE_RATE = 0.04
+# 同じ商品の重複（ページ・検索をまたいで同じ商品が出てくる）と再出品の割合
+DUPLICATE_RATE = 0.05
+RELIST_RATE = 0.1
+# 出品者情報がない行の割合
+NO_SELLER_RATE = 0.1
+
+SELLER_PREFIXES = ("japan", "tokyo", "osaka", "best", "global", "happy", "smart", "direct", "top", "star")
+SELLER_SUFFIXES = ("shop", "store", "deals", "trading", "market", "outlet", "goods", "select")
+SHOP_ADJECTIVES = ("Tokyo", "Osaka", "Kyoto", "Golden", "Blue Sky", "Sakura", "Fuji", "Pacific", "Royal", "Sunrise")
+SHOP_NOUNS = ("Camera", "Hobby", "Audio", "Antique", "Fishing", "Sports", "Toy", "Watch", "Fashion", "Gadget")
+SHOP_KINDS = ("Store", "Shop", "Emporium", "Trading", "Outlet", "Depot")
+
+ITEM_ID_START = 110000000000
+LINK_PREFIX = "https://www.ebay.com/itm/"
+IMAGE_PREFIX = "https://i.ebayimg.com/thumbs/images/g/"
+IMAGE_SUFFIX = "/s-l225.webp"
+
+
+def _rng(keyword, seed):
+    """キーワードとシードから乱数生成器を作る（同じキーワード・シードなら同じデータになる）"""
+    return np.random.default_rng([seed, zlib.crc32(keyword.encode("utf-8"))])
+
+
+def _choice_codes(rng, options, size):
+    """{値: 割合} の辞書から size 個を選んだ値の番号"""
+    weights = np.array(list(options.values()), dtype=np.float64)
+    return rng.choice(len(weights), size=size, p=weights / weights.sum())
+
+
+def _choice(rng, options, size):
+    """{値: 割合} の辞書から size 個を選んだ値の配列（object型）"""
+    return np.array(list(options), dtype=object)[_choice_codes(rng, options, size)]
+
+
+def _format_amounts(amounts, decimals=2):
+    """金額を桁区切り付きの文字列にする"""
+    return np.array(list(map(f"{{:,.{decimals}f}}".format, amounts.tolist())), dtype=object)
+
+
+def _first_number(amounts):
+    """表示の最初の数字（listing_parser が「価格」として取り出す値。桁区切りの前で切れる）"""
+    cents = np.round(amounts * 100)
+    return np.where(cents >= 100000, np.floor(amounts / 1000), cents / 100)
+
+
+def _sellers(rng, count):
+    """出品者名・ショップ名・発送元（出品者ごと）と、行ごとの出品者の選ばれやすさ（Zipf）"""
+    prefixes = rng.integers(len(SELLER_PREFIXES), size=count)
+    suffixes = rng.integers(len(SELLER_SUFFIXES), size=count)
+    names = np.array([f"{SELLER_PREFIXES[p]}_{SELLER_SUFFIXES[s]}{i}" for i, (p, s) in enumerate(zip(prefixes, suffixes))],
+                     dtype=object)
+    shops = np.array([f"{SHOP_ADJECTIVES[a]} {SHOP_NOUNS[b]} {SHOP_KINDS[c]}" for a, b, c in zip(
+        rng.integers(len(SHOP_ADJECTIVES), size=count),
+        rng.integers(len(SHOP_NOUNS), size=count),
+        rng.integers(len(SHOP_KINDS), size=count))], dtype=object)
+    locations = _choice(rng, LOCATIONS, count)
+    weights = 1.0 / np.arange(1, count + 1) ** 1.1
+    return names, shops, locations, weights / weights.sum()
+
+
+def generate_columns(keyword, count, condition=None, seed=0, exchange_rate=150, current_date=None):
+    """count 件の検索結果を列ごとの配列の辞書で返す（列は EbayScraper.search の行と同じ）
+
+    「ショップ名」は文字列か None（出品者情報がない行）。HTML用に「状態の表記」の列も含む。
+    """
+    rng = _rng(keyword, seed)
+    if current_date is None:
+        current_date = datetime.now().strftime("%Y-%m-%d")
+
+    duplicates = int(count * DUPLICATE_RATE)
+    relists = int(count * RELIST_RATE) if count - duplicates > 1 else 0
+    originals = count - duplicates - relists
+    listings = originals + relists
+
+    # 元の商品と再出品（再出品は元の商品の単語・出品者・状態を引き継ぎ、1単語だけ変える）
+    source = np.concatenate([np.arange(originals), rng.integers(max(originals, 1), size=relists)])
+    words = rng.integers(len(WORDS), size=(originals, MAX_WORDS))[source]
+    lengths = rng.integers(MIN_WORDS, MAX_WORDS + 1, size=originals)[source]
+    relisted = np.arange(originals, listings)
+    words[relisted, rng.integers(lengths[relisted])] = rng.integers(len(WORDS), size=relists)
+
+    seller_count = max(5, count // 100)
+    seller_names, seller_shops, seller_locations, seller_weights = _sellers(rng, seller_count)
+    sellers = rng.choice(seller_count, size=originals, p=seller_weights)[source]
+    if condition:
+        conditions = np.full(listings, condition, dtype=object)
+        condition_labels = np.full(listings, CONDITION_LABELS.get(condition, ""), dtype=object)
+    else:
+        codes = _choice_codes(rng, CONDITIONS, originals)[source]
+        conditions = np.array(list(CONDITIONS), dtype=object)[codes]
+        condition_labels = np.array([CONDITION_LABELS[value] for value in CONDITIONS], dtype=object)[codes]
+
+    # 価格（ドル）は元の商品の価格の前後10%
+    usd = np.exp(rng.normal(np.log(PRICE_MEDIAN), PRICE_SIGMA, size=originals))[source]
+    usd[relisted] *= rng.uniform(0.9, 1.1, size=relists)
+    usd = np.clip(usd, 0.99, 50000)
+    item_ids = ITEM_ID_START + np.arange(listings, dtype=np.int64) * 37 + rng.integers(37, size=listings)
+
+    # タイトル（長さを超える位置の単語は空文字にして、2単語の組の表から連結する）
+    word_table = np.array([f" {word}" for word in WORDS] + [""], dtype=object)
+    pair_table = (word_table[:, None] + word_table[None, :]).ravel()
+    words = np.where(np.arange(MAX_WORDS) < lengths[:, None], words, len(WORDS))
+    titles = np.full(listings, keyword, dtype=object)
+    for k in range(0, MAX_WORDS, 2):
+        titles = titles + pair_table[words[:, k] * len(word_table) + words[:, k + 1]]
+    if not keyword:
+        titles = pd.Series(titles, dtype=object).str.lstrip().to_numpy(dtype=object)
+
+    # 価格の表示（発送元の通貨。一部は価格の範囲）
+    locations = seller_locations[sellers]
+    symbols = np.full(listings, "$", dtype=object)
+    amounts = usd.copy()
+    for location, (symbol, currency) in LOCATION_CURRENCIES.items():
+        in_location = locations == location
+        symbols[in_location] = symbol
+        amounts[in_location] = usd[in_location] / USD_RATES[currency]
+    amounts = np.round(amounts, 2)
+    price_text = symbols + _format_amounts(amounts)
+    ranged = rng.random(listings) < RANGE_RATE
+    high = np.round(amounts[ranged] * rng.uniform(1.2, 3.0, size=ranged.sum()), 2)
+    price_text[ranged] = price_text[ranged] + " to " + symbols[ranged] + _format_amounts(high)
+    prices = _first_number(amounts)
+
+    # 送料
+    kinds = _choice(rng, SHIPPING_KINDS, listings)
+    shipping = np.full(listings, "不明", dtype=object)
+    shipping[kinds == "free"] = SHIPPING_FREE
+    shipping[kinds == "free_international"] = SHIPPING_FREE_INTERNATIONAL
+    shipping_usd = np.round(np.exp(rng.normal(np.log(15), 0.6, size=listings)), 2)
+    paid = kinds == "usd"
+    shipping[paid] = "+$" + _format_amounts(shipping_usd[paid]) + " shipping"
+    paid_jpy = kinds == "jpy"
+    shipping[paid_jpy] = "+JPY " + _format_amounts(np.round(shipping_usd[paid_jpy] * exchange_rate, -1), 0) + " shipping"
+
+    # 出品者情報（一部の行はなし）
+    has_seller = rng.random(listings) >= NO_SELLER_RATE
+    seller_column = np.where(has_seller, seller_names[sellers], "").astype(object)
+    shop_column = np.where(has_seller, seller_shops[sellers], None).astype(object)
+
+    id_text = item_ids.astype(str).astype(object)
+    columns = {
+        'タイトル': titles,
+        '価格': prices,
+        '価格（円）': (prices * exchange_rate).astype(np.int64),
+        '価格（表示）': price_text,
+        '配送': shipping,
+        '状態': conditions,
+        '場所': "from " + locations,
+        '出品者': seller_column,
+        'ショップ名': shop_column,
+        '出品日時': np.full(listings, current_date, dtype=object),
+        'リンク': LINK_PREFIX + id_text,
+        '画像URL': IMAGE_PREFIX + id_text + IMAGE_SUFFIX,
+        '状態の表記': condition_labels,
+    }
+
+    # 同じ商品の重複（すべての列が同じ行）を加えて順番を混ぜる
+    rows = np.concatenate([np.arange(listings), rng.integers(max(listings, 1), size=duplicates)])
+    rows = rows[rng.permutation(count)]
+    return {column: values[rows] for column, values in columns.items()}
+
+
+def generate_rows(keyword, count, condition=None, seed=0, exchange_rate=150, current_date=None):
+    """count 件の検索結果を EbayScraper.search と同じ形式の辞書のリストで返す"""
+    columns = generate_columns(keyword, count, condition, seed, exchange_rate, current_date)
+    columns.pop('状態の表記')
+    columns['価格'] = columns['価格'].tolist()
+    columns['価格（円）'] = columns['価格（円）'].tolist()
+    columns['ショップ名'] = [[shop] if shop is not None else "N/A" for shop in columns['ショップ名']]
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def generate_frame(keyword, count, condition=None, seed=0, exchange_rate=150, current_date=None):
+    """count 件の検索結果を型付きの DataFrame で返す（result_schema.to_frame と同じ型）"""
+    columns = generate_columns(keyword, count, condition, seed, exchange_rate, current_date)
+    columns.pop('状態の表記')
+    return from_columns(columns)
+
+
+def _item_html(columns, title):
+    """1件ずつの li.s-item のHTML（列ごとの文字列の連結で作る）"""
+    href = columns['リンク'] + "?_trksid=p2380057&amp;amdata=enc%3AAQAJAAAA"
+    ids = np.arange(len(title)).astype(str).astype(object)
+
+    subtitle = np.where(columns['状態の表記'] != "",
+                        '<div class="s-item__subtitle"><span class="SECONDARY_INFO">' + columns['状態の表記'] + '</span></div>',
+                        "").astype(object)
+    shipping = np.where(columns['配送'] != "不明",
+                        '<div class="s-item__detail s-item__detail--primary"><span class="s-item__shipping '
+                        's-item__logisticsCost">' + columns['配送'] + '</span></div>', "").astype(object)
+    shops = np.array([html.escape(shop) if shop is not None else "" for shop in columns['ショップ名'].tolist()],
+                     dtype=object)
+    seller = np.where(columns['出品者'] != "",
+                      '<div class="s-item__detail s-item__detail--secondary"><span class="s-item__seller-info">'
+                      '<span class="s-item__seller-info-text">' + columns['出品者'] + " (" + shops + ") 99.5%"
+                      '</span></span></div>', "").astype(object)
+
+    return (
+        '<li class="s-item s-item__pl-on-bottom" id="item' + ids + '"><div class="s-item__wrapper clearfix">'
+        '<div class="s-item__image-section"><div class="s-item__image"><a tabindex="-1" aria-hidden="true" href="'
+        + href + '"><div class="s-item__image-wrapper image-treatment"><img class="s-item__image-img" alt="'
+        + title + '" src="' + columns['画像URL'] + '" loading="eager"></div></a></div></div>'
+        '<div class="s-item__info clearfix"><a href="' + href + '" class="s-item__link"><div class="s-item__title">'
+        '<span role="heading" aria-level="3">' + title + '</span></div></a>' + subtitle
+        + '<div class="s-item__details clearfix"><div class="s-item__detail s-item__detail--primary">'
+        '<span class="s-item__price">' + columns['価格（表示）'] + '</span></div>' + shipping
+        + '<div class="s-item__detail s-item__detail--primary"><span class="s-item__location s-item__itemLocation">'
+        + columns['場所'] + '</span></div>' + seller + '</div></div></div></li>'
+    )
+
+
+def generate_pages(keyword, count, condition=None, page_size=50, seed=0, exchange_rate=150):
+    """generate_rows と同じ count 件の商品を page_size 件ずつの検索結果ページのHTMLにする
+
+    各ページの先頭には実際のページと同じく「Shop on eBay」の項目（解析では除外される）を入れる。
+    """
+    columns = generate_columns(keyword, count, condition, seed, exchange_rate)
+    title = np.array([html.escape(value) for value in columns['タイトル'].tolist()], dtype=object)
+    items = _item_html(columns, title)
+    header = (
+        f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{html.escape(keyword)} | eBay</title>'
+        '</head><body><ul class="srp-results srp-list clearfix">'
+        '<li class="s-item s-item__pl-on-bottom"><div class="s-item__wrapper clearfix"><div class="s-item__info clearfix">'
+        '<a href="https://ebay.com/itm/123456" class="s-item__link"><div class="s-item__title">'
+        '<span role="heading" aria-level="3">Shop on eBay</span></div></a><div class="s-item__details clearfix">'
+        '<span class="s-item__price">$20.00</span></div></div></div></li>'
+    )
+    footer = '</ul></body></html>'
+    return [header + "".join(items[start:start + page_size]) + footer for start in range(0, count, page_size)]
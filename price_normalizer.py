@@ -0,0 +1,181 @@
+"""価格・送料の正規化（列単位の一括処理）
+
+「価格（表示）」と「配送」の文字列から、通貨・価格の範囲（最低・最高）・送料を
+列全体に対する文字列処理で取り出し、送料込みの合計をドルと円で計算する。
+"$1,299.00" のような桁区切り、"$10.00 to $20.00" のような価格の範囲、
+"US $" / "GBP" / "JPY" などの通貨の表記に対応する。
+送料は "Free" で始まる表記（"Free 3 day shipping" など）と「送料無料」を0とし、金額は通貨の表記か
+"+" の後の数字だけを送料とみなす（"Free delivery in 2-4 days" の日数などを送料にしない）。
+"""
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# 通貨の表記と通貨コードの対応（長い表記から順に照合する）
+CURRENCY_SYMBOLS = {
+    'US $': 'USD',
+    'C $': 'CAD',
+    'AU $': 'AUD',
+    'USD': 'USD',
+    'CAD': 'CAD',
+    'AUD': 'AUD',
+    'GBP': 'GBP',
+    'EUR': 'EUR',
+    'JPY': 'JPY',
+    '$': 'USD',
+    '£': 'GBP',
+    '€': 'EUR',
+    '¥': 'JPY',
+}
+
+# 1通貨あたりのドル換算レートの既定値（2024年初め頃のおおよその値。normalize_prices の rates で
+# 上書きできる。円は為替レート設定から計算する）
+USD_RATES = {
+    'USD': 1.0,
+    'CAD': 0.73,
+    'AUD': 0.66,
+    'GBP': 1.27,
+    'EUR': 1.08,
+}
+
+_CURRENCY = "|".join(sorted((symbol.replace('$', r'\$') for symbol in CURRENCY_SYMBOLS), key=len, reverse=True))
+_AMOUNT = r'\d[\d,]*(?:\.\d+)?'
+PRICE_PATTERN = (
+    rf'(?P<currency>{_CURRENCY})?\s*(?P<low>{_AMOUNT})'
+    rf'(?:\s*(?:to|-|～|〜)\s*(?:{_CURRENCY})?\s*(?P<high>{_AMOUNT}))?'
+)
+# 送料の金額は "+" の後（通貨の表記は省略可）か、通貨の表記の後の数字だけ
+SHIPPING_PATTERN = (
+    rf'(?:\+\s*(?P<currency>{_CURRENCY})?|(?P<code>{_CURRENCY}))\s*(?P<amount>{_AMOUNT})'
+)
+FREE_SHIPPING_PATTERN = r'(?i)^\s*free\b|free\s+(?:international\s+)?shipping|送料無料'
+
+# 正規化で追加する列
+NORMALIZED_COLUMNS = ['通貨', '価格（最高）', '送料（USD）', '合計（USD）', '合計（円）']
+
+
+def _text(values):
+    return pd.Series(values, copy=False).astype(object).fillna("").astype(str)
+
+
+def _extract(text, pattern):
+    """正規表現の名前付きグループを列ごとに取り出す（一致しないグループは欠損値）
+
+    pyarrow がある場合は Arrow の正規表現エンジン（RE2）で列全体を一度に処理し、
+    Arrowの配列のまま返す。
+    """
+    if HAS_PYARROW:
+        parts = pc.extract_regex(pa.array(text.to_numpy(dtype=object), type=pa.string()), pattern)
+        columns = {}
+        for i, field in enumerate(parts.type):
+            values = pc.struct_field(parts, [i])
+            # 一致しなかったグループは空文字になるため欠損値にそろえる
+            columns[field.name] = pc.if_else(pc.equal(values, ""), None, values)
+        return columns
+    parts = text.str.extract(pattern)
+    return {name: parts[name] for name in parts.columns}
+
+
+def _coalesce(values, others):
+    """values の欠損値を others の値で埋める"""
+    if HAS_PYARROW and isinstance(values, pa.Array):
+        return pc.coalesce(values, others)
+    return values.where(values.notna(), others)
+
+
+def _contains(text, pattern):
+    if HAS_PYARROW:
+        matched = pc.match_substring_regex(pa.array(text.to_numpy(dtype=object), type=pa.string()), pattern)
+        return matched.to_numpy(zero_copy_only=False)
+    return text.str.contains(pattern, regex=True).to_numpy()
+
+
+def _amount(values):
+    """桁区切りを除いて数値にする（取り出せなかった値は NaN）"""
+    if HAS_PYARROW and isinstance(values, pa.Array):
+        amounts = pc.cast(pc.replace_substring(values, ',', ''), pa.float64())
+        return amounts.to_numpy(zero_copy_only=False)
+    return pd.to_numeric(values.str.replace(',', '', regex=False), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _currency(values, index):
+    """通貨の表記を通貨コードにそろえる（表記のないものはドル）"""
+    if HAS_PYARROW and isinstance(values, pa.Array):
+        # 種類の少ない列なので、辞書型にして表記の種類ごとに変換する
+        values = pd.Series(values.dictionary_encode().to_pandas(), index=index)
+    return values.map(CURRENCY_SYMBOLS).astype(object).fillna('USD')
+
+
+def _usd_rate(currency, exchange_rate, rates):
+    """通貨コードの列からドル換算レートの配列を作る（不明な通貨はドルとみなす）"""
+    table = dict(USD_RATES if rates is None else rates)
+    table['JPY'] = 1.0 / exchange_rate
+    return currency.map(table).fillna(1.0).to_numpy(dtype=np.float64)
+
+
+def parse_prices(price_text):
+    """価格の文字列の列から 通貨・最低価格・最高価格 の DataFrame を作る"""
+    text = _text(price_text)
+    parts = _extract(text, PRICE_PATTERN)
+    low = _amount(parts['low'])
+    high = _amount(parts['high'])
+    high = np.where(np.isnan(high), low, high)
+    currency = _currency(parts['currency'], text.index)
+    return pd.DataFrame({'通貨': currency, '最低': low, '最高': high}, index=text.index)
+
+
+def parse_shipping(shipping_text, exchange_rate=150, rates=None):
+    """配送の文字列の列からドル換算の送料を作る（無料は0、記載のないものは NaN）"""
+    text = _text(shipping_text)
+    parts = _extract(text, SHIPPING_PATTERN)
+    currency = _currency(_coalesce(parts['currency'], parts['code']), text.index)
+    cost = _amount(parts['amount']) * _usd_rate(currency, exchange_rate, rates)
+    free = _contains(text, FREE_SHIPPING_PATTERN)
+    return np.where(free, 0.0, cost)
+
+
+def _to_yen(usd, exchange_rate):
+    """ドルの配列を円に換算する（高額な出品で int32 があふれないよう int64 にする）"""
+    return (np.asarray(usd, dtype=np.float64) * exchange_rate).astype(np.int64)
+
+
+def normalize_prices(df, exchange_rate=150, rates=None):
+    """価格・送料を正規化した列を追加した DataFrame を返す
+
+    「価格」「価格（円）」は最低価格をドル・円に換算した値で置き換える。
+    「合計（USD）」「合計（円）」は最低価格に送料を足した値（送料が不明な場合は価格のみ）。
+    """
+    if df.empty or '価格（表示）' not in df.columns:
+        return df
+    prices = parse_prices(df['価格（表示）'])
+    usd_rate = _usd_rate(prices['通貨'], exchange_rate, rates)
+    low_usd = np.nan_to_num(prices['最低'].to_numpy() * usd_rate)
+    high_usd = np.nan_to_num(prices['最高'].to_numpy() * usd_rate)
+    shipping = (parse_shipping(df['配送'], exchange_rate, rates) if '配送' in df.columns
+                else np.full(len(df), np.nan))
+    total = low_usd + np.nan_to_num(shipping)
+
+    result = df.copy()
+    result['価格'] = low_usd.astype(np.float32)
+    result['価格（円）'] = _to_yen(low_usd, exchange_rate)
+    result['通貨'] = pd.Categorical(prices['通貨'])
+    result['価格（最高）'] = high_usd.astype(np.float32)
+    result['送料（USD）'] = shipping.astype(np.float32)
+    result['合計（USD）'] = total.astype(np.float32)
+    result['合計（円）'] = _to_yen(total, exchange_rate)
+    return result
+
+
+def apply_exchange_rate(df, exchange_rate):
+    """円の列（価格（円）・合計（円））を為替レートから計算し直した DataFrame を返す"""
+    result = df.copy()
+    result['価格（円）'] = _to_yen(result['価格'], exchange_rate)
+    if '合計（USD）' in result.columns:
+        result['合計（円）'] = _to_yen(result['合計（USD）'], exchange_rate)
+    return result
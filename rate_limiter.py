@@ -0,0 +1,175 @@
+"""eBayへのリクエストをプロセス全体で制御するレート制限スケジューラ
+
+すべてのセッションのリクエストを1つのキューに入れ、トークンバケットで送信間隔を守る。
+呼び出し側は送信を待つ間、キュー内の順番と待ち時間の目安を表示できる。
+"""
+import collections
+import math
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class ScheduledRequest:
+    """スケジューラに登録したリクエスト（結果は future で受け取る）"""
+
+    def __init__(self, scheduler, func, args, kwargs):
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+        self._scheduler = scheduler
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+
+    def position(self):
+        """キュー内の順番（0なら次に送信される。送信済みの場合は None）"""
+        return self._scheduler.position(self)
+
+    def eta(self):
+        """送信されるまでの目安の秒数"""
+        return self._scheduler.eta(self)
+
+    def done(self):
+        return self.future.done()
+
+    def wait(self, timeout=None):
+        """完了するか timeout 秒経過するまで待つ"""
+        try:
+            self.future.exception(timeout=timeout)
+        except Exception:
+            pass
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout=timeout)
+
+
+class RequestScheduler:
+    """トークンバケット方式のレート制限スケジューラ
+
+    - requests_per_minute: 1分あたりに送信するリクエスト数
+    - burst: 間隔を空けずに連続で送信できる数（バケットの容量）
+    - jitter: 待機が必要な場合に追加するランダムな秒数の範囲
+    - max_workers: 同時に実行するリクエスト数の上限
+    """
+
+    def __init__(self, requests_per_minute=3, burst=1, jitter=(0, 0), max_workers=4):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.jitter = jitter
+        self.completed = 0
+        self.failed = 0
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._ready_at = None
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ebay-request")
+        self._worker = threading.Thread(target=self._run, name="ebay-scheduler", daemon=True)
+        self._worker.start()
+
+    @property
+    def rate(self):
+        """1秒あたりのトークン補充数"""
+        return self.requests_per_minute / 60
+
+    def submit(self, func, *args, **kwargs):
+        """リクエストをキューに追加する"""
+        request = ScheduledRequest(self, func, args, kwargs)
+        with self._cond:
+            self._queue.append(request)
+            self._cond.notify_all()
+        return request
+
+    def backoff(self, seconds):
+        """次の送信を seconds 秒以上遅らせる（eBayが混雑・制限の応答を返した場合に全セッションで待つ）
+
+        待ち時間はトークンの不足として扱うため、その後の送信間隔もレート制限どおりになる。
+        """
+        with self._cond:
+            self._refill()
+            self._tokens = min(self._tokens, 1.0) - seconds * self.rate
+            # 先頭のリクエストの送信時刻を決め直す
+            self._ready_at = None
+            self._cond.notify_all()
+
+    def position(self, request):
+        with self._cond:
+            try:
+                return self._queue.index(request)
+            except ValueError:
+                return None
+
+    def eta(self, request):
+        with self._cond:
+            try:
+                index = self._queue.index(request)
+            except ValueError:
+                return 0.0
+            self._refill()
+            mean_jitter = (self.jitter[0] + self.jitter[1]) / 2
+            if self._ready_at is not None:
+                # 先頭は送信時刻が決まっているので、そこから1件ごとの間隔を足す
+                return max(0.0, self._ready_at - time.monotonic()) + index * (1 / self.rate + mean_jitter)
+            # 自分より前のリクエストと自分の分のトークンが貯まるまでの時間
+            missing = index + 1 - self._tokens
+            if missing <= 0:
+                return 0.0
+            return missing / self.rate + mean_jitter * math.ceil(missing)
+
+    def queue_length(self):
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self):
+        with self._cond:
+            self._refill()
+            return {
+                "requests_per_minute": self.requests_per_minute,
+                "queued": len(self._queue),
+                "tokens": self._tokens,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                if self._queue[0].future.cancelled():
+                    # 送信前に取り消されたリクエストはトークンを消費しない
+                    self._queue.popleft()
+                    continue
+                self._refill()
+                if self._tokens < 1:
+                    # 先頭のリクエストの送信時刻は一度だけ決める（新しい登録で待ち時間が延びないように）
+                    if self._ready_at is None:
+                        self._ready_at = time.monotonic() + (1 - self._tokens) / self.rate + random.uniform(*self.jitter)
+                    remaining = self._ready_at - time.monotonic()
+                    if remaining > 0:
+                        self._cond.wait(timeout=remaining)
+                        continue
+                    self._tokens = max(self._tokens, 1.0)
+                self._ready_at = None
+                self._tokens -= 1
+                request = self._queue.popleft()
+            self._executor.submit(self._execute, request)
+
+    def _execute(self, request):
+        if not request.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = request._func(*request._args, **request._kwargs)
+        except BaseException as e:
+            self.failed += 1
+            request.future.set_exception(e)
+        else:
+            self.completed += 1
+            request.future.set_result(result)
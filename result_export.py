@@ -0,0 +1,148 @@
+"""検索結果のエクスポート（CSV・gzip圧縮CSV・JSON Lines・Parquet・Excel）
+
+ファイルの列名と列の順番は従来のCSVと同じ（タイトル→商品名、配送→送料）。
+大量の検索結果でもメモリに全体の文字列を作らないように、chunk_size 行ずつ
+ファイルに書き出す。Excelは openpyxl がインストールされている場合だけ使える。
+"""
+import gzip
+import io
+
+import pandas as pd
+
+from price_normalizer import NORMALIZED_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+try:
+    import openpyxl  # noqa: F401
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
+
+# 検索結果の列名とファイルの列名の対応
+COLUMN_MAPPING = {
+    'タイトル': '商品名',
+    '配送': '送料',
+}
+
+# ファイルの列の順番（検索結果にない列は空の列になる）
+EXPORT_COLUMNS = ['商品名', '価格', '価格（円）', '送料', '状態', '場所', '出品者', 'ショップ名', '出品日時']
+
+CHUNK_SIZE = 50000
+
+# 形式の表示名と（拡張子, MIMEタイプ）の対応
+FORMATS = {"CSV": ("csv", "text/csv")}
+FORMATS["CSV（gzip圧縮）"] = ("csv.gz", "application/gzip")
+FORMATS["JSON Lines"] = ("jsonl", "application/x-ndjson")
+if HAS_PYARROW:
+    FORMATS["Parquet"] = ("parquet", "application/vnd.apache.parquet")
+if HAS_OPENPYXL:
+    FORMATS["Excel"] = ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
+def export_columns(df):
+    """ファイルに書き出す列（キーワード列は先頭、正規化した価格・送料の列は末尾に追加）"""
+    columns = list(EXPORT_COLUMNS)
+    if 'キーワード' in df.columns:
+        columns.insert(0, 'キーワード')
+    if '合計（USD）' in df.columns:
+        columns += NORMALIZED_COLUMNS
+    return columns
+
+
+def export_chunks(df, chunk_size=CHUNK_SIZE):
+    """ファイルの列名・列順にそろえた DataFrame を chunk_size 行ずつ返す"""
+    source_columns = {COLUMN_MAPPING.get(column, column): column for column in df.columns}
+    columns = export_columns(df)
+    for start in range(0, max(len(df), 1), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        yield chunk.reindex(columns=[source_columns.get(column, column) for column in columns]).set_axis(columns, axis=1)
+
+
+def write_csv(df, fileobj, chunk_size=CHUNK_SIZE):
+    """CSVをバイナリのファイルオブジェクトに書き出す"""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8', newline='', write_through=True)
+    try:
+        for i, chunk in enumerate(export_chunks(df, chunk_size)):
+            chunk.to_csv(text, index=False, header=(i == 0))
+        text.flush()
+    finally:
+        # fileobj を閉じないように切り離す
+        text.detach()
+
+
+def write_gzip_csv(df, fileobj, chunk_size=CHUNK_SIZE):
+    with gzip.GzipFile(fileobj=fileobj, mode='wb') as gz:
+        write_csv(df, gz, chunk_size)
+
+
+def write_jsonl(df, fileobj, chunk_size=CHUNK_SIZE):
+    """1行1件のJSON（JSON Lines）を書き出す"""
+    for chunk in export_chunks(df, chunk_size):
+        if len(chunk):
+            text = chunk.to_json(orient='records', lines=True, force_ascii=False, date_format='iso')
+            fileobj.write(text.rstrip('\n').encode('utf-8') + b'\n')
+
+
+def write_parquet(df, fileobj, chunk_size=CHUNK_SIZE):
+    """Parquetを chunk_size 行ずつの行グループで書き出す"""
+    writer = None
+    try:
+        for chunk in export_chunks(df, chunk_size):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(fileobj, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_excel(df, fileobj, chunk_size=CHUNK_SIZE):
+    """Excel（xlsx）の1枚のシートに chunk_size 行ずつ書き出す"""
+    with pd.ExcelWriter(fileobj, engine='openpyxl') as writer:
+        row = 0
+        for i, chunk in enumerate(export_chunks(df, chunk_size)):
+            chunk.to_excel(writer, index=False, header=(i == 0), startrow=row)
+            row += len(chunk) + (1 if i == 0 else 0)
+
+
+WRITERS = {
+    "CSV": write_csv,
+    "CSV（gzip圧縮）": write_gzip_csv,
+    "JSON Lines": write_jsonl,
+    "Parquet": write_parquet,
+    "Excel": write_excel,
+}
+
+
+def write_export(df, fmt, fileobj, chunk_size=CHUNK_SIZE):
+    """fmt の形式で fileobj（バイナリ）に書き出す"""
+    if fmt not in FORMATS:
+        raise ValueError(f"対応していない形式です: {fmt}")
+    WRITERS[fmt](df, fileobj, chunk_size)
+
+
+def export_bytes(df, fmt, chunk_size=CHUNK_SIZE):
+    """fmt の形式のファイルの内容をバイト列で返す（ダウンロードボタン用）"""
+    buffer = io.BytesIO()
+    write_export(df, fmt, buffer, chunk_size)
+    return buffer.getvalue()
+
+
+def format_for_path(path):
+    """ファイル名の拡張子から形式を決める（該当しない場合は None）"""
+    for fmt, (extension, _) in sorted(FORMATS.items(), key=lambda item: -len(item[1][0])):
+        if path.lower().endswith("." + extension):
+            return fmt
+    return None
+
+
+def export_file_name(fmt, timestamp):
+    extension, _ = FORMATS[fmt]
+    return f"ebay_results_{timestamp}.{extension}"
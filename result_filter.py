@@ -0,0 +1,42 @@
+"""検索結果の絞り込み
+
+保存済みの検索結果の DataFrame を、価格の範囲・状態・発送元・出品者・タイトルの
+部分一致で絞り込む。状態・発送元・出品者はカテゴリ型の列なので、選んだ値を
+カテゴリのコードに変換して整数の比較だけで判定する。
+"""
+import numpy as np
+
+
+def _category_mask(series, values):
+    """カテゴリ型の列が values のいずれかに一致する行"""
+    if hasattr(series, 'cat'):
+        codes = series.cat.categories.get_indexer(list(values))
+        return np.isin(series.cat.codes.to_numpy(), codes[codes >= 0])
+    return series.isin(list(values)).to_numpy()
+
+
+def filter_frame(df, price_range=None, conditions=None, locations=None, sellers=None, title=None,
+                 price_column='価格'):
+    """条件に一致する行だけの DataFrame を返す（指定しない条件は絞り込まない）"""
+    mask = np.ones(len(df), dtype=bool)
+    if price_range is not None:
+        prices = df[price_column].to_numpy(dtype=np.float64)
+        mask &= (prices >= price_range[0]) & (prices <= price_range[1])
+    if conditions:
+        mask &= _category_mask(df['状態'], conditions)
+    if locations:
+        mask &= _category_mask(df['場所'], locations)
+    if sellers:
+        mask &= _category_mask(df['出品者'], sellers)
+    if title:
+        mask &= df['タイトル'].str.contains(title, case=False, regex=False, na=False).to_numpy(dtype=bool)
+    if mask.all():
+        return df
+    return df[mask]
+
+
+def filter_options(df, column):
+    """絞り込みの選択肢（件数の多い順）"""
+    if column not in df.columns:
+        return []
+    return df[column].value_counts(dropna=True).index.astype(str).tolist()
@@ -0,0 +1,91 @@
+"""検索結果のDataFrameの列定義（型付きの列指向モデル）
+
+EbayScraper が返す辞書のリストを、列ごとにまとめて明示的な型の DataFrame に変換する。
+繰り返しの多い列はカテゴリ型、価格は float32（円は int64）、文字列はArrowの文字列型にして
+セッションに保持する結果のメモリ使用量を抑える。
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+# 列名と型の対応（列の順番もこの順）
+RESULT_SCHEMA = {
+    'キーワード': 'category',
+    'タイトル': STRING_DTYPE,
+    '価格': 'float32',
+    '価格（円）': 'int64',
+    '価格（表示）': STRING_DTYPE,
+    '配送': 'category',
+    '状態': 'category',
+    '場所': 'category',
+    '出品者': 'category',
+    'ショップ名': STRING_DTYPE,
+    '出品日時': 'datetime64[ns]',
+    'リンク': STRING_DTYPE,
+    '画像URL': STRING_DTYPE,
+}
+
+
+def normalize_shop_name(value):
+    """ショップ名（[名前] のリストまたは "N/A"）を文字列か None にそろえる"""
+    if isinstance(value, list):
+        return value[0] if value else None
+    if value == "N/A" or value == "":
+        return None
+    return value
+
+
+def _to_array(values, dtype):
+    if dtype == 'category':
+        return pd.Categorical(values)
+    if dtype == 'float32':
+        return np.asarray(values, dtype=np.float32)
+    if dtype == 'int64':
+        return np.asarray(values, dtype=np.int64)
+    if dtype == 'datetime64[ns]':
+        return pd.to_datetime(values)
+    return pd.array(values, dtype=dtype)
+
+
+def to_frame(rows):
+    """検索結果の辞書のリストを型付きの DataFrame に変換する"""
+    if not rows:
+        return empty_frame()
+
+    columns = [column for column in RESULT_SCHEMA if column in rows[0]]
+    columns += [column for column in rows[0] if column not in RESULT_SCHEMA]
+    return from_columns({column: [row.get(column) for row in rows] for column in columns})
+
+
+def from_columns(columns):
+    """列名と値の配列の辞書から型付きの DataFrame を作る（列の順番は辞書の順）"""
+    data = {}
+    for column, values in columns.items():
+        if column == 'ショップ名':
+            values = [normalize_shop_name(value) for value in values]
+        dtype = RESULT_SCHEMA.get(column)
+        data[column] = _to_array(values, dtype) if dtype else values
+    return pd.DataFrame(data)
+
+
+def frame_hash(df):
+    """検索結果の内容から計算したハッシュ値（集計・エクスポートのキャッシュのキーに使う）"""
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    # 行の順序も区別する（並べ替えた結果を同じキーにしない）
+    return f"{len(df)}:{hashlib.blake2b(hashes.tobytes(), digest_size=16).hexdigest()}"
+
+
+def empty_frame():
+    """列と型だけを持つ空の DataFrame"""
+    return pd.DataFrame({
+        column: _to_array([], dtype)
+        for column, dtype in RESULT_SCHEMA.items()
+        if column != 'キーワード'
+    })
@@ -0,0 +1,170 @@
+"""eBay検索結果のディスクキャッシュ（TTL + LRU）"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# キャッシュファイルの既定の保存先（アプリと同じディレクトリの .cache 配下）
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "search_cache.sqlite3")
+
+
+def normalize_params(params):
+    """キャッシュキー用に検索パラメータを正規化する"""
+    normalized = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        value = str(value).strip()
+        if value == "":
+            continue
+        if key == "_nkw":
+            # キーワードは大文字小文字・余分な空白を区別しない
+            value = " ".join(value.lower().split())
+        normalized[key] = value
+    return normalized
+
+
+def make_cache_key(params):
+    """正規化したパラメータからキャッシュキーを作成する"""
+    payload = json.dumps(normalize_params(params), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """検索パラメータをキーに生HTMLと解析済みの行を保存するキャッシュ
+
+    - ttl: 有効期間（秒）。期限切れのエントリはミス扱いで削除される
+    - max_entries / max_bytes: 上限を超えると最終アクセスが古いものから削除（LRU）
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=3600, max_entries=500, max_bytes=200 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Streamlitの複数スレッドから共有するため check_same_thread=False とし、ロックで直列化する
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                params TEXT NOT NULL,
+                html TEXT NOT NULL,
+                rows TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_last_access ON search_cache (last_access)")
+        self._conn.commit()
+
+    def get(self, params, max_age=None, count_miss=True):
+        """キャッシュを参照する。ヒットしなければ None を返す
+
+        max_age: この呼び出しで有効とみなす経過秒数（None の場合は ttl）。ttl より短い場合、
+        それより古いエントリはミスになるが、ほかの呼び出し元のために削除はしない。
+        count_miss: False の場合はミスを数えない（同じ検索のキャッシュを確認し直す場合）
+        """
+        key = make_cache_key(params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT html, rows, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+
+            html, rows, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                # 期限切れ
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                if count_miss:
+                    self.misses += 1
+                return None
+
+            if max_age is not None and now - created_at > max_age:
+                if count_miss:
+                    self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE search_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+        return {
+            "html": html,
+            "rows": json.loads(rows),
+            "created_at": created_at,
+        }
+
+    def set(self, params, html, rows):
+        """検索結果をキャッシュに保存する"""
+        key = make_cache_key(params)
+        params_json = json.dumps(normalize_params(params), sort_keys=True, ensure_ascii=False)
+        rows_json = json.dumps(rows, ensure_ascii=False)
+        size = len(html.encode("utf-8")) + len(rows_json.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, params, html, rows, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, params_json, html, rows_json, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # 期限切れを先に削除し、その後LRUで件数・サイズの上限に収める
+        if self.ttl is not None:
+            cursor = self._conn.execute("DELETE FROM search_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            self.evictions += cursor.rowcount
+
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM search_cache").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM search_cache ORDER BY last_access ASC"
+        ).fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """キャッシュをすべて削除する"""
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache")
+            self._conn.commit()
+
+    def stats(self):
+        """ヒット数・ミス数・件数・サイズを返す"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM search_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": count,
+            "bytes": total,
+        }
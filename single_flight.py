@@ -0,0 +1,72 @@
+"""同時に実行中の同じ処理を1回にまとめる（single-flight）
+
+同じキーの処理を複数の呼び出し元が同時に始めようとした場合、最初の呼び出し元（リーダー）だけが
+実行し、ほかの呼び出し元はその完了を待って同じ結果を受け取る。結果は完了時点で破棄するため、
+キャッシュとは違い、実行中の間だけまとめる。
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """キーごとの実行中の処理（プロセス全体で共有できる）
+
+    join でキーの処理に参加し、リーダーになった呼び出し元は処理が終わったら必ず finish を呼ぶ。
+    ほかの呼び出し元は join が返した Future で結果を待つ。リーダーが中断した場合、Future は
+    取り消し（cancelled）になるため、待っていた呼び出し元は join からやり直す。
+    """
+
+    def __init__(self):
+        self.executed = 0   # リーダーとして実行した数
+        self.coalesced = 0  # 実行中の処理の結果を待った数
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """key の処理に参加する（Future と、自分がリーダーかどうかを返す）"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Future()
+            self.executed += 1
+            return flight, True
+
+    def finish(self, key, flight, result=None, exception=None):
+        """リーダーの処理の結果（または例外）を待っている呼び出し元に渡す
+
+        exception が Exception でない場合（画面の再実行などによる中断）は取り消しにする。
+        """
+        if exception is not None and not isinstance(exception, Exception):
+            self.cancel(key, flight)
+            return
+        self._remove(key, flight)
+        if exception is None:
+            flight.set_result(result)
+        else:
+            flight.set_exception(exception)
+
+    def cancel(self, key, flight):
+        """リーダーが処理を中断したことを待っている呼び出し元に知らせる"""
+        self._remove(key, flight)
+        flight.cancel()
+        # concurrent.futures.wait で待っている呼び出し元にも取り消しを知らせる
+        flight.set_running_or_notify_cancel()
+
+    def _remove(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+            }
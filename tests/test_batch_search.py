@@ -0,0 +1,16 @@
+import io
+
+import pytest
+
+import batch_search
+
+
+@pytest.mark.parametrize("data", [b"", b"\n\n  \n", "﻿".encode("utf-8")])
+def test_parse_keywords_empty_csv(data):
+    assert batch_search.parse_keywords("", io.BytesIO(data)) == []
+    assert batch_search.parse_keywords("camera\n", io.BytesIO(data)) == ["camera"]
+
+
+@pytest.mark.parametrize("data", [b"Keyword\ncamera\nlens\n", b"camera\nlens\n", b"sku,memo\ncamera,a\nlens,b\n"])
+def test_parse_keywords_csv(data):
+    assert batch_search.parse_keywords("lens", io.BytesIO(data)) == ["lens", "camera"]
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import dedup
+import mock_data
+
+
+@pytest.fixture
+def listings():
+    return pd.DataFrame(mock_data.generate_rows("vintage camera", 2000, seed=3, current_date="2024-01-01"))
+
+
+def test_title_groups_ignores_index(listings):
+    expected = dedup.title_groups(listings)
+    for index in (listings.index[::-1], listings.index + 1000, listings.index.astype(str)):
+        assert np.array_equal(dedup.title_groups(listings.set_axis(index)), expected)
+
+
+def test_title_groups_after_filter_and_concat(listings):
+    filtered = listings[listings.index % 2 == 0]
+    assert np.array_equal(dedup.title_groups(filtered), dedup.title_groups(filtered.reset_index(drop=True)))
+    head = listings.iloc[:500]
+    groups = dedup.title_groups(pd.concat([head, head]))
+    # 同じ出品者・同じタイトルの行は同じグループになる（出品者が分からない行はまとめない）
+    has_seller = (head['出品者'] != "").to_numpy()
+    assert np.array_equal(groups[:500][has_seller], groups[500:][has_seller])
+    assert not np.any(groups[:500][~has_seller] == groups[500:][~has_seller])
+
+
+def test_minhash_signatures_ignore_index():
+    titles = pd.Series(["Canon AE-1 film camera", "", None, "Nikon F3 body"], index=[7, 3, 9, 1])
+    signatures, has_tokens = dedup.minhash_signatures(titles)
+    expected, expected_tokens = dedup.minhash_signatures(titles.tolist())
+    assert np.array_equal(signatures, expected)
+    assert has_tokens.tolist() == expected_tokens.tolist() == [True, False, False, True]
+
+
+def test_similar_titles_grouped():
+    df = pd.DataFrame({
+        'タイトル': ["Canon AE-1 Program 35mm Film Camera Body Tested Working",
+                 "Canon AE-1 Program 35mm Film Camera Body Tested Working Japan",
+                 "Canon AE-1 Program 35mm Film Camera Body Tested Working",
+                 "Nikon F3 HP 35mm SLR Film Camera"],
+        '出品者': ["seller_a", "seller_a", "seller_b", "seller_a"],
+    }, index=[10, 4, 8, 2])
+    groups = dedup.title_groups(df)
+    assert groups[0] == groups[1]
+    assert len(set(groups)) == 3
@@ -0,0 +1,100 @@
+import math
+
+import pandas as pd
+import pytest
+
+import price_normalizer
+
+
+@pytest.fixture(params=[True, False], ids=["pyarrow", "pandas"])
+def backend(request, monkeypatch):
+    """pyarrow の正規表現と pandas の正規表現の両方で確認する"""
+    if request.param and not price_normalizer.HAS_PYARROW:
+        pytest.skip("pyarrow がインストールされていない")
+    monkeypatch.setattr(price_normalizer, "HAS_PYARROW", request.param)
+
+
+@pytest.mark.parametrize("text", [
+    "Free shipping",
+    "Free International Shipping",
+    "Free 3 day shipping",
+    "Free 4 day shipping",
+    "Free delivery in 2-4 days",
+    "Free delivery",
+    "Free Standard Shipping",
+    "free shipping",
+    "送料無料",
+])
+def test_parse_shipping_free(backend, text):
+    assert price_normalizer.parse_shipping([text]).tolist() == [0.0]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("+$5.99 shipping", 5.99),
+    ("+ $5.99 shipping", 5.99),
+    ("+US $12.50 shipping", 12.5),
+    ("US $4.00 shipping", 4.0),
+    ("+$1,250.00 shipping", 1250.0),
+    ("+C $10.00 shipping", 7.3),
+    ("+AU $10.00 shipping", 6.6),
+    ("+GBP 10.00 shipping", 12.7),
+    ("+EUR 10.00 shipping", 10.8),
+    ("+£10.00 shipping", 12.7),
+    ("+JPY 1,500 shipping", 10.0),
+    ("+¥1,500 shipping", 10.0),
+])
+def test_parse_shipping_amount(backend, text, expected):
+    assert price_normalizer.parse_shipping([text], exchange_rate=150).tolist() == pytest.approx([expected])
+
+
+@pytest.mark.parametrize("text", ["不明", "", None, "Shipping not specified", "3 day shipping", "Ships in 2-4 days"])
+def test_parse_shipping_unknown(backend, text):
+    assert math.isnan(price_normalizer.parse_shipping([text])[0])
+
+
+def test_parse_shipping_rates(backend):
+    rates = {**price_normalizer.USD_RATES, "GBP": 2.0}
+    assert price_normalizer.parse_shipping(["+GBP 5.00 shipping"], rates=rates).tolist() == [10.0]
+
+
+@pytest.mark.parametrize("text, currency, low, high", [
+    ("$19.99", "USD", 19.99, 19.99),
+    ("US $1,299.00", "USD", 1299.0, 1299.0),
+    ("$10 to $20", "USD", 10.0, 20.0),
+    ("$10.00 to $20.00", "USD", 10.0, 20.0),
+    ("US $5.00 - US $8.50", "USD", 5.0, 8.5),
+    ("C $3.00 to C $4.00", "CAD", 3.0, 4.0),
+    ("AU $2.50", "AUD", 2.5, 2.5),
+    ("GBP 5.00", "GBP", 5.0, 5.0),
+    ("£7.25", "GBP", 7.25, 7.25),
+    ("EUR 12.00", "EUR", 12.0, 12.0),
+    ("€12.00", "EUR", 12.0, 12.0),
+    ("JPY 1,500", "JPY", 1500.0, 1500.0),
+    ("¥1,500～¥2,000", "JPY", 1500.0, 2000.0),
+])
+def test_parse_prices(backend, text, currency, low, high):
+    prices = price_normalizer.parse_prices([text])
+    assert prices["通貨"].tolist() == [currency]
+    assert prices["最低"].tolist() == pytest.approx([low])
+    assert prices["最高"].tolist() == pytest.approx([high])
+
+
+def test_parse_prices_without_amount(backend):
+    prices = price_normalizer.parse_prices(["", None, "価格不明"])
+    assert prices["通貨"].tolist() == ["USD", "USD", "USD"]
+    assert prices["最低"].isna().all()
+    assert prices["最高"].isna().all()
+
+
+def test_normalize_prices_above_int32(backend):
+    df = pd.DataFrame({"価格（表示）": ["$20,000,000.00", "$19.99"], "配送": ["+$100.00 shipping", "Free shipping"]})
+    result = price_normalizer.normalize_prices(df, exchange_rate=150)
+    assert result["価格（円）"].tolist() == [3_000_000_000, 2998]
+    assert result["合計（円）"].tolist() == [3_000_015_000, 2998]
+
+
+def test_apply_exchange_rate_above_int32(backend):
+    df = pd.DataFrame({"価格（表示）": ["$20,000,000.00"], "配送": ["+$100.00 shipping"]})
+    result = price_normalizer.apply_exchange_rate(price_normalizer.normalize_prices(df, exchange_rate=150), 160)
+    assert result["価格（円）"].tolist() == [3_200_000_000]
+    assert result["合計（円）"].tolist() == [3_200_016_000]
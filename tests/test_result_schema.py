@@ -0,0 +1,14 @@
+import pandas as pd
+
+import mock_data
+from result_schema import frame_hash, to_frame
+
+
+def test_frame_hash_depends_on_row_order():
+    df = to_frame(mock_data.generate_rows("vintage camera", 200, seed=3, current_date="2024-01-01"))
+    assert frame_hash(df) == frame_hash(df.copy())
+    assert frame_hash(df) != frame_hash(df.iloc[::-1])
+    assert frame_hash(df) != frame_hash(df.sort_values('価格'))
+    swapped = pd.concat([df.iloc[[1, 0]], df.iloc[2:]])
+    assert frame_hash(df) != frame_hash(swapped)
+    assert frame_hash(df) != frame_hash(df.iloc[:-1])
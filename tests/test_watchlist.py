@@ -0,0 +1,131 @@
+import pytest
+
+from metrics import Metrics
+from watchlist import CHANGE_LABELS, CHANGE_NEW, CHANGE_PRICE, WatchPoller, Watchlist
+
+
+def row(item_id, price):
+    return {
+        'タイトル': f"camera {item_id}",
+        '価格': price,
+        '価格（表示）': f"${price:.2f}",
+        '配送': "Free shipping",
+        '状態': "中古",
+        '場所': "from United States",
+        '出品者': "seller",
+        'ショップ名': "N/A",
+        '出品日時': "2024-01-01",
+        'リンク': f"https://www.ebay.com/itm/{110000000000 + item_id}",
+        '画像URL': "",
+    }
+
+
+@pytest.fixture
+def watchlist():
+    return Watchlist(":memory:")
+
+
+@pytest.fixture
+def watch_id(watchlist):
+    return watchlist.add("camera", {"keyword": "camera"}, max_pages=3)
+
+
+def test_apply_poll_baseline(watchlist, watch_id):
+    counts = watchlist.apply_poll(watch_id, [row(1, 10.0), row(2, 20.0)], baseline=True)
+    assert counts == {"new": 2, "price_changes": 0}
+    assert watchlist.has_snapshot(watch_id)
+    # 初回の取得は差分として記録しない
+    assert watchlist.changes(watch_id).empty
+
+
+def test_apply_poll_changes(watchlist, watch_id):
+    watchlist.apply_poll(watch_id, [row(1, 10.0), row(2, 20.0)], observed_at="2024-01-01T00:00:00", baseline=True)
+    counts = watchlist.apply_poll(watch_id, [row(1, 10.0), row(2, 18.5), row(3, 30.0)],
+                                  observed_at="2024-01-01T01:00:00")
+    assert counts == {"new": 1, "price_changes": 1}
+
+    changes = watchlist.changes(watch_id).set_index('リンク')
+    assert len(changes) == 2
+    new = changes.loc[row(3, 0)['リンク']]
+    assert new['変更'] == CHANGE_LABELS[CHANGE_NEW]
+    assert new['価格'] == 30.0
+    assert new[['前回の価格', '差額']].isna().all()
+    changed = changes.loc[row(2, 0)['リンク']]
+    assert changed['変更'] == CHANGE_LABELS[CHANGE_PRICE]
+    assert (changed['価格'], changed['前回の価格'], changed['差額']) == (18.5, 20.0, -1.5)
+
+
+def test_apply_poll_unchanged(watchlist, watch_id):
+    watchlist.apply_poll(watch_id, [row(1, 10.0)], baseline=True)
+    # 丸めると同じ価格は変更として記録しない
+    assert watchlist.apply_poll(watch_id, [row(1, 10.001)]) == {"new": 0, "price_changes": 0}
+    assert watchlist.changes(watch_id).empty
+
+
+def test_changes_since(watchlist, watch_id):
+    watchlist.apply_poll(watch_id, [row(1, 10.0)], observed_at="2024-01-01T00:00:00", baseline=True)
+    watchlist.apply_poll(watch_id, [row(2, 20.0)], observed_at="2024-01-01T01:00:00")
+    watchlist.apply_poll(watch_id, [row(3, 30.0)], observed_at="2024-01-01T02:00:00")
+    assert watchlist.changes(watch_id)['リンク'].str[-1].tolist() == ["3", "2"]
+    assert watchlist.changes(watch_id, since="2024-01-01T01:00:00")['リンク'].str[-1].tolist() == ["3"]
+
+
+class FakeScheduler:
+    def queue_length(self):
+        return 0
+
+
+class FakeScraper:
+    """新着順のページ（行のリストのリスト）を返す EbayScraper の代わり"""
+
+    page_size = 2
+    exchange_rate = 150
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.fetched = 0
+        self.metrics = Metrics()
+        self.scheduler = FakeScheduler()
+
+    def search_pages(self, limit, max_pages, sort, on_event, **params):
+        for page_rows in self.pages[:max_pages]:
+            self.fetched += 1
+            yield page_rows
+
+
+def test_poll_stops_at_seen_page(watchlist, watch_id):
+    scraper = FakeScraper([[row(1, 10.0), row(2, 20.0)], [row(3, 30.0), row(4, 40.0)], [row(5, 50.0)]])
+    poller = WatchPoller(watchlist, scraper)
+    watch = watchlist.watches()[0]
+    assert poller.poll(watch) == {"new": 5, "price_changes": 0}
+    assert scraper.fetched == 3
+
+    # 新着が1ページ目に入り、見た商品も1ページ目にあるため2ページ目以降は取得しない
+    scraper.pages = [[row(6, 60.0), row(1, 10.0)], [row(2, 20.0), row(3, 33.0)], [row(4, 40.0), row(5, 50.0)]]
+    scraper.fetched = 0
+    assert poller.poll(watch) == {"new": 1, "price_changes": 0}
+    assert scraper.fetched == 1
+
+    # 最大ページ数まで取得し直すと、2ページ目以降の価格変更も記録する
+    scraper.fetched = 0
+    assert poller.poll(watch, full=True) == {"new": 0, "price_changes": 1}
+    assert scraper.fetched == 3
+    assert watchlist.changes(watch_id)['前回の価格'].dropna().tolist() == [30.0]
+
+
+def test_poll_full_interval(watchlist, watch_id):
+    pages = [[row(1, 10.0), row(2, 20.0)], [row(3, 30.0), row(4, 40.0)]]
+    scraper = FakeScraper(pages)
+    watch = watchlist.watches()[0]
+    # 初回の取得は最大ページ数まで取得したものとして数える
+    poller = WatchPoller(watchlist, scraper, full_poll_interval=3600)
+    poller.poll(watch)
+    scraper.fetched = 0
+    poller.poll(watch)
+    assert scraper.fetched == 1
+
+    # 起動し直した直後（最大ページ数まで取得した記録がない）は止めずに取得する
+    poller = WatchPoller(watchlist, scraper, full_poll_interval=3600)
+    scraper.fetched = 0
+    poller.poll(watch)
+    assert scraper.fetched == 2
@@ -0,0 +1,381 @@
+"""保存した検索（ウォッチリスト）の定期取得と差分の記録
+
+検索条件を保存しておくと、バックグラウンドのスレッドが一定間隔で取得し直し、前回の取得との
+差分（新しく見つかった商品・価格が変わった商品）だけをSQLiteに記録する。取得は新着順で行い、
+前回までに見た商品が出てきたページで止めるため、1回の取得は通常1ページで済む。
+そのページより後の商品の価格変更はこの取得では分からないため、FULL_POLL_INTERVAL ごとに
+（アプリの起動後の最初の取得も）途中で止めずに最大ページ数まで取得し直す。
+リクエストはアプリと共有のスケジューラを通すので、全体のリクエスト数の上限は変わらない。
+
+「前回の確認以降の変更」は記録済みの差分から読み込むため、eBayには接続しない。
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+# pandas は読み込みに時間がかかるため、DataFrame を作るメソッドの中で読み込む
+# （保存した検索がない場合に、アプリの最初の表示を遅くしない）
+import ebay_scraper
+from listing_store import extract_item_id
+
+logger = logging.getLogger(__name__)
+
+# データベースの既定の保存先（アプリと同じディレクトリの data 配下）
+DEFAULT_WATCHLIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "watchlists.sqlite3")
+
+# 変更の種類
+CHANGE_NEW = "new"
+CHANGE_PRICE = "price"
+CHANGE_LABELS = {CHANGE_NEW: "新着", CHANGE_PRICE: "価格変更"}
+
+# 保存する検索条件（EbayScraper.search_pages の引数）
+SEARCH_PARAMS = ("keyword", "category", "min_price", "max_price", "condition", "from_country", "to_country")
+
+# ロボット検出後に定期取得を止める時間（秒）
+ROBOT_CHECK_BACKOFF = 30 * 60
+
+# 最大ページ数まで取得し直す間隔（秒）
+FULL_POLL_INTERVAL = 6 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    params TEXT NOT NULL,
+    interval_minutes INTEGER NOT NULL,
+    max_pages INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    last_polled TEXT,
+    last_status TEXT,
+    last_visited TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS watch_items (
+    watch_id INTEGER NOT NULL,
+    item_id TEXT NOT NULL,
+    price REAL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    PRIMARY KEY (watch_id, item_id)
+);
+
+CREATE TABLE IF NOT EXISTS watch_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    watch_id INTEGER NOT NULL,
+    item_id TEXT NOT NULL,
+    change TEXT NOT NULL,
+    observed_at TEXT NOT NULL,
+    old_price REAL,
+    price REAL,
+    row TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_watch_changes_watch ON watch_changes (watch_id, observed_at);
+"""
+
+
+def _now():
+    return datetime.now().isoformat(timespec="microseconds")
+
+
+class Watchlist:
+    """保存した検索と、取得ごとの差分を記録するSQLiteデータベース"""
+
+    def __init__(self, path=DEFAULT_WATCHLIST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # バックグラウンドの取得とStreamlitのスレッドから共有するため check_same_thread=False とし、ロックで直列化する
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def add(self, name, params, interval_minutes=60, max_pages=2):
+        """検索条件を保存する（params は SEARCH_PARAMS のキーを持つ辞書）。保存した検索のIDを返す"""
+        params = {key: params.get(key) for key in SEARCH_PARAMS}
+        now = _now()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO watches (name, params, interval_minutes, max_pages, created_at, last_visited) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (name, json.dumps(params, ensure_ascii=False), interval_minutes, max_pages, now, now),
+            )
+        return cursor.lastrowid
+
+    def remove(self, watch_id):
+        with self._lock, self._conn:
+            for table, column in (("watches", "id"), ("watch_items", "watch_id"), ("watch_changes", "watch_id")):
+                self._conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (watch_id,))
+
+    def watches(self):
+        """保存した検索の一覧（前回の確認以降の変更の件数を含む）"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT w.id, w.name, w.params, w.interval_minutes, w.max_pages, w.last_polled, w.last_status,
+                       w.last_visited,
+                       (SELECT COUNT(*) FROM watch_changes c
+                        WHERE c.watch_id = w.id AND c.observed_at > w.last_visited) AS unseen
+                FROM watches w
+                ORDER BY w.id
+                """
+            ).fetchall()
+        columns = ("id", "name", "params", "interval_minutes", "max_pages", "last_polled", "last_status",
+                   "last_visited", "unseen")
+        watches = [dict(zip(columns, row)) for row in rows]
+        for watch in watches:
+            watch["params"] = json.loads(watch["params"])
+        return watches
+
+    def due_watches(self, now=None):
+        """取得の間隔が過ぎた検索（前回の取得が古い順）"""
+        now = now or datetime.now()
+        due = [watch for watch in self.watches()
+               if watch["last_polled"] is None
+               or datetime.fromisoformat(watch["last_polled"]) + timedelta(minutes=watch["interval_minutes"]) <= now]
+        return sorted(due, key=lambda watch: watch["last_polled"] or "")
+
+    def request_poll(self, watch_id):
+        """次の確認で取得するように、前回の取得日時を消す"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE watches SET last_polled = NULL WHERE id = ?", (watch_id,))
+
+    def has_snapshot(self, watch_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM watch_items WHERE watch_id = ? LIMIT 1",
+                                      (watch_id,)).fetchone() is not None
+
+    def seen_any(self, watch_id, item_ids):
+        """item_ids のうち前回までの取得で見た商品があるか"""
+        item_ids = [item_id for item_id in item_ids if item_id]
+        if not item_ids:
+            return False
+        placeholders = ",".join("?" * len(item_ids))
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT 1 FROM watch_items WHERE watch_id = ? AND item_id IN ({placeholders}) LIMIT 1",
+                [watch_id] + item_ids,
+            ).fetchone() is not None
+
+    def apply_poll(self, watch_id, rows, observed_at=None, baseline=False):
+        """取得した行を前回までの商品と比べ、差分を記録する
+
+        rows は EbayScraper.search が返す辞書のリスト（価格は正規化済み）。
+        baseline=True の場合（初回の取得）は商品を保存するだけで、差分としては記録しない。
+        戻り値は新着・価格変更の件数。
+        """
+        observed_at = observed_at or _now()
+        records = {}
+        for row in rows:
+            item_id = extract_item_id(row.get('リンク'))
+            if item_id is not None:
+                records[item_id] = row
+
+        counts = {"new": 0, "price_changes": 0}
+        with self._lock, self._conn:
+            item_ids = list(records)
+            known = {}
+            if item_ids:
+                placeholders = ",".join("?" * len(item_ids))
+                known.update(self._conn.execute(
+                    f"SELECT item_id, price FROM watch_items WHERE watch_id = ? AND item_id IN ({placeholders})",
+                    [watch_id] + item_ids,
+                ).fetchall())
+
+            changes = []
+            for item_id, row in records.items():
+                price = round(float(row.get('価格') or 0.0), 2)
+                if item_id not in known:
+                    counts["new"] += 1
+                    change, old_price = CHANGE_NEW, None
+                elif known[item_id] is not None and round(known[item_id], 2) != price:
+                    counts["price_changes"] += 1
+                    change, old_price = CHANGE_PRICE, known[item_id]
+                else:
+                    continue
+                if not baseline:
+                    changes.append((watch_id, item_id, change, observed_at, old_price, price,
+                                    json.dumps(row, ensure_ascii=False, default=str)))
+
+            self._conn.executemany(
+                """
+                INSERT INTO watch_items (watch_id, item_id, price, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (watch_id, item_id) DO UPDATE SET price = excluded.price, last_seen = excluded.last_seen
+                """,
+                [(watch_id, item_id, round(float(row.get('価格') or 0.0), 2), observed_at, observed_at)
+                 for item_id, row in records.items()],
+            )
+            self._conn.executemany(
+                "INSERT INTO watch_changes (watch_id, item_id, change, observed_at, old_price, price, row) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                changes,
+            )
+        return counts
+
+    def record_status(self, watch_id, status, polled_at=None):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE watches SET last_polled = ?, last_status = ? WHERE id = ?",
+                               (polled_at or _now(), status, watch_id))
+
+    def mark_visited(self, watch_id, visited_at=None):
+        """前回の確認日時を更新する（以降の変更だけが未確認になる）"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE watches SET last_visited = ? WHERE id = ?", (visited_at or _now(), watch_id))
+
+    def changes(self, watch_id, since=None, limit=500):
+        """記録した差分（新しい順）。since を指定するとその日時より後の変更だけを返す"""
+        import pandas as pd
+
+        sql = "SELECT change, observed_at, old_price, price, row FROM watch_changes WHERE watch_id = ?"
+        params = [watch_id]
+        if since:
+            sql += " AND observed_at > ?"
+            params.append(since)
+        sql += " ORDER BY observed_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        records = []
+        for change, observed_at, old_price, price, row in rows:
+            row = json.loads(row)
+            records.append({
+                '変更': CHANGE_LABELS.get(change, change),
+                '日時': observed_at,
+                'タイトル': row.get('タイトル'),
+                '価格': price,
+                '前回の価格': old_price,
+                '差額': price - old_price if old_price is not None else None,
+                '状態': row.get('状態'),
+                '場所': row.get('場所'),
+                '出品者': row.get('出品者'),
+                'リンク': row.get('リンク'),
+            })
+        return pd.DataFrame(records, columns=['変更', '日時', 'タイトル', '価格', '前回の価格', '差額',
+                                              '状態', '場所', '出品者', 'リンク'])
+
+
+class WatchPoller:
+    """保存した検索をバックグラウンドで定期的に取得するスレッド
+
+    - scraper: 取得に使う EbayScraper（アプリと同じスケジューラを共有し、キャッシュは読まない）
+    - listing_store: 指定すると取得した結果を商品データベースにも蓄積する
+    - check_interval: 取得の間隔が過ぎた検索を確認する間隔（秒）
+    - full_poll_interval: 見た商品のページで止めずに最大ページ数まで取得する間隔（秒）
+    """
+
+    def __init__(self, watchlist, scraper, listing_store=None, check_interval=60,
+                 full_poll_interval=FULL_POLL_INTERVAL):
+        self.watchlist = watchlist
+        self.scraper = scraper
+        self.listing_store = listing_store
+        self.check_interval = check_interval
+        self.full_poll_interval = full_poll_interval
+        self.polls = 0
+        # 検索ごとの最後に最大ページ数まで取得した時刻
+        self._full_polled = {}
+        self.paused_until = None
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ebay-watch-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def wake(self):
+        """すぐに確認する（今すぐ取得するボタン用）"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                self.poll_due()
+            except Exception:
+                logger.exception("保存した検索の取得に失敗しました")
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+
+    def poll_due(self):
+        """取得の間隔が過ぎた検索を順に取得する（利用者の検索が順番待ちの間は後回しにする）"""
+        polled = 0
+        for watch in self.watchlist.due_watches():
+            if self.paused_until is not None and time.time() < self.paused_until:
+                break
+            if self.scraper.scheduler.queue_length() > 0:
+                break
+            self.poll(watch)
+            polled += 1
+        return polled
+
+    def _full_poll_due(self, watch_id):
+        last = self._full_polled.get(watch_id)
+        return last is None or time.time() - last >= self.full_poll_interval
+
+    def poll(self, watch, full=None):
+        """1つの検索を新着順に取得し、前回までに見た商品が出てきたページで止めて差分を記録する
+
+        full=True（既定では full_poll_interval ごと）の場合は止めずに最大ページ数まで取得し、
+        2ページ目以降の商品の価格変更も記録する。
+        """
+        from price_normalizer import normalize_prices
+        from result_schema import to_frame
+
+        watch_id = watch["id"]
+        params = {key: value for key, value in watch["params"].items() if key in SEARCH_PARAMS}
+        baseline = not self.watchlist.has_snapshot(watch_id)
+        if full is None:
+            full = self._full_poll_due(watch_id)
+        events = []
+        rows = []
+        pages = 0
+        self.polls += 1
+
+        with self.scraper.metrics.trace("watch_poll", watch=watch_id):
+            for page_rows in self.scraper.search_pages(limit=watch["max_pages"] * self.scraper.page_size,
+                                                       max_pages=watch["max_pages"],
+                                                       sort=ebay_scraper.SORT_NEWLY_LISTED,
+                                                       on_event=events.append, **params):
+                rows.extend(page_rows)
+                pages += 1
+                # 新着順なので、見たことのある商品があればそれより後のページは前回までに取得済み
+                if not baseline and not full and self.watchlist.seen_any(
+                        watch_id, [extract_item_id(row['リンク']) for row in page_rows]):
+                    break
+
+        for event in events:
+            if event["type"] == ebay_scraper.EVENT_ROBOT_CHECK:
+                self.paused_until = time.time() + ROBOT_CHECK_BACKOFF
+                self.watchlist.record_status(watch_id, "ロボット検出のため一時停止")
+                return None
+            if event["type"] == ebay_scraper.EVENT_ERROR and not rows:
+                self.watchlist.record_status(watch_id, f"エラー: {event['exception']}")
+                return None
+
+        if rows:
+            prices = normalize_prices(to_frame(rows), self.scraper.exchange_rate)['価格'].tolist()
+            rows = [{**row, '価格': price} for row, price in zip(rows, prices)]
+        counts = self.watchlist.apply_poll(watch_id, rows, baseline=baseline)
+        if baseline or full:
+            self._full_polled[watch_id] = time.time()
+        if self.listing_store is not None and rows:
+            self.listing_store.upsert(rows, keyword=params.get("keyword"))
+
+        if baseline:
+            status = f"初回取得: {len(rows)}件（{pages}ページ）"
+        else:
+            status = f"新着 {counts['new']}件・価格変更 {counts['price_changes']}件（{pages}ページ）"
+        self.watchlist.record_status(watch_id, status)
+        logger.info("%s: %s", watch["name"], status)
+        return counts